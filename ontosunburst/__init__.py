@@ -1,3 +1,4 @@
-from ontosunburst import ontosunburst, ontology, data_table_tree, sunburst_fig, Inputs
+from ontosunburst import ontosunburst, ontology, ontology_graph, compiled_ontology, cache, sparql, \
+    sparql_server, obo, data_table_tree, sunburst_fig, Inputs
 
 __version__ = '0.1.0'
@@ -1,4 +1,6 @@
 from ontosunburst.ontosunburst import *
+from ontosunburst.ontology import download_go_ontology, GO_PAGE_SIZE
+from ontosunburst.sparql_server import LocalSparqlServer
 import argparse
 
 
@@ -65,6 +67,47 @@ def main():
                  **kwargs)
 
 
+def download_go():
+    parser = argparse.ArgumentParser(description='Download the GO classes hierarchy as a local '
+                                                 'class ontology')
+    parser.add_argument('--output', '-o', type=str, required=False, default='go_ontology.json',
+                        help='Class ontology json file')
+    parser.add_argument('--url', type=str, required=False, default=DEFAULT_URL[GO],
+                        help='Endpoint URL (SPARQL server)')
+    parser.add_argument('--page_size', type=int, required=False, default=GO_PAGE_SIZE,
+                        help='Number of relations fetched by each SPARQL request')
+    args = parser.parse_args()
+    download_go_ontology(args.url, args.output, args.page_size)
+
+
+def sparql_server():
+    parser = argparse.ArgumentParser(description='Serve GO and ChEBI OBO files as a local SPARQL '
+                                                 'server stand-in')
+    parser.add_argument('--go', type=str, required=False, help='GO OBO file (served at /go/)')
+    parser.add_argument('--chebi', type=str, required=False,
+                        help='ChEBI OBO file (served at /chebi/)')
+    parser.add_argument('--host', type=str, required=False, default='localhost', help='Host')
+    parser.add_argument('--port', type=int, required=False, default=3030, help='Port')
+    parser.add_argument('--latency', type=float, required=False, default=0,
+                        help='Delay added to each request (seconds)')
+    parser.add_argument('--id_latency', type=float, required=False, default=0,
+                        help='Delay added to each request for each queried ID (seconds)')
+    parser.add_argument('--failure_rate', type=float, required=False, default=0,
+                        help='Probability of each request to fail (503 error)')
+    parser.add_argument('--seed', type=int, required=False, help='Seed of the failures')
+    args = parser.parse_args()
+    obo_files = {dataset: obo for dataset, obo in [(GO, args.go), (CHEBI, args.chebi)]
+                 if obo is not None}
+    server = LocalSparqlServer(obo_files, args.host, args.port, args.latency, args.id_latency,
+                               args.failure_rate, seed=args.seed)
+    for dataset in obo_files:
+        print(f'Serving {dataset} at {server.get_url(dataset)}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
 def extract_input(input_file):
     if input_file is not None:
         id_lst = []
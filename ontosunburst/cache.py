@@ -0,0 +1,184 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Any, Tuple
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+# Maximum estimated memory footprint of the cached files (bytes)
+CACHE_MAX_SIZE = 2 ** 30
+# Estimated memory footprint of a parsed json file, relatively to the file size
+JSON_MEMORY_FACTOR = 6
+
+
+# ==================================================================================================
+# CLASS
+# ==================================================================================================
+class FileCache:
+    """
+    FileCache class: in-process LRU cache of the objects loaded from files (ontologies, labels).
+
+    Entries are keyed by the absolute path, the size and the modification time of the file, so a
+    modified file is loaded again. Least recently used entries are dropped when the estimated
+    memory footprint of the cached objects exceeds max_size.
+
+    Cached objects are shared by all the callers and must not be modified. Objects having a close
+    method (memory-mapped ontologies) are closed when dropped from the cache. The entries are read
+    and updated under a lock, the cache being shared by all the threads.
+
+    Attributes
+    ----------
+    self.max_size: int
+        Maximum estimated memory footprint of the cached objects (bytes)
+    self.size: int
+        Estimated memory footprint of the cached objects (bytes)
+    """
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def load(self, path: str, loader: Callable[[str], Any], footprint_factor: float = 1) -> Any:
+        """ Get the object loaded from a file, loading it if it is not cached or if the file
+        changed.
+
+        Parameters
+        ----------
+        path: str
+            Path of the file
+        loader: Callable[[str], Any]
+            Function loading the object from the file path
+        footprint_factor: float (optional, default=1)
+            Estimated memory footprint of the loaded object, relatively to the file size
+
+        Returns
+        -------
+        Any
+            Object loaded from the file
+        """
+        key = get_file_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+        obj = loader(path)
+        footprint = int(key[1] * footprint_factor)
+        with self._lock:
+            # Loaded meanwhile by another thread : the cached object is shared
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            if footprint <= self.max_size:
+                # Drop the entries of the previous versions of the file
+                self.discard(key[0])
+                self._entries[key] = (obj, footprint)
+                self.size += footprint
+                self.resize(self.max_size)
+        return obj
+
+    def resize(self, max_size: int):
+        """ Set the maximum footprint of the cache, dropping the least recently used entries
+        exceeding it.
+
+        Parameters
+        ----------
+        max_size: int
+            Maximum estimated memory footprint of the cached objects (bytes)
+        """
+        with self._lock:
+            self.max_size = max_size
+            while self.size > self.max_size:
+                self.__drop(self._entries.popitem(last=False)[1])
+
+    def discard(self, path: str):
+        """ Drop the cached objects loaded from a file (all versions).
+
+        Parameters
+        ----------
+        path: str
+            Path of the file
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self.__drop(self._entries.pop(key))
+
+    def clear(self):
+        """ Drop all the cached objects. """
+        with self._lock:
+            while self._entries:
+                self.__drop(self._entries.popitem(last=False)[1])
+
+    def __drop(self, entry: Tuple[Any, int]):
+        """ Update the size of the cache for a dropped entry, closing its object if it can be. """
+        obj, footprint = entry
+        self.size -= footprint
+        close = getattr(obj, 'close', None)
+        if callable(close):
+            close()
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+def get_file_key(path: str) -> Tuple[str, int, int]:
+    """ Get the cache key of a file.
+
+    Parameters
+    ----------
+    path: str
+        Path of the file
+
+    Returns
+    -------
+    Tuple[str, int, int]
+        Absolute path, size (bytes) and modification time (ns) of the file
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def load_json(path: str) -> Any:
+    """ Load a json file through the process-wide cache.
+
+    Parameters
+    ----------
+    path: str
+        Path of the json file
+
+    Returns
+    -------
+    Any
+        Content of the json file (shared, must not be modified)
+    """
+    return FILE_CACHE.load(path, _read_json, JSON_MEMORY_FACTOR)
+
+
+def set_cache_max_size(max_size: int):
+    """ Set the maximum estimated memory footprint of the process-wide cache.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum estimated memory footprint of the cached objects (bytes), 0 to disable the cache
+    """
+    FILE_CACHE.resize(max_size)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+FILE_CACHE = FileCache()
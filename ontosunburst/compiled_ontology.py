@@ -0,0 +1,330 @@
+import os
+import json
+import mmap
+import zlib
+import threading
+from typing import List, Dict
+
+import numpy as np
+
+from ontosunburst.ontology_graph import OntologyGraph, AncestorIndex, as_ontology_graph, \
+    get_ancestor_index_path
+from ontosunburst.cache import FILE_CACHE, load_json
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+COMPILED_EXT = '.onto'
+MAGIC = b'OSBONTO1'
+VERSION = 1
+
+# Header : magic + [version, n_keys, n_names, n_edges, table_size, blob_size]
+HEADER_FIELDS = 6
+HEADER_SIZE = len(MAGIC) + HEADER_FIELDS * 8
+ALIGN = 8
+
+
+# ==================================================================================================
+# CLASS
+# ==================================================================================================
+class CompiledOntology(OntologyGraph):
+    """
+    CompiledOntology class: read-only, memory-mapped OntologyGraph of a compiled class ontology.
+
+    Behaves as the Dict[str, List[str]] ontology dictionary it was compiled from (same keys, same
+    order, same parents lists) but nothing is parsed when opened : all arrays are read directly
+    from the mapped file, so several processes opening the same file share the OS page cache. The
+    file is unmapped by close (or at the end of a with block, or when the ontology is dropped from
+    the process-wide cache) : the ontology can not be used anymore.
+
+    File layout (little-endian, each section aligned on 8 bytes) :
+        - header : magic, version, n_keys, n_names, n_edges, table_size, blob_size
+        - name_offsets : uint64[n_names + 1], offsets of each name in the blob
+        - parent_offsets : uint64[n_keys + 1], CSR offsets of each key parents
+        - parent_indices : uint32[n_edges], CSR parents name indexes
+        - table : uint32[table_size], open addressing hash table (name index + 1, 0 if empty)
+        - blob : utf-8 names concatenated (keys first, in the dictionary order)
+
+    Attributes
+    ----------
+    self.path: str
+        Path of the compiled file
+    self.offsets: np.ndarray
+        CSR offsets of the parents of each key (size n_keys + 1), mapped from the file
+    self.indices: np.ndarray
+        CSR parents name indexes (size n_edges), mapped from the file
+    self.n_keys: int
+        Number of classes having parents (dictionary keys)
+    self.n_names: int
+        Number of interned names (keys and parent only classes)
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path} is not a compiled ontology file.')
+        header = np.frombuffer(self._mm, dtype='<u8', count=HEADER_FIELDS, offset=len(MAGIC))
+        version, n_keys, n_names, n_edges, table_size, blob_size = (int(x) for x in header)
+        del header
+        if version != VERSION:
+            self._mm.close()
+            raise ValueError(f'{path} compiled ontology version {version} not supported, '
+                             f'must be {VERSION}.')
+        self.n_keys = n_keys
+        self.n_names = n_names
+        offset = HEADER_SIZE
+        self._name_offsets, offset = _read_array(self._mm, '<u8', n_names + 1, offset)
+        self.offsets, offset = _read_array(self._mm, '<u8', n_keys + 1, offset)
+        self.indices, offset = _read_array(self._mm, '<u4', n_edges, offset)
+        self._table, offset = _read_array(self._mm, '<u4', table_size, offset)
+        self._mask = table_size - 1
+        self._blob_start = offset
+        self._blob_end = offset + blob_size
+        self._ancestor_indexes = dict()
+        self._ancestor_indexes_lock = threading.RLock()
+        self.ancestors_caches = dict()
+
+    def __enter__(self) -> 'CompiledOntology':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._mm is None
+
+    def close(self):
+        """ Unmap the compiled file. If arrays read from the file are still referenced elsewhere,
+        the file is unmapped once they are freed.
+        """
+        if self._mm is None:
+            return
+        self._name_offsets = self.offsets = self.indices = self._table = None
+        with self._ancestor_indexes_lock:
+            self._ancestor_indexes.clear()
+        self.ancestors_caches.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._mm = None
+
+    def name(self, i: int) -> str:
+        """ Get the name interned at an index.
+
+        Parameters
+        ----------
+        i: int
+            Index of the name
+
+        Returns
+        -------
+        str
+            Name (class ID) interned at index i
+        """
+        start = self._blob_start + int(self._name_offsets[i])
+        end = self._blob_start + int(self._name_offsets[i + 1])
+        return self._mm[start:end].decode()
+
+    def index(self, key: str) -> int:
+        """ Get the interned index of a name, looked up in the file hash table.
+
+        Parameters
+        ----------
+        key: str
+            Name (class ID) to look for
+
+        Returns
+        -------
+        int
+            Index of the name, -1 if the name is not interned
+        """
+        b_key = key.encode()
+        slot = zlib.crc32(b_key) & self._mask
+        while True:
+            i = int(self._table[slot])
+            if i == 0:
+                return -1
+            i -= 1
+            start = self._blob_start + int(self._name_offsets[i])
+            end = self._blob_start + int(self._name_offsets[i + 1])
+            if self._mm[start:end] == b_key:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def has_ancestor_index(self, root_item: str) -> bool:
+        """ Check if the ancestor closure index for a root is already available, loading the index
+        saved next to the compiled file if it exists.
+
+        Parameters
+        ----------
+        root_item: str
+            Name of the root item of the ontology
+
+        Returns
+        -------
+        bool
+            True if the index is available without being built, False otherwise
+        """
+        with self._ancestor_indexes_lock:
+            if root_item not in self._ancestor_indexes:
+                index_path = get_ancestor_index_path(self.path)
+                if os.path.isfile(index_path) and \
+                        os.path.getmtime(index_path) >= os.path.getmtime(self.path):
+                    index = AncestorIndex.load(index_path, self)
+                    if index.root_item == root_item:
+                        self._ancestor_indexes[root_item] = index
+            return root_item in self._ancestor_indexes
+
+    def ancestor_index(self, root_item: str) -> AncestorIndex:
+        """ Get the ancestor closure index for a root : loaded from the index saved next to the
+        compiled file if it exists, built otherwise.
+
+        Parameters
+        ----------
+        root_item: str
+            Name of the root item of the ontology
+
+        Returns
+        -------
+        AncestorIndex
+            Ancestor closure index of the ontology
+        """
+        self.has_ancestor_index(root_item)
+        return super().ancestor_index(root_item)
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+
+# Compilation
+# --------------------------------------------------------------------------------------------------
+def compile_ontology(class_ontology: str or Dict[str, List[str]] or OntologyGraph,
+                     output: str = None, root_item: str = None) -> str:
+    """ Compile a class ontology into the binary memory-mappable format read by CompiledOntology.
+
+    Parameters
+    ----------
+    class_ontology: str or Dict[str, List[str]] or OntologyGraph
+        Class ontology dictionary, OntologyGraph or json file.
+    output: str (optional, default=None)
+        Path of the compiled file. If None and class_ontology is a json file, the compiled file is
+        written next to it with the .onto extension.
+    root_item: str (optional, default=None)
+        Name of the root item of the ontology. If filled, the ancestor closure index of the
+        ontology is also built and saved next to the compiled file.
+
+    Returns
+    -------
+    str
+        Path of the compiled file
+    """
+    if type(class_ontology) == str:
+        if output is None:
+            output = get_compiled_path(class_ontology)
+        with open(class_ontology, 'r') as f:
+            class_ontology = json.load(f)
+    elif output is None:
+        raise ValueError('output parameter must be filled to compile an ontology dictionary')
+
+    # Intern names : keys first (dictionary order), then parent only classes
+    graph = as_ontology_graph(class_ontology)
+    names = [graph.name(i) for i in range(graph.n_names)]
+    parent_offsets = np.asarray(graph.offsets, dtype='<u8')
+    parent_indices = np.asarray(graph.indices, dtype='<u4')
+
+    # Names blob
+    b_names = [n.encode() for n in names]
+    name_offsets = np.zeros(len(names) + 1, dtype='<u8')
+    name_offsets[1:] = np.cumsum([len(b) for b in b_names])
+    blob = b''.join(b_names)
+
+    # Hash table (linear probing, load factor <= 0.5)
+    table_size = 8
+    while table_size < 2 * len(names):
+        table_size *= 2
+    table = np.zeros(table_size, dtype='<u4')
+    mask = table_size - 1
+    for i, b in enumerate(b_names):
+        slot = zlib.crc32(b) & mask
+        while table[slot] != 0:
+            slot = (slot + 1) & mask
+        table[slot] = i + 1
+
+    header = np.array([VERSION, graph.n_keys, len(names), len(parent_indices),
+                       table_size, len(blob)], dtype='<u8')
+    tmp_output = output + '.tmp'
+    with open(tmp_output, 'wb') as f:
+        f.write(MAGIC)
+        f.write(header.tobytes())
+        for array in (name_offsets, parent_offsets, parent_indices, table):
+            _write_aligned(f, array.tobytes())
+        f.write(blob)
+    # The mapped previous version of the file can not be replaced on Windows
+    FILE_CACHE.discard(output)
+    os.replace(tmp_output, output)
+    if root_item is not None:
+        graph.ancestor_index(root_item).save(get_ancestor_index_path(output))
+    return output
+
+
+# Loading
+# --------------------------------------------------------------------------------------------------
+def get_compiled_path(path: str) -> str:
+    """ Get the path of the compiled sibling of a class ontology json file.
+
+    Parameters
+    ----------
+    path: str
+        Path of the class ontology json file
+
+    Returns
+    -------
+    str
+        Path of the compiled file (same name, .onto extension)
+    """
+    return os.path.splitext(path)[0] + COMPILED_EXT
+
+
+def load_class_ontology(path: str) -> Dict[str, List[str]] or CompiledOntology:
+    """ Load a class ontology file. If the path is a compiled file, or if an up-to-date compiled
+    sibling of the json file exists, the compiled file is memory-mapped instead of parsing the json.
+    Loaded ontologies are kept in the process-wide cache (see ontosunburst.cache) : the returned
+    ontology is shared and must not be modified, nor closed (it is closed when dropped from the
+    cache).
+
+    Parameters
+    ----------
+    path: str
+        Path of the class ontology json (or compiled) file
+
+    Returns
+    -------
+    Dict[str, List[str]] or CompiledOntology
+        Class ontology associating for each class its +1 parent classes.
+    """
+    if path.endswith(COMPILED_EXT):
+        return FILE_CACHE.load(path, CompiledOntology)
+    compiled = get_compiled_path(path)
+    if os.path.isfile(compiled):
+        if not os.path.isfile(path) or os.path.getmtime(compiled) >= os.path.getmtime(path):
+            return FILE_CACHE.load(compiled, CompiledOntology)
+    return load_json(path)
+
+
+# Utils
+# --------------------------------------------------------------------------------------------------
+def _read_array(buffer: mmap.mmap, dtype: str, count: int, offset: int):
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+    offset += array.nbytes
+    return array, offset + (-offset % ALIGN)
+
+
+def _write_aligned(f, data: bytes):
+    f.write(data)
+    f.write(b'\0' * (-f.tell() % ALIGN))
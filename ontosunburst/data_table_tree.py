@@ -1,8 +1,12 @@
-from typing import List, Dict, Set
+import sys
+from collections.abc import MutableSequence
+from typing import List, Dict, Set, FrozenSet, Tuple, Iterator, Any
 import numpy as np
 from numpy import nan
 import scipy.stats as stats
 
+from ontosunburst.ontology_graph import report_cycle
+
 # ==================================================================================================
 # CONSTANTS
 # ==================================================================================================
@@ -17,6 +21,12 @@ ENRICHMENT_A = 'enrichment'
 
 MAX_RELATIVE_NB = 1000000
 
+# Number of rows allocated at once in the numeric columns of a columnar DataTable
+CHUNK_SIZE = 4096
+
+# Path of the sectors without parent
+NO_PATH = -1
+
 # Keys
 # ----
 IDS = 'ID'
@@ -41,24 +51,254 @@ PATH_DEEPER = 'deeper'
 PATH_HIGHER = 'higher'
 PATH_BOUND = 'bound'
 
+# Path budget policies
+PRIMARY_PARENT = 'primary parent'
+MAX_CLASS_PATHS = 'max class paths'
+MAX_SECTORS = 'max sectors'
+
 
 # ==================================================================================================
-# CLASS
+# CLASSES
 # ==================================================================================================
+class PathTable:
+    """
+    PathTable class: interned sectors IDs (paths to the root) as int.
+
+    A path ID 'A__B__C' is the path of name 'A' with parent path 'B__C' (NO_PATH for the
+    one-class path 'C'). The '__'-joined string IDs are only built by to_str and to_strs (which
+    raises if distinct paths have the same string ID, class names containing '__'). The
+    table also keeps the paths already computed for each class (see get_class_ids), so that they
+    can be reused by several DataTable with the same class ontology.
+
+    Attributes
+    ----------
+    self.path_names: List[str]
+        Name (first class) of each path
+    self.path_parents: List[int]
+        Parent path of each path (NO_PATH for one-class paths)
+    self.path_depths: List[int]
+        Number of classes of each path
+    self.path_index: Dict[Tuple[str, int], int]
+        Dictionary associating for each (name, parent path) its path
+    self.class_paths: Dict[str, List[int]]
+        Dictionary associating for each class its paths to the root
+    """
+    def __init__(self):
+        self.path_names = list()
+        self.path_parents = list()
+        self.path_depths = list()
+        self.path_index = dict()
+        self.class_paths = dict()
+
+    def __len__(self) -> int:
+        return len(self.path_names)
+
+    def get_path(self, name: str, parent: int = NO_PATH) -> int:
+        """ Return the path of a name with a parent path, adding it if it does not exist.
+
+        Parameters
+        ----------
+        name: str
+            Name of the first class of the path
+        parent: int (optional, default=NO_PATH)
+            Parent path
+
+        Returns
+        -------
+        int
+            Path
+        """
+        key = (name, parent)
+        path = self.path_index.get(key)
+        if path is None:
+            path = len(self.path_names)
+            self.path_index[key] = path
+            self.path_names.append(sys.intern(name))
+            self.path_parents.append(parent)
+            self.path_depths.append(1 if parent == NO_PATH else self.path_depths[parent] + 1)
+        return path
+
+    def from_str(self, m_id: str) -> int:
+        """ Return the path of a string ID ('' for NO_PATH), adding it if it does not exist.
+
+        Parameters
+        ----------
+        m_id: str
+            String ID, classes joined by '__'
+
+        Returns
+        -------
+        int
+            Path
+        """
+        path = NO_PATH
+        if m_id != '':
+            for name in reversed(m_id.split('__')):
+                path = self.get_path(name, path)
+        return path
+
+    def to_str(self, path: int) -> str:
+        """ Return the string ID of a path ('' for NO_PATH).
+
+        Parameters
+        ----------
+        path: int
+            Path
+
+        Returns
+        -------
+        str
+            String ID, classes joined by '__'
+        """
+        return self.to_strs([path])[0]
+
+    def to_strs(self, paths: List[int]) -> List[str]:
+        """ Return the string IDs of a list of paths, the string ID of each parent path being built
+        once. Raises a ValueError if distinct paths have the same string ID (class names containing
+        '__').
+
+        Parameters
+        ----------
+        paths: List[int]
+            List of paths
+
+        Returns
+        -------
+        List[str]
+            List of string IDs
+        """
+        strings = {NO_PATH: ''}
+        for path in paths:
+            chain = list()
+            while path not in strings:
+                chain.append(path)
+                path = self.path_parents[path]
+            for path in reversed(chain):
+                parent = self.path_parents[path]
+                if parent == NO_PATH:
+                    strings[path] = self.path_names[path]
+                else:
+                    strings[path] = self.path_names[path] + '__' + strings[parent]
+        m_ids = [strings[path] for path in paths]
+        owners = dict()
+        for path, m_id in zip(paths, m_ids):
+            if owners.setdefault(m_id, path) != path:
+                raise ValueError(f'{m_id} already in data IDs, all IDs must be unique (class names '
+                                 f'can not contain "__").')
+        return m_ids
+
+
+class PathColumn(MutableSequence):
+    """
+    PathColumn class: string IDs of a path column of a DataTable (id_paths or parent_paths).
+
+    The string IDs are decoded once and kept until the path column changes. Setting a string ID
+    sets the path of the DataTable (keeping its index up-to-date). Sectors can only be added or
+    deleted through the DataTable (add_value, delete_value).
+
+    Attributes
+    ----------
+    self.table: DataTable
+        DataTable of the path column
+    self.column: str
+        Name of the path column : 'id_paths' or 'parent_paths'
+    self.strings: List[str] or None
+        Decoded string IDs, None when they must be decoded again
+    """
+    def __init__(self, table: 'DataTable', column: str):
+        self.table = table
+        self.column = column
+        self.strings = None
+
+    def get_strings(self) -> List[str]:
+        """ Return the string IDs of the path column, decoding them if it changed.
+
+        Returns
+        -------
+        List[str]
+            String IDs
+        """
+        if self.strings is None:
+            self.strings = self.table.paths.to_strs(getattr(self.table, self.column))
+        return self.strings
+
+    def __len__(self) -> int:
+        return len(getattr(self.table, self.column))
+
+    def __getitem__(self, index: int or slice) -> str or List[str]:
+        return self.get_strings()[index]
+
+    def __setitem__(self, index: int or slice, value: str or List[str]):
+        strings = self.get_strings()
+        if isinstance(index, slice):
+            indexes = range(*index.indices(len(strings)))
+            values = list(value)
+            if len(values) != len(indexes):
+                raise ValueError(f'{len(values)} IDs can not be set to {len(indexes)} sectors.')
+        else:
+            indexes = [range(len(strings))[index]]
+            values = [value]
+        for i, m_id in zip(indexes, values):
+            path = self.table.paths.from_str(m_id)
+            if self.column == 'id_paths':
+                self.table.set_path(i, path)
+            else:
+                self.table.set_parent(i, path)
+            strings[i] = self.table.paths.to_str(path)
+        self.strings = strings
+
+    def __delitem__(self, index: int or slice):
+        raise TypeError('Sectors can only be deleted through DataTable.delete_value.')
+
+    def insert(self, index: int, value: str):
+        raise TypeError('Sectors can only be added through DataTable.add_value.')
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.get_strings())
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.get_strings()
+
+    def index(self, value: Any, start: int = 0, stop: int = sys.maxsize) -> int:
+        return self.get_strings().index(value, start, stop)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, PathColumn):
+            other = other.get_strings()
+        return self.get_strings() == other
+
+    def __repr__(self) -> str:
+        return repr(self.get_strings())
+
+
 class DataTable:
     """
     DataTable class: stores figure parameters values.
 
+    In columnar mode, the numeric columns (count, ref_count, prop, ref_prop, relative_prop, p_val)
+    are numpy float arrays, grown by chunks while the table is filled and trimmed once filled
+    (the table is then frozen : no value can be added), and the string columns values are
+    interned. Proportions and enrichment are computed with array operations. get_data_dict and
+    get_col give the same values as in the default mode (lists, integer counts kept as int, NaN
+    as numpy.nan).
+
+    Sectors IDs and parents are stored as int paths of a PathTable (self.id_paths,
+    self.parent_paths). Their string IDs (self.ids, self.parents : PathColumn) are only decoded
+    when they are read, e.g. by get_data_dict for the figure and the TSV output, and kept until
+    the paths change.
+
     Attributes
     ----------
-    self.ids: List[str]
+    self.paths: PathTable
+        Paths of the sectors IDs
+    self.id_paths: List[int]
         Unique ids of all sectors (id=path in the tree)
     self.onto_ids: List[str]
         Ontology ID of all sectors
     self.labels: List[str]
         Sectors labels
-    self.parents: List[str]
-        Sectors parents
+    self.parent_paths: List[int]
+        Sectors parents (NO_PATH for the sectors without parent)
     self.count: List[float]
         Sectors interest set count (0<count)
     self.ref_count: List[float]
@@ -73,19 +313,53 @@ class DataTable:
         Sectors p-value if enrichment analysis
     self.len: int
         Number of sectors
+    self.columnar: bool
+        True if the numeric columns are numpy arrays
+    self.frozen: bool
+        True if no value can be added anymore (columnar mode, once filled)
+    self.int_count: numpy.ndarray
+        Columnar mode : True for the sectors interest set counts given as int
+    self.int_ref_count: numpy.ndarray
+        Columnar mode : True for the sectors reference set counts given as int
+    self.index: Dict[int, int]
+        Dictionary associating for each sector path its index
+    self.children: Dict[int, List[int]]
+        Dictionary associating for each parent path the paths of its children sectors (NO_PATH
+        for the sectors without parent)
+    self.dropped: Dict[str, int]
+        Dictionary associating for each path budget policy applied by fill_parameters the number
+        of sectors it dropped
     """
-    def __init__(self):
-        self.ids = list()
+    def __init__(self, columnar: bool = False, paths: PathTable = None):
+        self.paths = paths if paths is not None else PathTable()
+        self.id_paths = list()
         self.onto_ids = list()
         self.labels = list()
-        self.parents = list()
-        self.count = list()
-        self.ref_count = list()
-        self.prop = list()
-        self.ref_prop = list()
-        self.relative_prop = list()
-        self.p_val = list()
+        self.parent_paths = list()
         self.len = 0
+        self.columnar = columnar
+        self.frozen = False
+        if columnar:
+            self.count = np.empty(0)
+            self.ref_count = np.empty(0)
+            self.prop = np.empty(0)
+            self.ref_prop = np.empty(0)
+            self.relative_prop = np.empty(0)
+            self.p_val = np.empty(0)
+            self.int_count = np.empty(0, dtype=bool)
+            self.int_ref_count = np.empty(0, dtype=bool)
+        else:
+            self.count = list()
+            self.ref_count = list()
+            self.prop = list()
+            self.ref_prop = list()
+            self.relative_prop = list()
+            self.p_val = list()
+        self.index = dict()
+        self.children = dict()
+        self.dropped = dict()
+        self.__ids = PathColumn(self, 'id_paths')
+        self.__parents = PathColumn(self, 'parent_paths')
 
     def __str__(self):
         string = ''
@@ -94,17 +368,66 @@ class DataTable:
             string += f'{k}\n{"-"*len(k)}\n{v}\n'
         return string
 
+    @property
+    def ids(self) -> PathColumn:
+        """ Unique string IDs of all sectors """
+        return self.__ids
+
+    @ids.setter
+    def ids(self, ids: List[str]):
+        self.__ids[:] = ids
+
+    @property
+    def parents(self) -> PathColumn:
+        """ String IDs of the sectors parents ('' for the sectors without parent) """
+        return self.__parents
+
+    @parents.setter
+    def parents(self, parents: List[str]):
+        self.__parents[:] = parents
+
+    def __paths_changed(self):
+        """ Drop the decoded string IDs after a change of the path columns. """
+        self.__ids.strings = None
+        self.__parents.strings = None
+
     def get_data_dict(self):
-        return {IDS: self.ids, ONTO_ID: self.onto_ids, LABEL: self.labels, PARENT: self.parents,
+        if self.columnar:
+            n = self.len
+            relative_prop = self.relative_prop[:n]
+            return {IDS: list(self.ids), ONTO_ID: self.onto_ids, LABEL: self.labels,
+                    PARENT: list(self.parents),
+                    COUNT: column_to_list(self.count[:n], self.int_count[:n]),
+                    REF_COUNT: column_to_list(self.ref_count[:n], self.int_ref_count[:n]),
+                    PROP: column_to_list(self.prop[:n]),
+                    REF_PROP: column_to_list(self.ref_prop[:n]),
+                    RELAT_PROP: column_to_list(relative_prop,
+                                               np.mod(relative_prop, 1) == 0),
+                    PVAL: column_to_list(self.p_val[:n])}
+        return {IDS: list(self.ids), ONTO_ID: self.onto_ids, LABEL: self.labels,
+                PARENT: list(self.parents),
                 COUNT: self.count, REF_COUNT: self.ref_count, PROP: self.prop,
                 REF_PROP: self.ref_prop, RELAT_PROP: self.relative_prop, PVAL: self.p_val}
 
     def fill_parameters(self, set_abundance: Dict[str, float], ref_abundance: Dict[str, float],
                         parent_dict: Dict[str, List[str]], root_item: str,
-                        names: Dict[str, str] = None, ref_base: bool = True):
+                        names: Dict[str, str] = None, ref_base: bool = True,
+                        max_sectors: int = None, max_class_paths: int = None,
+                        primary_parent: bool = False):
         """ Fill DataTable list attributes (self.ids, self.onto_ids, self.labels, self.parents,
         self.count, self.ref_count)
 
+        A class with several parents has one sector per path to the root. The number of sectors
+        can be bounded by path budget policies, the number of sectors dropped by each policy being
+        printed and stored in self.dropped :
+        - primary_parent : one path per class, through its first parent (in parent_dict order)
+          having a path to the root
+        - max_class_paths : at most max_class_paths paths per class (the shortest ones)
+        - max_sectors : at most max_sectors sectors, the deepest ones being dropped
+        With primary_parent or max_class_paths, the paths are restricted while they are
+        enumerated, the paths of a class being built from the kept paths of its parents. The paths
+        of the classes are kept in self.paths, reused by the next DataTable sharing it.
+
         Parameters
         ----------
         set_abundance: Dict[str, float]
@@ -114,28 +437,63 @@ class DataTable:
             Dictionary associating for each class the number of objects found belonging to the class
             in the reference set
         parent_dict: Dict[str, List[str]]
-            Dictionary associating for each class, its parents classes
+            Dictionary associating for each class, its parents classes (or OntologyGraph)
         root_item: str
             Name of the root item of the ontology
         names: Dict[str, str]
             Dictionary associating for some or each ontology IDs, its label
         ref_base: bool
             True to have the reference as base, False otherwise
+        max_sectors: int (optional, default=None)
+            Maximum number of sectors, None for no maximum
+        max_class_paths: int (optional, default=None)
+            Maximum number of paths (sectors) per class, None for no maximum
+        primary_parent: bool (optional, default=False)
+            True to keep one path per class
         """
+        cycles = set()
         if ref_base:
-            for c_onto_id, c_ref_abundance in ref_abundance.items():
-                c_abundance = get_set2_abundance(set_abundance, c_onto_id)
-                self.__fill_id_parameter(c_onto_id, root_item, names, parent_dict, c_abundance,
-                                         c_ref_abundance)
+            abundances = [(c_onto_id, get_set2_abundance(set_abundance, c_onto_id), c_ref_abundance)
+                          for c_onto_id, c_ref_abundance in ref_abundance.items()]
         else:
-            for c_onto_id, c_abundance in set_abundance.items():
-                c_ref_abundance = get_set2_abundance(ref_abundance, c_onto_id)
-                self.__fill_id_parameter(c_onto_id, root_item, names, parent_dict, c_abundance,
-                                         c_ref_abundance)
+            abundances = [(c_onto_id, c_abundance, get_set2_abundance(ref_abundance, c_onto_id))
+                          for c_onto_id, c_abundance in set_abundance.items()]
+        restricted = primary_parent or max_class_paths is not None
+        counts = dict()
+        n_dropped = 0
+        classes_ids = list()
+        for c_onto_id, c_abundance, c_ref_abundance in abundances:
+            if c_onto_id != root_item:
+                c_ids = get_class_ids(c_onto_id, parent_dict, root_item, self.paths, cycles,
+                                      max_class_paths, primary_parent)
+                if restricted:
+                    n_dropped += count_class_ids(c_onto_id, parent_dict, root_item,
+                                                 counts) - len(c_ids)
+            else:
+                c_ids = [self.paths.get_path(root_item)]
+            classes_ids.append(c_ids)
+        for cycle in sorted(sorted(c) for c in cycles):
+            report_cycle(parent_dict, cycle, 'paths ignored')
+
+        self.dropped = dict()
+        if restricted:
+            self.dropped[PRIMARY_PARENT if primary_parent else MAX_CLASS_PATHS] = n_dropped
+        if max_sectors is not None:
+            n_sectors = sum(len(c_ids) for c_ids in classes_ids)
+            if n_sectors > max_sectors:
+                classes_ids = select_sectors(classes_ids, max_sectors, self.paths)
+            self.dropped[MAX_SECTORS] = max(n_sectors - max_sectors, 0)
+        for policy, n_dropped in self.dropped.items():
+            print(f'Path budget ({policy}) : {n_dropped} sectors dropped.')
+
+        for (c_onto_id, c_abundance, c_ref_abundance), c_ids in zip(abundances, classes_ids):
+            self.__fill_id_parameter(c_onto_id, root_item, names, c_abundance, c_ref_abundance,
+                                     c_ids)
+        if self.columnar:
+            self.freeze()
 
     def __fill_id_parameter(self, c_onto_id: str, root_item: str, names: Dict[str, str],
-                            parent_dict: Dict[str, List[str]], c_abundance: float,
-                            c_ref_abundance: float):
+                            c_abundance: float, c_ref_abundance: float, c_ids: List[int]):
         """ Fill DataTable list attributes (self.ids, self.onto_ids, self.labels, self.parents,
         self.count, self.ref_count) for one concept.
 
@@ -147,23 +505,20 @@ class DataTable:
             Root of the ontology
         names: Dict[str, str]
             Dictionary associating for some or each ontology IDs, its label
-        parent_dict: Dict[str: List[str]]
-            Dictionary associating for each class, its parents classes
         c_abundance: float
             Abundance of the concept in the interest set
         c_ref_abundance: float
             Abundance of the concept in the reference set
+        c_ids: List[int]
+            Unique IDs (paths to the root) of the concept sectors
         """
         if c_onto_id != root_item:
             c_label = get_name(c_onto_id, names)
-            all_c_ids = get_all_ids(c_onto_id, c_onto_id, parent_dict, root_item, set())
-            for c_id in all_c_ids:
-                self.add_value(m_id=c_id, onto_id=c_onto_id, label=c_label,
-                               count=c_abundance, ref_count=c_ref_abundance,
-                               parent=c_id[len(c_onto_id) + 2:])  # Remove c_label__ prefix
         else:
-            self.add_value(m_id=c_onto_id, onto_id=c_onto_id, label=c_onto_id,
-                           count=c_abundance, ref_count=c_ref_abundance, parent='')
+            c_label = c_onto_id
+        for c_id in c_ids:
+            self.__add_sector(c_id, c_onto_id, c_label, c_abundance, c_ref_abundance,
+                              self.paths.path_parents[c_id])
 
     def add_value(self, m_id: str, onto_id: str, label: str, count: float, ref_count: float,
                   parent: str):
@@ -184,12 +539,25 @@ class DataTable:
         parent: str
             Parent object class of the object class to add
         """
-        if m_id in self.ids:
-            raise ValueError(f'{m_id} already in data IDs, all IDs must be unique.')
-        self.ids.append(m_id)
+        self.__add_sector(self.paths.from_str(m_id), onto_id, label, count, ref_count,
+                          self.paths.from_str(parent))
+
+    def __add_sector(self, path: int, onto_id: str, label: str, count: float, ref_count: float,
+                     parent: int):
+        """ Fill the data attributes for an object class from its path and its parent path. """
+        if path in self.index:
+            raise ValueError(f'{self.paths.to_str(path)} already in data IDs, all IDs must be '
+                             f'unique.')
+        self.__paths_changed()
+        if self.columnar:
+            self.__add_row(path, onto_id, label, count, ref_count, parent)
+            return
+        self.index[path] = self.len
+        self.children.setdefault(parent, []).append(path)
+        self.id_paths.append(path)
         self.onto_ids.append(onto_id)
         self.labels.append(label)
-        self.parents.append(parent)
+        self.parent_paths.append(parent)
         self.count.append(count)
         self.ref_count.append(ref_count)
         self.prop.append(nan)
@@ -198,6 +566,86 @@ class DataTable:
         self.p_val.append(nan)
         self.len += 1
 
+    def __add_row(self, path: int, onto_id: str, label: str, count: float, ref_count: float,
+                  parent: int):
+        """ Add a row to the columns of a columnar DataTable, growing the numeric columns by one
+        chunk when they are full. """
+        if self.frozen:
+            raise ValueError(f'DataTable frozen, {self.paths.to_str(path)} can not be added.')
+        i = self.len
+        if i == len(self.count):
+            for column in ['count', 'ref_count', 'prop', 'ref_prop', 'relative_prop', 'p_val']:
+                grown = np.full(i + CHUNK_SIZE, nan)
+                grown[:i] = getattr(self, column)
+                setattr(self, column, grown)
+            for column in ['int_count', 'int_ref_count']:
+                grown = np.zeros(i + CHUNK_SIZE, dtype=bool)
+                grown[:i] = getattr(self, column)
+                setattr(self, column, grown)
+        self.index[path] = i
+        self.children.setdefault(parent, []).append(path)
+        self.id_paths.append(path)
+        self.onto_ids.append(sys.intern(onto_id))
+        self.labels.append(sys.intern(label))
+        self.parent_paths.append(parent)
+        self.count[i] = count
+        self.ref_count[i] = ref_count
+        self.int_count[i] = type(count) == int
+        self.int_ref_count[i] = type(ref_count) == int
+        self.len += 1
+
+    def freeze(self):
+        """ Trim the numeric columns of a columnar DataTable to its number of sectors. No value
+        can be added once frozen.
+        """
+        if self.columnar:
+            for column in ['count', 'ref_count', 'prop', 'ref_prop', 'relative_prop', 'p_val',
+                           'int_count', 'int_ref_count']:
+                setattr(self, column, getattr(self, column)[:self.len].copy())
+        self.frozen = True
+
+    def set_parent(self, v_index: int, parent: int):
+        """ Set the parent of a sector, keeping the children index up-to-date.
+
+        Parameters
+        ----------
+        v_index: int
+            Index of the sector
+        parent: int
+            Path of the new parent of the sector (NO_PATH for no parent)
+        """
+        path = self.id_paths[v_index]
+        siblings = self.children[self.parent_paths[v_index]]
+        siblings.remove(path)
+        if not siblings:
+            del self.children[self.parent_paths[v_index]]
+        self.parent_paths[v_index] = parent
+        self.children.setdefault(parent, []).append(path)
+        self.__parents.strings = None
+
+    def set_path(self, v_index: int, path: int):
+        """ Set the path (ID) of a sector, keeping the index and the children index up-to-date.
+
+        Parameters
+        ----------
+        v_index: int
+            Index of the sector
+        path: int
+            New path of the sector
+        """
+        old_path = self.id_paths[v_index]
+        if path == old_path:
+            return
+        if path in self.index:
+            raise ValueError(f'{self.paths.to_str(path)} already in data IDs, all IDs must be '
+                             f'unique.')
+        del self.index[old_path]
+        self.index[path] = v_index
+        siblings = self.children[self.parent_paths[v_index]]
+        siblings[siblings.index(old_path)] = path
+        self.id_paths[v_index] = path
+        self.__ids.strings = None
+
     def calculate_proportions(self, ref_base: bool):
         """ Calculate DataTable proportion list attributes (self.prop, self.ref_prop,
         self.relative_prop). If total add relative proportion to +1 parent for branch value.
@@ -207,60 +655,95 @@ class DataTable:
         ref_base: bool
             True if reference base representation
         """
+        if self.columnar and not self.frozen:
+            self.freeze()
         # Get total proportion
         max_abondance = int(np.nanmax(self.count))
-        self.prop = [x / max_abondance for x in self.count]
         # Get reference proportion
         max_ref_abondance = np.max(self.ref_count)
-        self.ref_prop = [x / max_ref_abondance for x in self.ref_count]
-        # Get proportion relative to +1 parent proportion for total branch value
-        self.relative_prop = [x for x in self.prop]
-        p = ''
-        self.__get_relative_prop(p, ref_base)
-        # IDK WHY IT WORKS ???
-        missed = [self.ids[i] for i in range(self.len) if self.relative_prop[i] < 1]
-        if missed:
-            parents = {self.parents[self.ids.index(m)] for m in missed}
-            for p in parents:
-                self.__get_relative_prop(p, ref_base)
-
-    def __get_relative_prop(self, p_id: str, ref_base: bool):
-        """ Get recursively relative proportion of a parent children to itself. Set it to class
-        self.relative_prop attribute.
+        if self.columnar:
+            self.prop = self.count / max_abondance
+            self.ref_prop = self.ref_count / max_ref_abondance
+            self.relative_prop = self.prop.copy()
+        else:
+            self.prop = [x / max_abondance for x in self.count]
+            self.ref_prop = [x / max_ref_abondance for x in self.ref_count]
+            # Get proportion relative to +1 parent proportion for total branch value
+            self.relative_prop = [x for x in self.prop]
+        reached = self.__get_relative_prop([NO_PATH], ref_base)
+        # Sectors not reached from the top (parent not in the table) : relative proportions of
+        # the descendants of their parents computed from the parents proportion
+        parents = {self.parent_paths[i] for i in np.flatnonzero(~reached)
+                   if self.relative_prop[i] < 1}
+        if parents:
+            self.__get_relative_prop(list(parents), ref_base)
+
+    def __get_relative_prop(self, p_ids: List[int], ref_base: bool) -> np.ndarray:
+        """ Get relative proportion of the descendants of parents, in a single top-down pass over
+        the children index, level by level (each level computed with array operations). Set it to
+        class self.relative_prop attribute.
+
+        The relative proportion of a sector is its part of its parent relative proportion :
+        count / total * parent relative proportion, total being the parent count or the sum of
+        its children counts if greater.
 
         Parameters
         ----------
-        p_id: str
-            ID of the parent
+        p_ids: List[int]
+            Paths of the parents (NO_PATH for the top of the tree)
         ref_base: bool
             True if reference base representation
+
+        Returns
+        -------
+        np.ndarray
+            True for the sectors whose relative proportion has been set
         """
         if ref_base:
-            base_count = self.ref_count
-        else:
-            base_count = self.count
-        if p_id == '':
-            prop_p = MAX_RELATIVE_NB
-            count_p = max(base_count)
+            base = self.ref_count
         else:
-            prop_p = self.relative_prop[self.ids.index(p_id)]
-            count_p = base_count[self.ids.index(p_id)]
-        index_p = [i for i, v in enumerate(self.parents) if v == p_id]
-        p_children = [self.ids[i] for i in index_p]
-        count_p_children = [base_count[i] for i in index_p]
-        if np.nansum(count_p_children) > count_p:
-            total = np.nansum(count_p_children)
-        else:
-            total = count_p
-        for i, c in enumerate(p_children):
-            if not ref_base and np.isnan(self.prop[self.ids.index(c)]):
-                prop_c = 0
-            else:
-                prop_c = int((count_p_children[i] / total) * prop_p)
-            self.relative_prop[self.ids.index(c)] = prop_c
-        for c in p_children:
-            if c in self.parents:
-                self.__get_relative_prop(c, ref_base)
+            base = self.count
+        base_count = np.asarray(base, dtype=float)
+        prop = np.asarray(self.prop, dtype=float)
+        relative_prop = np.asarray(self.relative_prop, dtype=float)
+        reached = np.zeros(self.len, dtype=bool)
+        props = [MAX_RELATIVE_NB if p == NO_PATH else relative_prop[self.index[p]]
+                 for p in p_ids]
+        counts = [max(base) if p == NO_PATH else base_count[self.index[p]] for p in p_ids]
+        while p_ids:
+            children = list()
+            starts = list()
+            p_props = list()
+            p_counts = list()
+            for p_id, prop_p, count_p in zip(p_ids, props, counts):
+                p_children = self.children.get(p_id)
+                if p_children:
+                    starts.append(len(children))
+                    children.extend(p_children)
+                    p_props.append(prop_p)
+                    p_counts.append(count_p)
+            if not children:
+                break
+            index = np.array([self.index[c] for c in children])
+            count_children = base_count[index]
+            sums = get_groups_nansum(count_children, starts)
+            totals = np.where(sums > p_counts, sums, p_counts)
+            sizes = np.diff(starts + [len(children)])
+            props = np.trunc(count_children / np.repeat(totals, sizes) * np.repeat(p_props, sizes))
+            if not ref_base:
+                props[np.isnan(prop[index])] = 0
+            if not np.all(np.isfinite(props)):
+                c_id = children[int(np.flatnonzero(~np.isfinite(props))[0])]
+                raise ValueError(f'Relative proportion of {self.paths.to_str(c_id)} can not be '
+                                 f'computed (NaN or null count of its parent).')
+            relative_prop[index] = props
+            reached[index] = True
+            p_ids = children
+            counts = count_children
+        if not self.columnar:
+            for i in np.flatnonzero(reached):
+                self.relative_prop[i] = int(relative_prop[i])
+        return reached
 
     def make_enrichment_analysis(self, test: str, scores: Dict[str, float] = None) \
             -> Dict[str, float]:
@@ -279,40 +762,52 @@ class DataTable:
         Dict[str, float]
             Dictionary of significant metabolic object label associated with their p-value
         """
-        nb_classes = len(set([self.labels[i] for i in range(self.len)
-                              if not np.isnan(self.count[i])]))
+        if self.columnar and not self.frozen:
+            self.freeze()
+        count = np.asarray(self.count, dtype=float)
+        ref_count = np.asarray(self.ref_count, dtype=float)
+        nb_classes = len({self.labels[i] for i in np.flatnonzero(~np.isnan(count))})
         significant_representation = dict()
         if scores is not None:
-            for i in range(self.len):
-                p_val = scores[self.onto_ids[i]]
-                self.p_val[i] = -np.log10(p_val)
-                if p_val < 0.05 / nb_classes:  # Keep significant p-values : Bonferroni
-                    significant_representation[self.onto_ids[i]] = p_val
+            p_vals = np.array([scores[onto_id] for onto_id in self.onto_ids], dtype=float)
+            tested = np.arange(self.len)
+            log_p_vals = -np.log10(p_vals)
         else:
             m = np.max(self.ref_count)  # M = ref set total item number
             n = int(np.nanmax(self.count))  # N = interest set total item number
-            for i in range(self.len):
-                if type(self.count[i]) == int:  # If count not nan (= if concept in interest set)
-                    # Binomial Test
-                    if test == BINOMIAL_TEST:
-                        p_val = stats.binomtest(self.count[i], n, self.ref_count[i] / m,
-                                                alternative='two-sided').pvalue
-                    # Hypergeometric Test
-                    elif test == HYPERGEO_TEST:
-                        p_val_upper = stats.hypergeom.sf(self.count[i] - 1, m, self.ref_count[i], n)
-                        p_val_lower = stats.hypergeom.cdf(self.count[i], m, self.ref_count[i], n)
-                        p_val = 2 * min(p_val_lower, p_val_upper)  # bilateral
-                    else:
-                        raise ValueError(
-                            f'test parameter must be in : {[BINOMIAL_TEST, HYPERGEO_TEST]}')
-                    if ((self.count[i] / n) - (self.ref_count[i] / m)) > 0:  # If over-represented :
-                        self.p_val[i] = -np.log10(p_val)  # Positive log10(p-value)
-                    else:  # If under-represented :
-                        self.p_val[i] = np.log10(p_val)  # Negative log10(p-value)
-                    if p_val < 0.05 / nb_classes:  # Keep significant p-values : Bonferroni
-                        significant_representation[self.onto_ids[i]] = p_val
-        significant_representation = dict(
-            sorted(significant_representation.items(), key=lambda item: item[1]))
+            # Concepts with a count (= concepts in interest set)
+            if self.columnar:
+                tested = np.flatnonzero(self.int_count)
+            else:
+                tested = np.array([i for i in range(self.len) if type(self.count[i]) == int],
+                                  dtype=int)
+            t_count = count[tested]
+            t_ref_count = ref_count[tested]
+            # Binomial Test
+            if test == BINOMIAL_TEST:
+                p_vals, log10_p_vals = get_log10_p_values(
+                    get_binomial_p_values, t_count, n, t_ref_count / m)
+            # Hypergeometric Test
+            elif test == HYPERGEO_TEST:
+                p_vals, log10_p_vals = get_log10_p_values(
+                    get_hypergeometric_p_values, t_count, m, t_ref_count, n)
+            elif len(tested):
+                raise ValueError(f'test parameter must be in : {[BINOMIAL_TEST, HYPERGEO_TEST]}')
+            else:
+                p_vals, log10_p_vals = np.empty(0), np.empty(0)
+            # Positive log10(p-value) if over-represented, negative if under-represented
+            over = ((t_count / n) - (t_ref_count / m)) > 0
+            log_p_vals = np.where(over, -log10_p_vals, log10_p_vals)
+        if self.columnar:
+            self.p_val[tested] = log_p_vals
+        else:
+            for i, log_p_val in zip(tested, log_p_vals):
+                self.p_val[i] = log_p_val
+        if len(tested):
+            # Keep significant p-values : Bonferroni, sorted by log10(p-value) (p-values can be 0)
+            significant = np.flatnonzero(p_vals < 0.05 / nb_classes)
+            for j in significant[np.argsort(-np.abs(log_p_vals[significant]), kind='stable')]:
+                significant_representation[self.onto_ids[tested[j]]] = p_vals[j]
         return significant_representation
 
     def cut_root(self, mode: str):
@@ -331,12 +826,16 @@ class DataTable:
                              f'must be in {[ROOT_UNCUT, ROOT_CUT, ROOT_TOTAL_CUT]}')
         if mode == ROOT_CUT or mode == ROOT_TOTAL_CUT:
             roots_ind = [i for i in range(self.len) if self.relative_prop[i] == MAX_RELATIVE_NB]
-            roots = [self.ids[i] for i in roots_ind]
+            roots = [self.id_paths[i] for i in roots_ind]
             self.delete_value(roots_ind)
-            if mode == ROOT_CUT:
-                self.parents = [str(x).split('__')[0] if x in roots else x for x in self.parents]
-            if mode == ROOT_TOTAL_CUT:
-                self.parents = ['' if x in roots else x for x in self.parents]
+            for root in roots:
+                if mode == ROOT_CUT:
+                    # First class of the root ID
+                    parent = self.paths.get_path(self.paths.path_names[root])
+                else:
+                    parent = NO_PATH
+                for c in list(self.children.get(root, [])):
+                    self.set_parent(self.index[c], parent)
 
     def cut_nested_path(self, mode: str, ref_base: bool):
         """ Cut nested path in the tree graph (path of nested sectors sharing the same value)
@@ -360,14 +859,12 @@ class DataTable:
         if mode != PATH_UNCUT:
             nested_paths = []
             for p_i in range(self.len):
-                p = self.ids[p_i]
-                p_children = [self.ids[i] for i in range(self.len) if self.parents[i] == p]
+                p_children = self.children.get(self.id_paths[p_i], [])
                 if len(p_children) == 1:
-                    p_p = self.parents[p_i]
-                    p_p_children = [self.ids[i] for i in range(self.len) if self.parents[i] == p_p]
+                    p_p_children = self.children.get(self.parent_paths[p_i], [])
                     if len(p_p_children) != 1:
                         p_count = count[p_i]
-                        c_i = self.ids.index(p_children[0])
+                        c_i = self.index[p_children[0]]
                         c_count = count[c_i]
                         if p_count == c_count:
                             nested_paths.append(self.get_full_nested_path(c_i, [p_i], count))
@@ -391,11 +888,10 @@ class DataTable:
             List of sector indexes of the nested path
         """
         n_path.append(p_i)
-        p = self.ids[p_i]
-        p_children = [self.ids[i] for i in range(self.len) if self.parents[i] == p]
+        p_children = self.children.get(self.id_paths[p_i], [])
         if len(p_children) == 1:
             p_count = count[p_i]
-            c_i = self.ids.index(p_children[0])
+            c_i = self.index[p_children[0]]
             c_count = count[c_i]
             if p_count == c_count:
                 n_path = self.get_full_nested_path(c_i, n_path, count)
@@ -422,23 +918,23 @@ class DataTable:
             for path in nested_paths:
                 to_del += path[:-1]
                 to_keep = path[-1]
-                root_p = self.parents[path[0]]
-                self.parents[to_keep] = root_p
+                root_p = self.parent_paths[path[0]]
+                self.set_parent(to_keep, root_p)
                 self.labels[to_keep] = '... ' + self.labels[to_keep]
         elif mode == PATH_HIGHER:
             for path in nested_paths:
                 to_del += path[1:]
                 to_keep = path[0]
-                to_keep_c = [i for i in range(self.len) if self.parents[i] == self.ids[path[-1]]]
-                for c_i in to_keep_c:
-                    self.parents[c_i] = self.ids[to_keep]
+                to_keep_c = list(self.children.get(self.id_paths[path[-1]], []))
+                for c in to_keep_c:
+                    self.set_parent(self.index[c], self.id_paths[to_keep])
                 self.labels[to_keep] += ' ...'
         elif mode == PATH_BOUND:
             for path in nested_paths:
                 to_del += path[1:-1]
                 to_keep_up = path[0]
                 to_keep_do = path[-1]
-                self.parents[to_keep_do] = self.ids[to_keep_up]
+                self.set_parent(to_keep_do, self.id_paths[to_keep_up])
                 if len(nested_paths) > 2:
                     self.labels[to_keep_up] += ' ...'
                     self.labels[to_keep_do] = '... ' + self.labels[to_keep_do]
@@ -452,13 +948,30 @@ class DataTable:
         v_index: int or List[int]
             Index or list of indexes of the sectors to delete
         """
-        data = self.get_data_dict()
         if type(v_index) == int:
             v_index = [v_index]
-        for i in sorted(v_index, reverse=True):
-            for k, v in data.items():
-                del v[i]
-            self.len -= 1
+        if self.columnar:
+            keep = np.ones(self.len, dtype=bool)
+            keep[list(v_index)] = False
+            for column in ['id_paths', 'onto_ids', 'labels', 'parent_paths']:
+                setattr(self, column, [v for v, k in zip(getattr(self, column), keep) if k])
+            for column in ['count', 'ref_count', 'prop', 'ref_prop', 'relative_prop', 'p_val',
+                           'int_count', 'int_ref_count']:
+                setattr(self, column, getattr(self, column)[:self.len][keep])
+            self.len = len(self.id_paths)
+        else:
+            columns = [self.id_paths, self.onto_ids, self.labels, self.parent_paths, self.count,
+                       self.ref_count, self.prop, self.ref_prop, self.relative_prop, self.p_val]
+            for i in sorted(v_index, reverse=True):
+                for column in columns:
+                    del column[i]
+                self.len -= 1
+        self.__paths_changed()
+        # Rows shifted : index rebuilt, children of deleted sectors kept under their path
+        self.index = {path: i for i, path in enumerate(self.id_paths)}
+        self.children = dict()
+        for path, parent in zip(self.id_paths, self.parent_paths):
+            self.children.setdefault(parent, []).append(path)
 
     def get_col(self, index: int or List[int] = None) -> List or List[List]:
         """ Get a DataTable column from its index or a list of columns from a list of indexes.
@@ -478,11 +991,10 @@ class DataTable:
             index = list(range(self.len))
         if type(index) == int:
             index = [index]
+        data = self.get_data_dict()
         cols = list()
         for i in index:
-            cols.append((self.ids[i], self.onto_ids[i], self.labels[i], self.parents[i],
-                         self.count[i], self.ref_count[i], self.prop[i], self.ref_prop[i],
-                         self.relative_prop[i], self.p_val[i]))
+            cols.append(tuple(v[i] for v in data.values()))
         return cols
 
 
@@ -490,9 +1002,10 @@ class DataTable:
 # FUNCTIONS
 # ==================================================================================================
 def get_all_ids(m_id: str, n_id: str, parent_dict: Dict[str, List[str]], root: str,
-                all_ids: Set[str]) -> Set[str]:
-    """ Return recursively all unique IDs associated with a label. The IDs correspond to the path
-    in the tree from the label to the root.
+                all_ids: Set[str], cycles: Set[FrozenSet[str]] = None) -> Set[str]:
+    """ Return all unique IDs associated with a label. The IDs correspond to the path in the tree
+    from the label to the root. Paths going back to a class already in the path (cycle of the
+    ontology) are ignored.
 
     Parameters
     ----------
@@ -506,22 +1019,434 @@ def get_all_ids(m_id: str, n_id: str, parent_dict: Dict[str, List[str]], root: s
         Name of the root item of the ontology
     all_ids: Set[str]
         Set of unique IDs associated with a concept label.
+    cycles: Set[FrozenSet[str]] (optional, default=None)
+        Set filled with the cycles (set of classes) found in the ontology.
 
     Returns
     -------
     Set[str]
         Set of all unique IDs associated with a concept label.
     """
-    parents = parent_dict[m_id]
-    for p in parents:
-        nn_id = n_id + '__' + p
-        if p == root:
-            all_ids.add(nn_id)
-        else:
-            all_ids = get_all_ids(p, nn_id, parent_dict, root, all_ids)
+    stack = [(m_id, n_id, (m_id,))]
+    while stack:
+        c_id, c_n_id, path = stack.pop()
+        for p in parent_dict[c_id]:
+            nn_id = c_n_id + '__' + p
+            if p == root:
+                all_ids.add(nn_id)
+            elif p in path:
+                if cycles is not None:
+                    cycles.add(frozenset(path[path.index(p):]))
+            else:
+                stack.append((p, nn_id, path + (p,)))
     return all_ids
 
 
+def get_class_ids(c_onto_id: str, parent_dict: Dict[str, List[str]], root: str,
+                  paths: PathTable, cycles: Set[FrozenSet[str]] = None,
+                  max_paths: int = None, primary_parent: bool = False) -> List[int]:
+    """ Return all unique IDs (paths to the root) of a class, computing the missing IDs of the
+    class and of its ancestors in paths.class_paths.
+
+    The ancestors are visited once, in topological order (see get_ancestor_components) : the IDs
+    of a class are its ID prefixed to the IDs of each of its parents. The IDs of the classes in a
+    cycle of the ontology depend on the path followed to reach them, they are enumerated from each
+    of these classes with get_all_ids. With a path budget policy (max_paths or primary_parent),
+    the IDs of each class are restricted, and the cycles are broken as in get_acyclic_parents.
+
+    Parameters
+    ----------
+    c_onto_id: str
+        Ontology ID of the class
+    parent_dict: Dict[str, List[str]]
+        Dictionary associating for each class, its parents classes
+    root: str
+        Name of the root item of the ontology
+    paths: PathTable
+        Paths table, its class_paths dictionary associating for each class its unique IDs is
+        filled with the missing classes
+    cycles: Set[FrozenSet[str]] (optional, default=None)
+        Set filled with the cycles (set of classes) found in the ontology.
+    max_paths: int (optional, default=None)
+        Maximum number of IDs per class (the shortest paths, then in alphabetical order)
+    primary_parent: bool (optional, default=False)
+        True to keep only the IDs through the first parent having IDs (one ID per class)
+
+    Returns
+    -------
+    List[int]
+        List of all unique IDs (paths) of the class, in an order not depending on the paths
+        already in the table.
+    """
+    class_paths = paths.class_paths
+    root_ids = (paths.get_path(root),)
+    restricted = primary_parent or max_paths is not None
+    for component in get_ancestor_components(c_onto_id, parent_dict, root, class_paths):
+        if len(component) > 1 or component[0] in parent_dict[component[0]]:
+            if not restricted:
+                for c in component:
+                    class_paths[c] = [paths.from_str(c_id) for c_id in
+                                      get_all_ids(c, c, parent_dict, root, set(), cycles)]
+                continue
+            if cycles is not None:
+                cycles.add(frozenset(component))
+        for c, c_parents in get_acyclic_parents(component, parent_dict):
+            parents_ids = [root_ids if p == root else class_paths[p]
+                           for p in dict.fromkeys(c_parents)]
+            if primary_parent:
+                parents_ids = [p_ids for p_ids in parents_ids if p_ids][:1]
+            c_ids = [paths.get_path(c, p_id) for p_ids in parents_ids for p_id in p_ids]
+            if max_paths is not None and len(c_ids) > max_paths:
+                c_ids = sorted(c_ids, key=lambda x: (paths.path_depths[x],
+                                                     paths.to_str(x)))[:max_paths]
+            class_paths[c] = c_ids
+    return class_paths[c_onto_id]
+
+
+def count_class_ids(c_onto_id: str, parent_dict: Dict[str, List[str]], root: str,
+                    counts: Dict[str, int]) -> int:
+    """ Return the number of unique IDs (paths to the root) of a class without enumerating them,
+    computing the missing numbers of the class and of its ancestors in counts. The cycles are
+    broken as in get_acyclic_parents.
+
+    Parameters
+    ----------
+    c_onto_id: str
+        Ontology ID of the class
+    parent_dict: Dict[str, List[str]]
+        Dictionary associating for each class, its parents classes
+    root: str
+        Name of the root item of the ontology
+    counts: Dict[str, int]
+        Dictionary associating for each class its number of unique IDs, filled with the missing
+        classes
+
+    Returns
+    -------
+    int
+        Number of unique IDs of the class.
+    """
+    for component in get_ancestor_components(c_onto_id, parent_dict, root, counts):
+        for c, c_parents in get_acyclic_parents(component, parent_dict):
+            counts[c] = sum(1 if p == root else counts[p] for p in set(c_parents))
+    return counts[c_onto_id]
+
+
+def get_ancestor_components(c_onto_id: str, parent_dict: Dict[str, List[str]], root: str,
+                            done: Dict[str, Any]) -> Iterator[List[str]]:
+    """ Yield the strongly connected components (classes in a same cycle) of the class and of its
+    ancestors not in done, in topological order (components of the parents before the components
+    of their children), using Tarjan algorithm.
+
+    The classes of each component must be added to done before the next component is yielded.
+
+    Parameters
+    ----------
+    c_onto_id: str
+        Ontology ID of the class
+    parent_dict: Dict[str, List[str]]
+        Dictionary associating for each class, its parents classes
+    root: str
+        Name of the root item of the ontology
+    done: Dict[str, Any]
+        Dictionary of the classes already visited
+
+    Yields
+    ------
+    List[str]
+        Classes of a strongly connected component
+    """
+    if c_onto_id in done:
+        return
+    order = {c_onto_id: 0}
+    low = {c_onto_id: 0}
+    stack = [c_onto_id]
+    on_stack = {c_onto_id}
+    to_visit = [(c_onto_id, iter(parent_dict[c_onto_id]))]
+    while to_visit:
+        c_id, parents = to_visit[-1]
+        for p in parents:
+            if p == root or p in done:
+                continue
+            if p not in order:
+                order[p] = low[p] = len(order)
+                stack.append(p)
+                on_stack.add(p)
+                to_visit.append((p, iter(parent_dict[p])))
+                break
+            if p in on_stack:
+                low[c_id] = min(low[c_id], order[p])
+        else:
+            to_visit.pop()
+            if to_visit:
+                child = to_visit[-1][0]
+                low[child] = min(low[child], low[c_id])
+            if low[c_id] == order[c_id]:
+                component = [stack.pop()]
+                while component[-1] != c_id:
+                    component.append(stack.pop())
+                on_stack.difference_update(component)
+                yield component
+
+
+def get_acyclic_parents(component: List[str], parent_dict: Dict[str, List[str]]) \
+        -> List[Tuple[str, List[str]]]:
+    """ Return the classes of a strongly connected component with their parents outside the
+    component or before them, breaking deterministically the cycles of the component. The classes
+    having parents outside the component come first, then the classes having parents among them,
+    and so on (alphabetical order for the classes of a same step).
+
+    Parameters
+    ----------
+    component: List[str]
+        Classes of a strongly connected component
+    parent_dict: Dict[str, List[str]]
+        Dictionary associating for each class, its parents classes
+
+    Returns
+    -------
+    List[Tuple[str, List[str]]]
+        List of (class, parents) tuples, parents first
+    """
+    if len(component) == 1:
+        c = component[0]
+        return [(c, [p for p in parent_dict[c] if p != c])]
+    classes = set(component)
+    before = set()
+    acyclic_parents = list()
+    step = sorted(c for c in component if any(p not in classes for p in parent_dict[c]))
+    while step:
+        for c in step:
+            acyclic_parents.append((c, [p for p in parent_dict[c]
+                                        if p not in classes or p in before]))
+            before.add(c)
+        step = sorted(c for c in classes - before if any(p in before for p in parent_dict[c]))
+    acyclic_parents.extend((c, []) for c in sorted(classes - before))
+    return acyclic_parents
+
+
+def select_sectors(classes_ids: List[List[int]], max_sectors: int, paths: PathTable) \
+        -> List[List[int]]:
+    """ Select at most max_sectors sectors, the lowest depths first (then by class and ID), so
+    that the parent of each selected sector is selected.
+
+    Parameters
+    ----------
+    classes_ids: List[List[int]]
+        List of the unique IDs (paths) of each class
+    max_sectors: int
+        Maximum number of sectors
+    paths: PathTable
+        Paths table of the IDs
+
+    Returns
+    -------
+    List[List[int]]
+        List of the selected unique IDs of each class, in their order
+    """
+    sectors = sorted((paths.path_depths[c_id], i, c_id) for i, c_ids in enumerate(classes_ids)
+                     for c_id in c_ids)
+    selected = sectors[:max_sectors]
+    if 0 < max_sectors < len(sectors) and sectors[max_sectors][:2] == selected[-1][:2]:
+        # Sectors of a same depth and class partly selected : selected in alphabetical order
+        group = selected[-1][:2]
+        n_group = sum(1 for s in selected if s[:2] == group)
+        group_ids = sorted((s[2] for s in sectors if s[:2] == group), key=paths.to_str)
+        selected = [s for s in selected if s[:2] != group] + \
+                   [group + (c_id,) for c_id in group_ids[:n_group]]
+    selected = {c_id for _, _, c_id in selected}
+    return [[c_id for c_id in c_ids if c_id in selected] for c_ids in classes_ids]
+
+
+def get_groups_nansum(values: np.ndarray, starts: List[int]) -> np.ndarray:
+    """ Return the sums of consecutive groups of values, NaN values being ignored, as numpy.nansum
+    of each group. Sums of integer values are computed at once, sums of other values (depending
+    on the summation order) are computed with numpy.sum for each group.
+
+    Parameters
+    ----------
+    values: np.ndarray
+        Values of the groups
+    starts: List[int]
+        Index of the first value of each (non-empty) group
+
+    Returns
+    -------
+    np.ndarray
+        Sum of each group
+    """
+    values = np.where(np.isnan(values), 0, values)
+    if np.array_equal(np.trunc(values), values) and np.all(np.abs(values) < 2 ** 53):
+        return np.add.reduceat(values, starts)
+    ends = starts[1:] + [len(values)]
+    return np.array([np.sum(values[start:end]) for start, end in zip(starts, ends)])
+
+
+def get_log10_p_values(p_values_function, *args: np.ndarray or float) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """ Return the p-values of tests and their log10. The p-values too small to be represented
+    (underflow to 0 or subnormal values) have their log10 computed in log space.
+
+    Parameters
+    ----------
+    p_values_function
+        Function computing the p-values of the tests from args (or their natural logarithm with
+        log=True)
+    args: np.ndarray or float
+        Parameters of the tests : one value or one value for each test
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        P-values and log10(p-values) of the tests
+    """
+    p_vals = p_values_function(*args)
+    with np.errstate(divide='ignore'):
+        log10_p_vals = np.log10(p_vals)
+    small = p_vals < np.finfo(float).tiny
+    if np.any(small):
+        args = [arg[small] if np.ndim(arg) else arg for arg in args]
+        log10_p_vals[small] = p_values_function(*args, log=True) / np.log(10)
+    return p_vals, log10_p_vals
+
+
+def get_binomial_p_values(k: np.ndarray, n: int, p: np.ndarray, log: bool = False) \
+        -> np.ndarray:
+    """ Two-sided binomial tests (as scipy.stats.binomtest) : probabilities of the numbers of
+    successes as likely or less likely than k among n trials with success probability p.
+
+    Parameters
+    ----------
+    k: np.ndarray
+        Number of successes of each test
+    n: int
+        Number of trials
+    p: np.ndarray
+        Success probability of each test
+    log: bool (optional, default=False)
+        True to compute the natural logarithm of the p-values
+
+    Returns
+    -------
+    np.ndarray
+        P-values (or natural logarithm of p-values) of the tests
+    """
+    if log:
+        pmf, add, one = stats.binom.logpmf, np.logaddexp, 0
+        with np.errstate(divide='ignore'):
+            d = pmf(k, n, p) + np.log1p(1e-7)
+
+        def cdf(x, *_):
+            return get_binomial_log_tail(x, n, p, upper=False)
+
+        def sf(x, *_):
+            return get_binomial_log_tail(x, n, p, upper=True)
+    else:
+        pmf, cdf, sf, add, one = stats.binom.pmf, stats.binom.cdf, stats.binom.sf, np.add, 1
+        d = pmf(k, n, p) * (1 + 1e-7)
+    mode = p * n
+    lower = k < mode
+    # Probabilities of the other side of the mode : decreasing from ceil(mode) to n if k is
+    # lower than the mode, increasing from 0 to floor(mode) otherwise.
+    # Binary search of the first value with a probability <= d (lower) or > d (upper)
+    lo = np.where(lower, np.ceil(mode), 0)
+    hi = np.where(lower, n, np.floor(mode)) + 1
+    while np.any(lo < hi):
+        searched = lo < hi
+        mid = (lo + hi) // 2
+        left = (pmf(mid, n, p) <= d) == lower
+        hi = np.where(searched & left, mid, hi)
+        lo = np.where(searched & ~left, mid + 1, lo)
+    p_vals = np.where(lower, add(cdf(k, n, p), sf(lo - 1, n, p)),
+                      add(cdf(lo - 1, n, p), sf(k - 1, n, p)))
+    return np.where(k == mode, one, np.minimum(one, p_vals))
+
+
+def get_binomial_log_tail(x: np.ndarray, n: int, p: np.ndarray, upper: bool) -> np.ndarray:
+    """ Natural logarithm of the binomial lower (cdf) or upper (sf) tail probabilities. Tails
+    underflowing to 0 are summed in log space from the log probabilities of their values.
+
+    Parameters
+    ----------
+    x: np.ndarray
+        Number of successes of each tail (excluded from upper tails)
+    n: int
+        Number of trials
+    p: np.ndarray
+        Success probability of each tail
+    upper: bool
+        True for upper tails P(X > x), False for lower tails P(X <= x)
+
+    Returns
+    -------
+    np.ndarray
+        Natural logarithm of the tail probabilities
+    """
+    x, p = np.broadcast_arrays(x, p)
+    with np.errstate(divide='ignore'):
+        log_tail = np.log(stats.binom.sf(x, n, p) if upper else stats.binom.cdf(x, n, p))
+    for i in np.flatnonzero(np.isneginf(log_tail)):
+        values = np.arange(x[i] + 1, n + 1) if upper else np.arange(0, x[i] + 1)
+        with np.errstate(divide='ignore'):
+            log_tail[i] = np.logaddexp.reduce(stats.binom.logpmf(values, n, p[i]))
+    return log_tail
+
+
+def get_hypergeometric_p_values(k: np.ndarray, m: int, r: np.ndarray, n: int,
+                                log: bool = False) -> np.ndarray:
+    """ Two-sided hypergeometric tests : twice the lowest tail probability of drawing k objects
+    of interest among n draws from a population of m objects, r of them of interest.
+
+    Parameters
+    ----------
+    k: np.ndarray
+        Number of drawn objects of interest of each test
+    m: int
+        Population size
+    r: np.ndarray
+        Number of objects of interest in the population of each test
+    n: int
+        Number of draws
+    log: bool (optional, default=False)
+        True to compute the natural logarithm of the p-values
+
+    Returns
+    -------
+    np.ndarray
+        P-values (or natural logarithm of p-values) of the tests
+    """
+    if log:
+        with np.errstate(divide='ignore'):
+            return np.log(2) + np.minimum(stats.hypergeom.logcdf(k, m, r, n),
+                                          stats.hypergeom.logsf(k - 1, m, r, n))
+    return 2 * np.minimum(stats.hypergeom.cdf(k, m, r, n), stats.hypergeom.sf(k - 1, m, r, n))
+
+
+def column_to_list(column: np.ndarray, int_values: np.ndarray = None) -> List:
+    """ Get the values of a numeric column of a columnar DataTable as a list : python floats,
+    numpy.nan for NaN values and int for the integer values.
+
+    Parameters
+    ----------
+    column: np.ndarray
+        Numeric column
+    int_values: np.ndarray (optional, default=None)
+        True for the values to get as int
+
+    Returns
+    -------
+    List
+        Values of the column
+    """
+    values = column.tolist()
+    for i in np.flatnonzero(np.isnan(column)):
+        values[i] = nan
+    if int_values is not None:
+        for i in np.flatnonzero(int_values & ~np.isnan(column)):
+            values[i] = int(values[i])
+    return values
+
+
 def get_set2_abundance(set2_abundances: Dict[str, float] or None, c_label: str) -> float:
     """ Get the set2 abundance of a set1 concept.
 
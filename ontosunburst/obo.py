@@ -0,0 +1,199 @@
+import gzip
+from typing import List, Dict, Set, Tuple, Iterator, FrozenSet
+
+from ontosunburst.ontology import write_class_ontology, get_chebi_role_id, ROOTS, GO, CHEBI, \
+    GO_ROOTS
+from ontosunburst.ontology_graph import get_topological_components
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+# ChEBI has role relation (RO_0000087), as written in chebi.obo files
+HAS_ROLE = {'has_role', 'RO:0000087'}
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+
+# Parsing
+# --------------------------------------------------------------------------------------------------
+def iter_obo_terms(obo_file: str) -> Iterator[Dict]:
+    """ Stream the terms of an OBO file (plain or gzipped), one [Term] stanza at a time. Only the
+    tags used to build class ontologies are kept.
+
+    Parameters
+    ----------
+    obo_file: str
+        Path of the OBO file (.obo or .obo.gz)
+
+    Returns
+    -------
+    Iterator[Dict]
+        Terms : dictionaries with the id (str), name (str), is_a (List[str] of parent IDs),
+        relationship (List[Tuple[str, str]] of (relation, target ID)) and is_obsolete (bool) keys
+    """
+    opener = gzip.open if obo_file.endswith('.gz') else open
+    term = None
+    with opener(obo_file, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('['):
+                if term is not None:
+                    yield term
+                term = None
+                if line.strip() == '[Term]':
+                    term = {'id': None, 'name': None, 'is_a': [], 'relationship': [],
+                            'is_obsolete': False}
+            elif term is not None:
+                tag, sep, value = line.partition(':')
+                if not sep:
+                    continue
+                if tag == 'id':
+                    term['id'] = value.strip()
+                elif tag == 'name':
+                    term['name'] = value.strip()
+                elif tag == 'is_a':
+                    term['is_a'].append(value.split()[0])
+                elif tag == 'relationship':
+                    relation, target = value.split()[:2]
+                    term['relationship'].append((relation, target))
+                elif tag == 'is_obsolete':
+                    term['is_obsolete'] = value.strip() == 'true'
+        if term is not None:
+            yield term
+
+
+# GO
+# --------------------------------------------------------------------------------------------------
+def build_go_ontology(obo_file: str, output: str) -> Tuple[str, str]:
+    """ Build the local GO class ontology from a GO OBO file (go-basic.obo), with the is_a
+    relations. The class ontology is the one built by extract_go_classes (go:XXXXXXX IDs, the 3 GO
+    roots classified in the GO root item) and can be used with
+    ontosunburst(ontology='go', class_ontology=output), without any SPARQL request.
+
+    Parameters
+    ----------
+    obo_file: str
+        Path of the GO OBO file (.obo or .obo.gz)
+    output: str
+        Path of the class ontology json file. Labels are written next to it (_labels.json suffix).
+
+    Returns
+    -------
+    Tuple[str, str]
+        Path of the class ontology json file, path of the labels json file
+    """
+    d_classes_ontology = dict()
+    d_labels = dict()
+    for term in iter_obo_terms(obo_file):
+        if term['is_obsolete'] or not term['id'].startswith('GO:'):
+            continue
+        go_id = term['id'].lower()
+        d_labels[go_id] = term['name']
+        if term['name'] in GO_ROOTS:
+            d_classes_ontology[go_id] = [ROOTS[GO]]
+        elif term['is_a']:
+            d_classes_ontology[go_id] = list(dict.fromkeys(p.lower() for p in term['is_a']))
+    print(f'{len(d_classes_ontology)} GO classes extracted.')
+    return write_class_ontology(d_classes_ontology, d_labels, output, ROOTS[GO])
+
+
+# ChEBI
+# --------------------------------------------------------------------------------------------------
+def build_chebi_ontology(obo_file: str, output: str) -> Tuple[str, str]:
+    """ Build the local ChEBI roles class ontology from a ChEBI OBO file (chebi.obo). The class
+    ontology is the one built by extract_chebi_roles for all the ChEBI IDs having roles (roles
+    hierarchy + each ChEBI ID classified in its most specific roles) and can be used with
+    ontosunburst(ontology='chebi', class_ontology=output), without any SPARQL request.
+
+    Roles of a ChEBI ID are the targets of the has role relations of the ID and of its is_a
+    ancestors, completed with their is_a ancestors.
+
+    Parameters
+    ----------
+    obo_file: str
+        Path of the ChEBI OBO file (.obo or .obo.gz)
+    output: str
+        Path of the class ontology json file. Labels are written next to it (_labels.json suffix).
+
+    Returns
+    -------
+    Tuple[str, str]
+        Path of the class ontology json file, path of the labels json file
+    """
+    d_is_a = dict()
+    d_targets = dict()
+    d_names = dict()
+    for term in iter_obo_terms(obo_file):
+        if term['is_obsolete'] or not term['id'].startswith('CHEBI:'):
+            continue
+        chebi_id = get_chebi_role_id(term['id'])
+        d_names[chebi_id] = term['name']
+        d_is_a[chebi_id] = [get_chebi_role_id(p) for p in term['is_a']]
+        targets = [get_chebi_role_id(t) for r, t in term['relationship'] if r in HAS_ROLE]
+        if targets:
+            d_targets[chebi_id] = targets
+
+    def get_parents(c):
+        return d_is_a.get(c, ())
+
+    # Roles of each class (has role targets of the class and its ancestors)
+    no_targets = frozenset()
+    inherited_targets = dict()
+    for component in get_topological_components(d_is_a, get_parents):
+        targets = set()
+        for c in component:
+            targets.update(d_targets.get(c, ()))
+            for p in get_parents(c):
+                targets.update(inherited_targets.get(p, no_targets))
+        targets = frozenset(targets) if targets else no_targets
+        for c in component:
+            inherited_targets[c] = targets
+
+    # Roles ontology
+    d_roles_ontology = dict()
+    d_labels = dict()
+    ancestors = dict()
+    leaf_roles = dict()
+    for chebi_id, targets in inherited_targets.items():
+        if not targets:
+            continue
+        if targets not in leaf_roles:
+            leaf_roles[targets] = _get_leaf_roles(targets, d_is_a, ancestors, d_roles_ontology)
+        if leaf_roles[targets]:
+            d_roles_ontology[chebi_id] = leaf_roles[targets]
+    for c, parents in d_roles_ontology.items():
+        d_labels[c] = d_names[c]
+        for p in parents:
+            d_labels[p] = d_names.get(p, p)
+    print(f'{len(d_roles_ontology)} ChEBI classes extracted.')
+    return write_class_ontology(d_roles_ontology, d_labels, output, ROOTS[CHEBI])
+
+
+def _get_leaf_roles(targets: FrozenSet[str], d_is_a: Dict[str, List[str]],
+                    ancestors: Dict[str, Set[str]], d_roles_ontology: Dict[str, List[str]]) \
+        -> List[str]:
+    roles = set()
+    parent_roles = set()
+    for target in targets:
+        if target not in ancestors:
+            ancestors[target] = _get_ancestors(target, d_is_a)
+        for role in ancestors[target]:
+            parents = d_is_a.get(role)
+            if parents:
+                roles.add(role)
+                parent_roles.update(parents)
+                d_roles_ontology[role] = parents
+    return sorted(roles.difference(parent_roles))
+
+
+def _get_ancestors(c: str, d_is_a: Dict[str, List[str]]) -> Set[str]:
+    ancestors = {c}
+    to_visit = [c]
+    while to_visit:
+        for p in d_is_a.get(to_visit.pop(), ()):
+            if p not in ancestors:
+                ancestors.add(p)
+                to_visit.append(p)
+    return ancestors
@@ -1,7 +1,19 @@
-from typing import List, Set, Dict, Tuple
+import os
+import json
+import weakref
+import threading
+from collections import OrderedDict, ChainMap
+from functools import lru_cache
+from typing import List, Set, Dict, Tuple, FrozenSet
 
 import numpy
-from SPARQLWrapper import SPARQLWrapper, JSON
+from scipy.sparse import csr_matrix
+
+from ontosunburst.ontology_graph import OntologyGraph, OntologyOverlay, \
+    get_topological_components, report_cycle
+from ontosunburst.compiled_ontology import compile_ontology
+from ontosunburst.sparql import sparql_iter_select, sparql_select_batches, SparqlCache, \
+    SPARQL_BATCH_SIZE, SPARQL_WORKERS
 
 
 # CONSTANTS ========================================================================================
@@ -20,6 +32,14 @@ ROOTS = {METACYC: 'FRAMES',
          KEGG: 'kegg'}
 
 GO_ROOTS = ['cellular_component', 'biological_process', 'molecular_function']
+CHEBI_ROLE_ROOT = '50906'
+
+# Number of GO hierarchy edges fetched by each SPARQL request of the GO ontology download
+GO_PAGE_SIZE = 50000
+LABELS_SUFFIX = '_labels.json'
+
+# Memoized ancestors : max number of classes cached per ontology
+ANCESTORS_CACHE_SIZE = 2 ** 17
 
 
 # ==================================================================================================
@@ -30,7 +50,7 @@ GO_ROOTS = ['cellular_component', 'biological_process', 'molecular_function']
 # --------------------------------------------------------------------------------------------------
 def extract_classes(ontology: str, concepts: List[str], root: str,
                     d_classes_ontology: Dict[str, List[str]] = None, endpoint_url: str = None,
-                    names: Dict[str, str] = None)\
+                    names: Dict[str, str] = None, sparql_cache: SparqlCache = None)\
         -> Tuple[Dict[str, Set[str]], Dict[str, List[str]], Dict[str, str] or None]:
     """ Extract all parent classes (until root) from a list of concepts.
 
@@ -45,8 +65,12 @@ def extract_classes(ontology: str, concepts: List[str], root: str,
     d_classes_ontology: Dict[str, List[str]], optional (default=None)
         Dictionary of the classes ontology associating for each concept its +1 parent classes.
     endpoint_url: str, optional (default=None)
-        URL for the SPARQL server (for GO and ChEBI ontologies)
+        URL for the SPARQL server (for GO and ChEBI ontologies). If None, GO and ChEBI concepts are
+        classified with d_classes_ontology (local ontology).
     names: Dict[str, str] (default=None)
+    sparql_cache: SparqlCache (optional, default=None)
+        Persistent cache of the SPARQL results (GO and ChEBI), None for the cache set by
+        ontosunburst.sparql.set_sparql_cache
 
     Returns
     -------
@@ -63,15 +87,21 @@ def extract_classes(ontology: str, concepts: List[str], root: str,
     if ontology == EC:
         leaf_classes, d_classes_ontology = extract_ec_classes(concepts, d_classes_ontology)
         return get_all_classes(leaf_classes, d_classes_ontology, root), d_classes_ontology, names
-    if ontology == CHEBI:
-        return extract_chebi_roles(concepts, endpoint_url)
-    if ontology == GO:
-        return extract_go_classes(concepts, endpoint_url)
+    if ontology == CHEBI or ontology == GO:
+        if endpoint_url is None and d_classes_ontology is not None:
+            # Local ontology (see download_go_ontology and ontosunburst.obo)
+            leaf_classes = extract_met_classes(concepts, d_classes_ontology)
+            return get_all_classes(leaf_classes, d_classes_ontology, root), d_classes_ontology, \
+                names
+        if ontology == CHEBI:
+            return extract_chebi_roles(concepts, endpoint_url, sparql_cache=sparql_cache)
+        return extract_go_classes(concepts, endpoint_url, sparql_cache=sparql_cache)
 
 
 # For MetaCyc and Kegg Ontology
 # --------------------------------------------------------------------------------------------------
-def extract_met_classes(concepts: List[str], d_classes_ontology: Dict[str, List[str]]) \
+def extract_met_classes(concepts: List[str],
+                        d_classes_ontology: Dict[str, List[str]] or OntologyGraph) \
         -> Dict[str, List[str]]:
     """ Extract +1 parent classes for each concept considered.
 
@@ -79,7 +109,7 @@ def extract_met_classes(concepts: List[str], d_classes_ontology: Dict[str, List[
     ----------
     concepts: List[str]
         List of concepts considered
-    d_classes_ontology: Dict[str, List[str]]
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
         Dictionary of the classes ontology associating for each concept its +1 parent classes.
 
     Returns
@@ -103,25 +133,27 @@ def extract_met_classes(concepts: List[str], d_classes_ontology: Dict[str, List[
 
 # For EC
 # --------------------------------------------------------------------------------------------------
-def extract_ec_classes(ec_list: List[str], d_classes_ontology: Dict[str, List[str]]) \
-        -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+def extract_ec_classes(ec_list: List[str],
+                       d_classes_ontology: Dict[str, List[str]] or OntologyGraph) \
+        -> Tuple[Dict[str, List[str]], OntologyOverlay]:
     """ Extract +1 parent classes for each EC number.
 
     Parameters
     ----------
     ec_list: List[str]
         List of EC numbers
-    d_classes_ontology: Dict[str, List[str]]
-        EC Ontology classes dictionary : Dict[object, List[parents]]
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        EC Ontology classes dictionary : Dict[object, List[parents]] (not modified)
 
     Returns
     -------
     Dict[str, List[str]]
         Dictionary associating for each metabolic object, the list of +1 parent classes it belongs
         to.
-    Dict[str, List[str]]
-        EC Ontology classes dictionary : Dict[object, List[parents]]
+    OntologyOverlay
+        EC Ontology classes dictionary with the EC numbers classified : Dict[object, List[parents]]
     """
+    d_classes_ontology = OntologyOverlay(d_classes_ontology)
     print(f'{len(ec_list)} EC numbers to classify')
     ec_classes = dict()
     for ec in ec_list:
@@ -147,16 +179,30 @@ def extract_ec_classes(ec_list: List[str], d_classes_ontology: Dict[str, List[st
 
 # For ChEBI Ontology
 # --------------------------------------------------------------------------------------------------
-def extract_chebi_roles(chebi_ids: List[str], endpoint_url: str) \
+def extract_chebi_roles(chebi_ids: List[str], endpoint_url: str,
+                        batch_size: int = SPARQL_BATCH_SIZE, n_workers: int = SPARQL_WORKERS,
+                        sparql_cache: SparqlCache = None) \
         -> Tuple[Dict[str, Set[str]], Dict[str, List[str]], Dict[str, str]]:
     """ Extract all parent classes for each chebi ID + Generate ontology dictionary.
 
+    The roles hierarchy is fetched once (see get_chebi_role_hierarchy), each ChEBI ID is only
+    queried for the roles it is directly linked to (has role relation) and its roles are completed
+    with their ancestors from the hierarchy. The ancestors of the roles out of the hierarchy are
+    queried separately (see get_chebi_role_ancestors).
+
     Parameters
     ----------
     chebi_ids: List[str]
         List of ChEBI IDs to extract roles associated
     endpoint_url: str
         URL endpoint string
+    batch_size: int (optional, default=SPARQL_BATCH_SIZE)
+        Number of ChEBI IDs queried in each SPARQL request
+    n_workers: int (optional, default=SPARQL_WORKERS)
+        Number of SPARQL requests in flight
+    sparql_cache: SparqlCache (optional, default=None)
+        Persistent cache of the SPARQL results, None for the cache set by
+        ontosunburst.sparql.set_sparql_cache
 
     Returns
     -------
@@ -165,86 +211,330 @@ def extract_chebi_roles(chebi_ids: List[str], endpoint_url: str) \
         Dictionary of roles ontology, associating for each role, its parent roles
         Dictionary of labels
     """
-    root_id = '50906'
+    d_role_parents, d_role_labels = get_chebi_role_hierarchy(endpoint_url, sparql_cache)
     d_roles_ontology = dict()
     all_roles = dict()
     d_labels = dict()
     chebi_ok = 0
     total_nb = len(chebi_ids)
+    chebi_results = sparql_select_batches(endpoint_url, chebi_ids, get_chebi_roles_query,
+                                          batch_size, n_workers, kind='chebi_role_targets',
+                                          cache=sparql_cache)
+    d_direct_roles = {chebi_id: {get_chebi_role_id(result['roleId'])
+                                 for result in chebi_results[chebi_id]}
+                      for chebi_id in chebi_ids}
+    outside_roles = get_roles_outside_hierarchy(d_direct_roles, d_role_parents)
+    if outside_roles:
+        d_outside_parents, d_outside_labels = get_chebi_role_ancestors(
+            outside_roles, endpoint_url, batch_size, n_workers, sparql_cache)
+        d_role_parents = ChainMap(d_role_parents, d_outside_parents)
+        d_role_labels = ChainMap(d_role_labels, d_outside_labels)
     for chebi_id in chebi_ids:
         roles = set()
-        sparql = SPARQLWrapper(endpoint_url)
-        sparql.setQuery(f"""
+        parent_roles = set()
+        to_visit = list(d_direct_roles[chebi_id])
+        visited = set(to_visit)
+        while to_visit:
+            role_id = to_visit.pop()
+            parents = d_role_parents.get(role_id)
+            if not parents:
+                continue
+            roles.add(role_id)
+            d_labels[role_id] = d_role_labels[role_id]
+            if role_id not in d_roles_ontology:
+                d_roles_ontology[role_id] = set()
+            d_roles_ontology[role_id].update(parents)
+            for parent_role_id in parents:
+                d_labels[parent_role_id] = d_role_labels[parent_role_id]
+                parent_roles.add(parent_role_id)
+                if parent_role_id not in visited:
+                    visited.add(parent_role_id)
+                    to_visit.append(parent_role_id)
+        if roles:
+            chebi_ok += 1
+            d_labels[chebi_id] = chebi_results[chebi_id][0]['moleculeLabel']
+            d_roles_ontology[chebi_id] = list(roles.difference(parent_roles))
+            roles.add(ROOTS[CHEBI])
+            all_roles[chebi_id] = roles
+        else:
+            print(f'No ChEBI role found for : {chebi_id}')
+
+    for c, p in d_roles_ontology.items():
+        d_roles_ontology[c] = list(p)
+    print(f'{chebi_ok}/{total_nb} chebi id with roles associated.')
+    return all_roles, d_roles_ontology, d_labels
+
+
+# ChEBI roles hierarchy of each endpoint
+_CHEBI_ROLE_HIERARCHIES = dict()
+
+
+def get_chebi_role_hierarchy(endpoint_url: str, sparql_cache: SparqlCache = None) \
+        -> Tuple[Dict[str, Set[str]], Dict[str, str]]:
+    """ Get the ChEBI roles hierarchy (all the roles under the CHEBI:50906 role root), fetched once
+    for each endpoint.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL endpoint string
+    sparql_cache: SparqlCache (optional, default=None)
+        Persistent cache of the SPARQL results, None for the cache set by
+        ontosunburst.sparql.set_sparql_cache
+
+    Returns
+    -------
+    Dict[str, Set[str]]
+        Dictionary associating for each role its +1 parent roles (shared, must not be modified)
+    Dict[str, str]
+        Dictionary of the roles labels (shared, must not be modified)
+    """
+    if endpoint_url in _CHEBI_ROLE_HIERARCHIES:
+        return _CHEBI_ROLE_HIERARCHIES[endpoint_url]
+    results = sparql_select_batches(endpoint_url, [CHEBI_ROLE_ROOT],
+                                    get_chebi_role_hierarchy_query,
+                                    kind='chebi_role_hierarchy',
+                                    cache=sparql_cache)[CHEBI_ROLE_ROOT]
+    d_role_parents, d_role_labels = get_chebi_role_links(results)
+    _CHEBI_ROLE_HIERARCHIES[endpoint_url] = d_role_parents, d_role_labels
+    return d_role_parents, d_role_labels
+
+
+def clear_chebi_role_hierarchies():
+    """ Drop the fetched ChEBI roles hierarchies of all the endpoints. """
+    _CHEBI_ROLE_HIERARCHIES.clear()
+
+
+def get_roles_outside_hierarchy(d_direct_roles: Dict[str, Set[str]],
+                                d_role_parents: Dict[str, Set[str]]) -> List[str]:
+    """ Get the roles, reached from the direct roles of ChEBI IDs, missing from a roles hierarchy
+    (roles which are not under the CHEBI:50906 role root, and parents of the role root).
+
+    Parameters
+    ----------
+    d_direct_roles: Dict[str, Set[str]]
+        Dictionary associating for each ChEBI ID the roles it is directly linked to
+    d_role_parents: Dict[str, Set[str]]
+        Dictionary associating for each role of the hierarchy its +1 parent roles
+
+    Returns
+    -------
+    List[str]
+        Roles missing from the hierarchy (sorted)
+    """
+    outside_roles = set()
+    to_visit = list(set().union(*d_direct_roles.values()))
+    visited = set(to_visit)
+    while to_visit:
+        role_id = to_visit.pop()
+        parents = d_role_parents.get(role_id)
+        if parents is None:
+            if role_id != ROOTS[CHEBI]:
+                outside_roles.add(role_id)
+            continue
+        for parent_role_id in parents:
+            if parent_role_id not in visited:
+                visited.add(parent_role_id)
+                to_visit.append(parent_role_id)
+    return sorted(outside_roles)
+
+
+def get_chebi_role_ancestors(role_ids: List[str], endpoint_url: str,
+                             batch_size: int = SPARQL_BATCH_SIZE,
+                             n_workers: int = SPARQL_WORKERS,
+                             sparql_cache: SparqlCache = None) \
+        -> Tuple[Dict[str, Set[str]], Dict[str, str]]:
+    """ Get the ancestors of ChEBI roles : each role and ancestor role with its +1 parent roles.
+
+    Parameters
+    ----------
+    role_ids: List[str]
+        List of role IDs
+    endpoint_url: str
+        URL endpoint string
+    batch_size: int (optional, default=SPARQL_BATCH_SIZE)
+        Number of role IDs queried in each SPARQL request
+    n_workers: int (optional, default=SPARQL_WORKERS)
+        Number of SPARQL requests in flight
+    sparql_cache: SparqlCache (optional, default=None)
+        Persistent cache of the SPARQL results, None for the cache set by
+        ontosunburst.sparql.set_sparql_cache
+
+    Returns
+    -------
+    Dict[str, Set[str]]
+        Dictionary associating for each role its +1 parent roles
+    Dict[str, str]
+        Dictionary of the roles labels
+    """
+    results = sparql_select_batches(endpoint_url, role_ids, get_chebi_role_ancestors_query,
+                                    batch_size, n_workers, kind='chebi_role_ancestors',
+                                    cache=sparql_cache)
+    return get_chebi_role_links([result for role_id in role_ids for result in results[role_id]])
+
+
+def get_chebi_role_links(results: List[Dict[str, str]]) \
+        -> Tuple[Dict[str, Set[str]], Dict[str, str]]:
+    """ Get the roles parents and labels from SPARQL results of roles with their +1 parent roles.
+
+    Parameters
+    ----------
+    results: List[Dict[str, str]]
+        SPARQL results (roleId, roleLabel, parentRoleId, parentRoleLabel)
+
+    Returns
+    -------
+    Dict[str, Set[str]]
+        Dictionary associating for each role its +1 parent roles
+    Dict[str, str]
+        Dictionary of the roles labels
+    """
+    d_role_parents = dict()
+    d_role_labels = dict()
+    for result in results:
+        role_id = get_chebi_role_id(result['roleId'])
+        parent_role_id = get_chebi_role_id(result['parentRoleId'])
+        d_role_labels[role_id] = result['roleLabel']
+        d_role_labels[parent_role_id] = result['parentRoleLabel']
+        if role_id not in d_role_parents:
+            d_role_parents[role_id] = set()
+        d_role_parents[role_id].add(parent_role_id)
+    return d_role_parents, d_role_labels
+
+
+def get_chebi_role_id(chebi_id: str) -> str:
+    """ Get the role ID of a ChEBI ID (CHEBI:XXXXX), the role root being renamed.
+
+    Parameters
+    ----------
+    chebi_id: str
+        ChEBI ID (CHEBI:XXXXX)
+
+    Returns
+    -------
+    str
+        Role ID (XXXXX or root name)
+    """
+    role_id = chebi_id.split(':')[1]
+    if role_id == CHEBI_ROLE_ROOT:
+        return ROOTS[CHEBI]
+    return role_id
+
+
+def get_chebi_roles_query(chebi_ids: List[str]) -> str:
+    """ Get the SPARQL query of the roles directly linked to ChEBI IDs (has role relation, on the
+    molecule or on its parent classes). Each result binds ?input to the ChEBI ID it was found for.
+
+    Parameters
+    ----------
+    chebi_ids: List[str]
+        List of ChEBI IDs
+
+    Returns
+    -------
+    str
+        SPARQL query
+    """
+    values = ' '.join(f'(chebidb:{chebi_id} "{chebi_id}")' for chebi_id in chebi_ids)
+    return f"""
         PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
         PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>
         PREFIX owl: <http://www.w3.org/2002/07/owl#>
-        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-        PREFIX dc: <http://purl.org/dc/elements/1.1/>
-        PREFIX dcterms: <http://purl.org/dc/terms/>
-        PREFIX chebi: <http://purl.obolibrary.org/obo/chebi/>
         PREFIX chebidb: <http://purl.obolibrary.org/obo/CHEBI_>
-        PREFIX chebirel: <http://purl.obolibrary.org/obo/chebi#>
         PREFIX obo: <http://purl.obolibrary.org/obo/>
         PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
-        PREFIX bp3: <http://www.biopax.org/release/biopax-level3.owl#>
     
-        SELECT DISTINCT ?molecule ?moleculeLabel ?roleId ?roleLabel ?parentRoleLabel ?parentRoleId
+        SELECT DISTINCT ?input ?moleculeLabel ?roleId
         WHERE {{
-            VALUES ?molecule{{ chebidb:{chebi_id}}}                                        
+            VALUES (?molecule ?input) {{ {values} }}
             
             ?molecule rdfs:label ?moleculeLabel .
             
             ?molecule rdfs:subClassOf+ ?restriction .
             ?restriction rdf:type owl:Restriction .
             ?restriction owl:onProperty obo:RO_0000087 .
-            ?restriction owl:someValuesFrom/(rdfs:subClassOf*) ?role .
+            ?restriction owl:someValuesFrom ?role .
+            
+            ?role oboInOwl:id ?roleId .
+        }}
+        """
+
+
+def get_chebi_role_hierarchy_query(root_ids: List[str]) -> str:
+    """ Get the SPARQL query of the roles hierarchy under roots : each role (root included) with its
+    +1 parent roles and their labels. Each result binds ?input to the root ID it was found for.
+
+    Parameters
+    ----------
+    root_ids: List[str]
+        List of ChEBI IDs of the roots
+
+    Returns
+    -------
+    str
+        SPARQL query
+    """
+    values = ' '.join(f'(chebidb:{root_id} "{root_id}")' for root_id in root_ids)
+    return f"""
+        PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX chebidb: <http://purl.obolibrary.org/obo/CHEBI_>
+        PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
+    
+        SELECT DISTINCT ?input ?roleId ?roleLabel ?parentRoleId ?parentRoleLabel
+        WHERE {{
+            VALUES (?root ?input) {{ {values} }}
             
+            ?role rdfs:subClassOf* ?root .
             ?role oboInOwl:id ?roleId .
+            ?role rdfs:label ?roleLabel .
             ?role rdfs:subClassOf ?parentRole .
             
             ?parentRole oboInOwl:id ?parentRoleId .
             ?parentRole rdfs:label ?parentRoleLabel .
-            ?role rdfs:label ?roleLabel .
         }}
-        """)
-        sparql.setReturnFormat(JSON)
-        results = sparql.query().convert()
-        parent_roles = set()
-        for result in results["results"]["bindings"]:
-            molecule_label = result['moleculeLabel']['value']
-            role_label = result['roleLabel']['value']
-            role_id = result['roleId']['value'].split(':')[1]
-            parent_role_label = result['parentRoleLabel']['value']
-            parent_role_id = result['parentRoleId']['value'].split(':')[1]
-            if role_id == root_id:
-                role_id = ROOTS[CHEBI]
-            if parent_role_id == root_id:
-                parent_role_id = ROOTS[CHEBI]
-            d_labels[role_id] = role_label
-            d_labels[parent_role_id] = parent_role_label
-            d_labels[chebi_id] = molecule_label
-            parent_roles.add(parent_role_id)
-            roles.add(role_id)
-            if role_id not in d_roles_ontology:
-                d_roles_ontology[role_id] = set()
-            d_roles_ontology[role_id].add(parent_role_id)
-        if roles:
-            chebi_ok += 1
-            d_roles_ontology[chebi_id] = list(roles.difference(parent_roles))
-            roles.add(ROOTS[CHEBI])
-            all_roles[chebi_id] = roles
-        else:
-            print(f'No ChEBI role found for : {chebi_id}')
+        """
 
-    for c, p in d_roles_ontology.items():
-        d_roles_ontology[c] = list(p)
-    print(f'{chebi_ok}/{total_nb} chebi id with roles associated.')
-    return all_roles, d_roles_ontology, d_labels
+
+def get_chebi_role_ancestors_query(role_ids: List[str]) -> str:
+    """ Get the SPARQL query of the ancestors of roles : each role (input role included) with its
+    +1 parent roles and their labels. Each result binds ?input to the role ID it was found for.
+
+    Parameters
+    ----------
+    role_ids: List[str]
+        List of role IDs
+
+    Returns
+    -------
+    str
+        SPARQL query
+    """
+    values = ' '.join(f'(chebidb:{role_id} "{role_id}")' for role_id in role_ids)
+    return f"""
+        PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX chebidb: <http://purl.obolibrary.org/obo/CHEBI_>
+        PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
+    
+        SELECT DISTINCT ?input ?roleId ?roleLabel ?parentRoleId ?parentRoleLabel
+        WHERE {{
+            VALUES (?start ?input) {{ {values} }}
+            
+            ?start rdfs:subClassOf* ?role .
+            ?role oboInOwl:id ?roleId .
+            ?role rdfs:label ?roleLabel .
+            ?role rdfs:subClassOf ?parentRole .
+            
+            ?parentRole oboInOwl:id ?parentRoleId .
+            ?parentRole rdfs:label ?parentRoleLabel .
+        }}
+        """
 
 
 # For GO Ontology
 # --------------------------------------------------------------------------------------------------
-def extract_go_classes(go_ids: List[str], endpoint_url: str) \
+def extract_go_classes(go_ids: List[str], endpoint_url: str,
+                       batch_size: int = SPARQL_BATCH_SIZE, n_workers: int = SPARQL_WORKERS,
+                       sparql_cache: SparqlCache = None) \
         -> Tuple[Dict[str, Set[str]], Dict[str, List[str]], Dict[str, str]]:
     """ Extract all parent classes for each GO ID + Generate ontology dictionary.
 
@@ -254,6 +544,13 @@ def extract_go_classes(go_ids: List[str], endpoint_url: str) \
         List of GO IDs
     endpoint_url: str
         URL endpoint string
+    batch_size: int (optional, default=SPARQL_BATCH_SIZE)
+        Number of GO IDs queried in each SPARQL request
+    n_workers: int (optional, default=SPARQL_WORKERS)
+        Number of SPARQL requests in flight
+    sparql_cache: SparqlCache (optional, default=None)
+        Persistent cache of the SPARQL results, None for the cache set by
+        ontosunburst.sparql.set_sparql_cache
 
     Returns
     -------
@@ -265,10 +562,50 @@ def extract_go_classes(go_ids: List[str], endpoint_url: str) \
     d_classes_ontology = dict()
     all_classes = dict()
     d_labels = dict()
+    go_results = sparql_select_batches(endpoint_url, go_ids, get_go_classes_query, batch_size,
+                                       n_workers, kind='go_classes', cache=sparql_cache)
     for go in go_ids:
         go_classes = set()
-        sparql = SPARQLWrapper(endpoint_url)
-        sparql.setQuery(f"""
+        for result in go_results[go]:
+            go_id = result['goId'].lower()
+            go_label = result['goLabel']
+            parent_id = result['parentGoId'].lower()
+            parent_label = result['parentGoLabel']
+            d_labels[go_id] = go_label
+            d_labels[parent_id] = parent_label
+            go_classes.add(parent_id)
+            if parent_label in GO_ROOTS:
+                d_classes_ontology[parent_id] = [ROOTS[GO]]
+            if go_id not in d_classes_ontology:
+                d_classes_ontology[go_id] = []
+            d_classes_ontology[go_id].append(parent_id)
+        if go_classes:
+            go_classes.add(ROOTS[GO])
+            all_classes[go] = go_classes
+        else:
+            print(f'No GO class found for : {go}')
+
+    for c, p in d_classes_ontology.items():
+        d_classes_ontology[c] = list(set(p))
+    return all_classes, d_classes_ontology, d_labels
+
+
+def get_go_classes_query(go_ids: List[str]) -> str:
+    """ Get the SPARQL query of the parent classes of GO IDs. Each result binds ?input to the GO ID
+    it was found for.
+
+    Parameters
+    ----------
+    go_ids: List[str]
+        List of GO IDs (go:XXXXXXX)
+
+    Returns
+    -------
+    str
+        SPARQL query
+    """
+    values = ' '.join(f'({go} "{go}")' for go in go_ids)
+    return f"""
         PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
         PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>
         PREFIX owl: <http://www.w3.org/2002/07/owl#>
@@ -282,9 +619,10 @@ def extract_go_classes(go_ids: List[str], endpoint_url: str) \
         PREFIX go: <http://purl.obolibrary.org/obo/GO_>
         PREFIX goavoc: <http://bio2rdf.org/goa_vocabulary:>
         
-        SELECT ?goLabel ?parentGoLabel ?goId ?parentGoId
+        SELECT ?input ?goLabel ?parentGoLabel ?goId ?parentGoId
         WHERE {{
-           {go} rdfs:subClassOf* ?go .
+           VALUES (?start ?input) {{ {values} }}
+           ?start rdfs:subClassOf* ?go .
            ?go oboInOwl:id ?goId .
            ?go rdfs:label ?goLabel .
            ?go rdf:type owl:Class .
@@ -293,36 +631,141 @@ def extract_go_classes(go_ids: List[str], endpoint_url: str) \
            ?parentGo oboInOwl:id ?parentGoId .
            ?parentGo rdf:type owl:Class .
         }}
-        """)
-        sparql.setReturnFormat(JSON)
-        results = sparql.query().convert()
-        for result in results["results"]["bindings"]:
-            go_id = result['goId']['value'].lower()
-            go_label = result['goLabel']['value']
-            parent_id = result['parentGoId']['value'].lower()
-            parent_label = result['parentGoLabel']['value']
-            d_labels[go_id] = go_label
+        """
+
+
+def download_go_ontology(endpoint_url: str, output: str, page_size: int = GO_PAGE_SIZE) \
+        -> Tuple[str, str]:
+    """ Download the whole GO classes hierarchy (is_a relations) and labels with paginated SPARQL
+    requests (results parsed while they are received), and write them as a local class ontology :
+    json file compiled with its ancestor index (see compiled_ontology) + labels json file. The
+    class ontology is the one built by extract_go_classes and can be used with
+    ontosunburst(ontology='go', class_ontology=output), without any SPARQL request.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL endpoint string
+    output: str
+        Path of the class ontology json file. Labels are written next to it (_labels.json suffix).
+    page_size: int (optional, default=GO_PAGE_SIZE)
+        Number of hierarchy relations fetched by each SPARQL request
+
+    Returns
+    -------
+    Tuple[str, str]
+        Path of the class ontology json file, path of the labels json file
+    """
+    d_classes_ontology = dict()
+    d_labels = dict()
+    offset = 0
+    while True:
+        n_results = 0
+        for result in sparql_iter_select(endpoint_url, get_go_ontology_query(page_size, offset)):
+            n_results += 1
+            go_id = result['goId'].lower()
+            parent_id = result['parentGoId'].lower()
+            parent_label = result['parentGoLabel']
+            d_labels[go_id] = result['goLabel']
             d_labels[parent_id] = parent_label
-            go_classes.add(parent_id)
             if parent_label in GO_ROOTS:
                 d_classes_ontology[parent_id] = [ROOTS[GO]]
-            if go_id not in d_classes_ontology:
-                d_classes_ontology[go_id] = []
-            d_classes_ontology[go_id].append(parent_id)
-        if go_classes:
-            go_classes.add(ROOTS[GO])
-            all_classes[go] = go_classes
-        else:
-            print(f'No GO class found for : {go}')
+            d_classes_ontology.setdefault(go_id, []).append(parent_id)
+        if n_results < page_size:
+            break
+        offset += page_size
+    print(f'{len(d_classes_ontology)} GO classes downloaded.')
+    return write_class_ontology(d_classes_ontology, d_labels, output, ROOTS[GO])
 
-    for c, p in d_classes_ontology.items():
-        d_classes_ontology[c] = list(set(p))
-    return all_classes, d_classes_ontology, d_labels
 
+def get_go_ontology_query(limit: int, offset: int) -> str:
+    """ Get the SPARQL query of a page of the GO classes hierarchy (is_a relations and labels).
+
+    Parameters
+    ----------
+    limit: int
+        Number of relations of the page
+    offset: int
+        Index of the first relation of the page
+
+    Returns
+    -------
+    str
+        SPARQL query
+    """
+    return f"""
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
 
-# Recursive class extraction function
+        SELECT DISTINCT ?goId ?goLabel ?parentGoId ?parentGoLabel
+        WHERE {{
+           ?go rdf:type owl:Class .
+           ?go oboInOwl:id ?goId .
+           ?go rdfs:label ?goLabel .
+           ?go rdfs:subClassOf ?parentGo .
+           ?parentGo rdf:type owl:Class .
+           ?parentGo oboInOwl:id ?parentGoId .
+           ?parentGo rdfs:label ?parentGoLabel .
+           FILTER(STRSTARTS(STR(?goId), "GO:") && STRSTARTS(STR(?parentGoId), "GO:"))
+        }}
+        ORDER BY ?goId ?parentGoId
+        LIMIT {limit}
+        OFFSET {offset}
+        """
+
+
+def write_class_ontology(d_classes_ontology: Dict[str, List[str]], d_labels: Dict[str, str],
+                         output: str, root_item: str) -> Tuple[str, str]:
+    """ Write a class ontology as a local class ontology : json file compiled with its ancestor
+    index (see compiled_ontology) + labels json file.
+
+    Parameters
+    ----------
+    d_classes_ontology: Dict[str, List[str]]
+        Class ontology associating for each class its +1 parent classes.
+    d_labels: Dict[str, str]
+        Dictionary of labels
+    output: str
+        Path of the class ontology json file. Labels are written next to it (_labels.json suffix).
+    root_item: str
+        Root item of the ontology
+
+    Returns
+    -------
+    Tuple[str, str]
+        Path of the class ontology json file, path of the labels json file
+    """
+    labels_output = get_labels_path(output)
+    with open(output, 'w') as f:
+        json.dump(d_classes_ontology, f)
+    with open(labels_output, 'w') as f:
+        json.dump(d_labels, f)
+    compile_ontology(output, root_item=root_item)
+    return output, labels_output
+
+
+def get_labels_path(path: str) -> str:
+    """ Get the path of the labels json file of a class ontology file.
+
+    Parameters
+    ----------
+    path: str
+        Path of the class ontology json file
+
+    Returns
+    -------
+    str
+        Path of the labels json file (same name, _labels.json suffix)
+    """
+    return os.path.splitext(path)[0] + LABELS_SUFFIX
+
+
+# Class extraction function
 # --------------------------------------------------------------------------------------------------
-def get_all_classes(obj_classes: Dict[str, List[str]], d_classes_ontology: Dict[str, List[str]],
+def get_all_classes(obj_classes: Dict[str, List[str]],
+                    d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
                     root_item: str) -> Dict[str, Set[str]]:
     """ Extract all parent classes for each metabolite.
 
@@ -330,8 +773,9 @@ def get_all_classes(obj_classes: Dict[str, List[str]], d_classes_ontology: Dict[
     ----------
     obj_classes: Dict[str, List[str]] (Dict[metabolite, List[class]])
         Dictionary associating for each object the list of +1 parent classes it belongs to.
-    d_classes_ontology: Dict[str, List[str]]
-        Dictionary of the classes ontology associating for each class its +1 parent classes.
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        Dictionary of the classes ontology associating for each class its +1 parent classes. If
+        an OntologyGraph with an ancestor index for root_item, the classes are read from the index.
     root_item: str
         Name of the root item of the ontology.
 
@@ -340,20 +784,20 @@ def get_all_classes(obj_classes: Dict[str, List[str]], d_classes_ontology: Dict[
     Dict[str, Set[str]] (Dict[metabolite, Set[class]])
         Dictionary associating for each metabolite the list of all parent classes it belongs to.
     """
+    if isinstance(d_classes_ontology, OntologyGraph) and \
+            d_classes_ontology.has_ancestor_index(root_item):
+        return d_classes_ontology.ancestor_index(root_item).get_all_classes(obj_classes)
+    ancestors_cache = get_ancestors_cache(d_classes_ontology, root_item)
     all_classes_met = dict()
     for met, classes in obj_classes.items():
-        all_classes = set(classes)
-        for c in classes:
-            if c != root_item:
-                m_classes = get_parents(c, set(d_classes_ontology[c]), d_classes_ontology, root_item)
-                all_classes = all_classes.union(m_classes)
-        all_classes_met[met] = all_classes
+        all_classes_met[met] = ancestors_cache.all_classes(tuple(classes))
     return all_classes_met
 
 
-def get_parents(child: str, parent_set: Set[str], d_classes_ontology: Dict[str, List[str]],
+def get_parents(child: str, parent_set: Set[str],
+                d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
                 root_item) -> Set[str]:
-    """ Get recursively from a child class, all its parents classes found in ontology.
+    """ Get from a child class, all its parents classes found in ontology.
 
     Parameters
     ----------
@@ -361,7 +805,7 @@ def get_parents(child: str, parent_set: Set[str], d_classes_ontology: Dict[str,
         Child class
     parent_set: Set[str]
         Set of all parents from previous classes
-    d_classes_ontology: Dict[str, List[str]]
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
         Dictionary of the classes ontology of MetaCyc associating for each class its parent classes.
     root_item: str
         Name of the root item of the ontology
@@ -371,15 +815,220 @@ def get_parents(child: str, parent_set: Set[str], d_classes_ontology: Dict[str,
     Set[str]
         Set of the union of the set  of child parent classes and the set of all previous parents.
     """
-    parents = d_classes_ontology[child]
-    for p in parents:
-        parent_set.add(p)
-    for p in parents:
-        if p != root_item:
-            parent_set = get_parents(p, parent_set, d_classes_ontology, root_item)
+    parent_set.update(get_ancestors_cache(d_classes_ontology, root_item).ancestors(child))
     return parent_set
 
 
+# Memoized ancestors
+# --------------------------------------------------------------------------------------------------
+class AncestorsCache:
+    """
+    AncestorsCache class: bounded (LRU) memo of the ancestors of the classes of an ontology.
+
+    The ancestors of each class are computed once and stored as a frozenset, shared by all the
+    classes and concepts whose parents resolve to the same classes. Missing ancestors are computed
+    iteratively in topological order; classes of a cycle share the same ancestors (themselves
+    included) and each cycle is reported once for the ontology (see
+    ontology_graph.report_cycle).
+
+    The cache of a loaded ontology is shared by all the threads using the ontology : it is read and
+    filled under a lock.
+
+    Attributes
+    ----------
+    self.d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        Dictionary of the classes ontology associating for each class its +1 parent classes.
+    self.root_item: str
+        Name of the root item of the ontology
+    self.version: int
+        Version of the ontology (number of modifications of an OntologyOverlay) when the cache was
+        created
+    self.maxsize: int
+        Maximum number of classes cached
+    self.cycles: Set[FrozenSet[str]]
+        Cycles found in the ontology
+    """
+    def __init__(self, d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
+                 root_item: str, maxsize: int = ANCESTORS_CACHE_SIZE):
+        self.d_classes_ontology = d_classes_ontology
+        self.root_item = root_item
+        self.version = getattr(d_classes_ontology, 'version', 0)
+        self.maxsize = maxsize
+        self.cycles = set()
+        self._lock = threading.RLock()
+        self._ancestors = OrderedDict()
+        self._all_classes_memo = lru_cache(maxsize=maxsize)(self._all_classes)
+
+    def ancestors(self, c: str) -> FrozenSet[str]:
+        """ Get all the parent classes of a class (until the root, the root not being expanded).
+
+        Parameters
+        ----------
+        c: str
+            Class
+
+        Returns
+        -------
+        FrozenSet[str]
+            All the parent classes of the class
+        """
+        if c == self.root_item:
+            return frozenset(self.d_classes_ontology[c])
+        with self._lock:
+            ancestors = self._ancestors.get(c)
+            if ancestors is not None:
+                self._ancestors.move_to_end(c)
+                return ancestors
+            return self._fill(c)
+
+    def all_classes(self, classes: Tuple[str]) -> FrozenSet[str]:
+        """ Get all the classes of a concept from its +1 parent classes (memoized).
+
+        Parameters
+        ----------
+        classes: Tuple[str]
+            +1 parent classes of the concept
+
+        Returns
+        -------
+        FrozenSet[str]
+            All the parent classes of the concept
+        """
+        with self._lock:
+            return self._all_classes_memo(classes)
+
+    def _fill(self, c: str) -> FrozenSet[str]:
+        """ Compute the ancestors of a class and of all its ancestors not cached yet (the lock
+        must be held).
+
+        Parameters
+        ----------
+        c: str
+            Class
+
+        Returns
+        -------
+        FrozenSet[str]
+            All the parent classes of the class
+        """
+        d_classes_ontology = self.d_classes_ontology
+        root_item = self.root_item
+        computed = dict()
+
+        def get_class_parents(x):
+            if x == root_item or x in self._ancestors:
+                return []
+            return d_classes_ontology[x]
+
+        for component in get_topological_components([c], get_class_parents):
+            x = component[0]
+            if x == root_item:
+                continue
+            if x in self._ancestors:
+                computed[x] = self._ancestors[x]
+                continue
+            ancestors = set()
+            for x in component:
+                for p in d_classes_ontology[x]:
+                    ancestors.add(p)
+                    if p != root_item and p in computed:
+                        ancestors |= computed[p]
+            ancestors = frozenset(ancestors)
+            if len(component) > 1 or component[0] in ancestors:
+                self._report_cycle(component)
+            for x in component:
+                computed[x] = ancestors
+        for x, ancestors in computed.items():
+            self._ancestors[x] = ancestors
+            self._ancestors.move_to_end(x)
+        self._ancestors.move_to_end(c)
+        while len(self._ancestors) > self.maxsize:
+            self._ancestors.popitem(last=False)
+        return computed[c]
+
+    def _report_cycle(self, component: List[str]):
+        """ Record a cycle of the ontology, printed once for the ontology.
+
+        Parameters
+        ----------
+        component: List[str]
+            Classes of the cycle
+        """
+        self.cycles.add(frozenset(component))
+        report_cycle(self.d_classes_ontology, component, 'ancestors merged')
+
+    def _all_classes(self, classes: Tuple[str]) -> FrozenSet[str]:
+        """ Get all the classes of a concept from its +1 parent classes.
+
+        Parameters
+        ----------
+        classes: Tuple[str]
+            +1 parent classes of the concept
+
+        Returns
+        -------
+        FrozenSet[str]
+            All the parent classes of the concept
+        """
+        if len(classes) == 1 and classes[0] != self.root_item:
+            return self.ancestors(classes[0]) | {classes[0]}
+        all_classes = set(classes)
+        for c in classes:
+            if c != self.root_item:
+                all_classes |= self.ancestors(c)
+        return frozenset(all_classes)
+
+    def clear(self):
+        """ Empty the cache. """
+        with self._lock:
+            self._ancestors.clear()
+            self._all_classes_memo.cache_clear()
+
+
+# Ancestors caches attached to the ontologies (weak references : freed with their ontology)
+_ANCESTORS_CACHES = weakref.WeakSet()
+_ANCESTORS_CACHES_LOCK = threading.Lock()
+
+
+def get_ancestors_cache(d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
+                        root_item: str) -> AncestorsCache:
+    """ Get the ancestors cache of an ontology. The cache of an OntologyGraph or an
+    OntologyOverlay is created at first use and kept with the ontology (in its ancestors_caches),
+    the cache of an OntologyOverlay being dropped when the overlay is modified. Dictionaries can be
+    modified in place without notice : a new cache is returned for each call.
+
+    Parameters
+    ----------
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        Dictionary of the classes ontology associating for each class its +1 parent classes.
+    root_item: str
+        Name of the root item of the ontology
+
+    Returns
+    -------
+    AncestorsCache
+        Ancestors cache of the ontology
+    """
+    caches = getattr(d_classes_ontology, 'ancestors_caches', None)
+    if caches is None:
+        return AncestorsCache(d_classes_ontology, root_item)
+    with _ANCESTORS_CACHES_LOCK:
+        cache = caches.get(root_item)
+        if cache is None or cache.version != getattr(d_classes_ontology, 'version', 0):
+            cache = AncestorsCache(d_classes_ontology, root_item)
+            caches[root_item] = cache
+            _ANCESTORS_CACHES.add(cache)
+        return cache
+
+
+def clear_ancestors_cache():
+    """ Empty the ancestors caches of all the ontologies. """
+    with _ANCESTORS_CACHES_LOCK:
+        caches = list(_ANCESTORS_CACHES)
+    for cache in caches:
+        cache.clear()
+
+
 # ==================================================================================================
 # ABUNDANCES CALCULATION
 # ==================================================================================================
@@ -454,6 +1103,140 @@ def get_classes_abundance(all_classes: Dict[str, Set[str]], abundances_dict: Dic
     return dict(reversed(sorted(classes_abondance.items(), key=lambda item: item[1])))
 
 
+def get_membership_matrix(all_classes: Dict[str, Set[str]], show_leaves: bool) \
+        -> Tuple[csr_matrix, List[str], List[str]]:
+    """ Build the sparse membership matrix of the concepts to their classes.
+
+    Parameters
+    ----------
+    all_classes: Dict[str, Set[str]] (Dict[metabolite, Set[class]])
+        Dictionary associating for each concept the list of all parent classes it belongs to.
+    show_leaves: bool
+        True to count each concept as a class (sunburst leaves)
+
+    Returns
+    -------
+    csr_matrix
+        Membership matrix (concepts x classes), matrix[i, j] = number of times concept i is counted
+        in class j
+    List[str]
+        Concepts (matrix rows)
+    List[str]
+        Classes (matrix columns), in the order of their first appearance
+    """
+    indices, indptr, classes = _get_membership_entries(all_classes, show_leaves)[:3]
+    matrix = csr_matrix((numpy.ones(len(indices), dtype=numpy.int64), indices, indptr),
+                        shape=(len(all_classes), len(classes)))
+    matrix.sum_duplicates()
+    return matrix, list(all_classes), classes
+
+
+def get_classes_abundance_sparse(all_classes: Dict[str, Set[str]],
+                                 abundances_dict: Dict[str, float], show_leaves: bool) \
+        -> Dict[str, float]:
+    """ Same as get_classes_abundance, the classes abundances being computed as one product of the
+    sparse membership matrix with the abundances vector.
+
+    Parameters
+    ----------
+    all_classes: Dict[str, Set[str]] (Dict[metabolite, Set[class]])
+        Dictionary associating for each concept the list of all parent classes it belongs to.
+    abundances_dict: Dict[str, float]
+        Dictionary associating for each concept, its abundance value
+    show_leaves: bool
+        True to show input metabolic objets at sunburst leaves
+
+    Returns
+    -------
+    Dict[str, float]
+        Dictionary associating for each class the weight of concepts found belonging to the class.
+    """
+    matrix, concepts, classes = get_membership_matrix(all_classes, show_leaves)
+    abundances = [abundances_dict[met] for met in concepts]
+    if all(isinstance(a, (int, numpy.integer)) for a in abundances):
+        abundances = numpy.array(abundances, dtype=numpy.int64)
+    else:
+        abundances = numpy.array(abundances, dtype=numpy.float64)
+    classes_abundance = (matrix.T @ abundances).tolist()
+    return dict(reversed(sorted(zip(classes, classes_abundance), key=lambda item: item[1])))
+
+
+def get_samples_classes_abundance(all_classes: Dict[str, Set[str]],
+                                  samples_abundances: numpy.ndarray, show_leaves: bool) \
+        -> List[Dict[str, float]]:
+    """ Compute the classes abundances of several samples at once, from the classes of the union of
+    their concepts : one product of the sparse membership matrix with the abundances matrix.
+
+    Each sample result is the get_classes_abundance result for the concepts having a non-zero
+    (and non-NaN) abundance in the sample, taken in the all_classes order.
+
+    Parameters
+    ----------
+    all_classes: Dict[str, Set[str]] (Dict[metabolite, Set[class]])
+        Dictionary associating for each concept (of all the samples) the list of all parent classes
+        it belongs to.
+    samples_abundances: numpy.ndarray (size n_samples x n_concepts)
+        Abundances of each concept of all_classes (columns, in the all_classes order) in each
+        sample (rows)
+    show_leaves: bool
+        True to show input metabolic objets at sunburst leaves
+
+    Returns
+    -------
+    List[Dict[str, float]]
+        For each sample, dictionary associating for each class the weight of concepts found
+        belonging to the class.
+    """
+    indices, indptr, classes, duplicates = _get_membership_entries(all_classes, show_leaves)
+    shape = (len(all_classes), len(classes))
+    matrix = csr_matrix((numpy.ones(len(indices), dtype=numpy.int64), indices, indptr), shape)
+    matrix.sum_duplicates()
+    # First appearance of each class : the larger the value, the earlier the class appears
+    appearance = numpy.arange(len(indices), 0, -1, dtype=numpy.int64)
+    appearance[duplicates] = 0
+    appearance = csr_matrix((appearance, indices, indptr), shape)
+    appearance.sum_duplicates()
+
+    samples_abundances = numpy.asarray(samples_abundances)
+    if not numpy.issubdtype(samples_abundances.dtype, numpy.integer):
+        samples_abundances = numpy.nan_to_num(samples_abundances.astype(numpy.float64))
+    samples_values = (matrix.T @ samples_abundances.T).T.tolist()
+
+    samples_classes_abundance = list()
+    for sample_abundances, values in zip(samples_abundances, samples_values):
+        rows = numpy.flatnonzero(sample_abundances)
+        if len(rows) == 0:
+            samples_classes_abundance.append(dict())
+            continue
+        first = appearance[rows].max(axis=0).toarray().ravel()
+        present = numpy.flatnonzero(first)
+        present = present[numpy.argsort(-first[present], kind='stable')]
+        classes_abundance = [(classes[j], values[j]) for j in present.tolist()]
+        samples_classes_abundance.append(
+            dict(reversed(sorted(classes_abundance, key=lambda item: item[1]))))
+    return samples_classes_abundance
+
+
+def _get_membership_entries(all_classes: Dict[str, Set[str]], show_leaves: bool) \
+        -> Tuple[List[int], List[int], List[str], List[int]]:
+    """ CSR entries (concepts x classes) of the membership matrix, in the order get_classes_abundance
+    meets the classes, with the positions of the entries counting a leaf twice in the same class.
+    """
+    classes_index = dict()
+    indices = list()
+    indptr = [0]
+    duplicates = list()
+    for met, classes in all_classes.items():
+        if show_leaves:
+            indices.append(classes_index.setdefault(met, len(classes_index)))
+            if met in classes:
+                duplicates.append(len(indices) + list(classes).index(met))
+        for c in classes:
+            indices.append(classes_index.setdefault(c, len(classes_index)))
+        indptr.append(len(indices))
+    return indices, indptr, list(classes_index), duplicates
+
+
 def get_classes_scores(all_classes, scores_dict, root):
     classes_scores = dict()
     for met, classes in all_classes.items():
@@ -469,14 +1252,14 @@ def get_classes_scores(all_classes, scores_dict, root):
 # UTILS
 # ==================================================================================================
 
-def reduce_d_ontology(d_classes_ontology: Dict[str, List[str]],
+def reduce_d_ontology(d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
                       classes_abundance: Dict[str, float]) -> Dict[str, List[str]]:
     """ Extract the sub-graph of the d_classes_ontology dictionary conserving only nodes implicated
     with the concepts studied.
 
     Parameters
     ----------
-    d_classes_ontology: Dict[str, List[str]]
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
         Dictionary of the ontology complete graph
     classes_abundance: Dict[str, float]
         Dictionary of abundances (keys are all nodes implicated to be conserved)
@@ -488,7 +1271,7 @@ def reduce_d_ontology(d_classes_ontology: Dict[str, List[str]],
         studied.
     """
     reduced_d_ontology = dict()
-    for k, v in d_classes_ontology.items():
-        if k in classes_abundance:
-            reduced_d_ontology[k] = v
+    for k in classes_abundance:
+        if k in d_classes_ontology:
+            reduced_d_ontology[k] = d_classes_ontology[k]
     return reduced_d_ontology
@@ -0,0 +1,601 @@
+import os
+import weakref
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from typing import List, Dict, Set, Tuple, Iterator, Iterable, Callable, Hashable
+
+import numpy as np
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+ANCESTORS_EXT = '.anc.npz'
+# Number of ontologies whose reported cycles are kept
+REPORTED_CYCLES_SIZE = 16
+
+
+# ==================================================================================================
+# CLASS
+# ==================================================================================================
+class OntologyGraph(Mapping):
+    """
+    OntologyGraph class: class ontology with interned class IDs and CSR parent arrays.
+
+    Each class ID (name) is interned to an integer index. Classes having parents (the keys of the
+    ontology dictionary) are interned first, in the dictionary order, followed by the classes only
+    found as parents (e.g. the root). Parents of key i are indices[offsets[i]:offsets[i + 1]].
+
+    The graph behaves as the Dict[str, List[str]] ontology dictionary it represents (same keys,
+    same order, same parents lists), so it can be passed wherever a d_classes_ontology dictionary
+    is expected.
+
+    Attributes
+    ----------
+    self.offsets: np.ndarray
+        CSR offsets of the parents of each key (size n_keys + 1)
+    self.indices: np.ndarray
+        CSR parents name indexes (size n_edges)
+    self.n_keys: int
+        Number of classes having parents (dictionary keys)
+    self.n_names: int
+        Number of interned names (keys and parent only classes)
+    self.ancestors_caches: Dict[str, AncestorsCache]
+        Memoized ancestors of the classes for each root (see ontology.get_ancestors_cache)
+    """
+    def __init__(self, names: List[str], offsets: np.ndarray, indices: np.ndarray,
+                 n_keys: int):
+        self._names = names
+        self._index = {n: i for i, n in enumerate(names)}
+        self.offsets = offsets
+        self.indices = indices
+        self.n_keys = n_keys
+        self.n_names = len(names)
+        self._ancestor_indexes = dict()
+        self._ancestor_indexes_lock = threading.RLock()
+        self.ancestors_caches = dict()
+
+    @classmethod
+    def from_dict(cls, d_classes_ontology: Dict[str, List[str]]) -> 'OntologyGraph':
+        """ Build an OntologyGraph from an ontology dictionary.
+
+        Parameters
+        ----------
+        d_classes_ontology: Dict[str, List[str]]
+            Dictionary of the classes ontology associating for each class its +1 parent classes.
+
+        Returns
+        -------
+        OntologyGraph
+            Graph of the ontology
+        """
+        names = list(d_classes_ontology)
+        index = {n: i for i, n in enumerate(names)}
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        indices = list()
+        for i, parents in enumerate(d_classes_ontology.values()):
+            for p in parents:
+                if p not in index:
+                    index[p] = len(names)
+                    names.append(p)
+                indices.append(index[p])
+            offsets[i + 1] = len(indices)
+        return cls(names, offsets, np.array(indices, dtype=np.int32), len(d_classes_ontology))
+
+    def __getitem__(self, key: str) -> List[str]:
+        i = self.index(key)
+        if i < 0 or i >= self.n_keys:
+            raise KeyError(key)
+        return [self.name(p) for p in self.parent_indexes(i)]
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and 0 <= self.index(key) < self.n_keys
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self.n_keys):
+            yield self.name(i)
+
+    def __len__(self) -> int:
+        return self.n_keys
+
+    def name(self, i: int) -> str:
+        """ Get the name interned at an index.
+
+        Parameters
+        ----------
+        i: int
+            Index of the name
+
+        Returns
+        -------
+        str
+            Name (class ID) interned at index i
+        """
+        return self._names[i]
+
+    def index(self, key: str) -> int:
+        """ Get the interned index of a name.
+
+        Parameters
+        ----------
+        key: str
+            Name (class ID) to look for
+
+        Returns
+        -------
+        int
+            Index of the name, -1 if the name is not interned
+        """
+        return self._index.get(key, -1)
+
+    def parent_indexes(self, i: int) -> List[int]:
+        """ Get the indexes of the +1 parents of a class.
+
+        Parameters
+        ----------
+        i: int
+            Index of the class
+
+        Returns
+        -------
+        List[int]
+            Indexes of the +1 parent classes (empty if the class has no parents)
+        """
+        if i >= self.n_keys:
+            return []
+        return self.indices[int(self.offsets[i]):int(self.offsets[i + 1])].tolist()
+
+    def has_ancestor_index(self, root_item: str) -> bool:
+        """ Check if the ancestor closure index of the graph for a root is already available.
+
+        Parameters
+        ----------
+        root_item: str
+            Name of the root item of the ontology
+
+        Returns
+        -------
+        bool
+            True if the index is available without being built, False otherwise
+        """
+        return root_item in self._ancestor_indexes
+
+    def ancestor_index(self, root_item: str) -> 'AncestorIndex':
+        """ Get the ancestor closure index of the graph for a root, built once (under a lock, the
+        graph being shared between threads) and kept with the graph.
+
+        Parameters
+        ----------
+        root_item: str
+            Name of the root item of the ontology
+
+        Returns
+        -------
+        AncestorIndex
+            Ancestor closure index of the graph
+        """
+        with self._ancestor_indexes_lock:
+            if root_item not in self._ancestor_indexes:
+                self._ancestor_indexes[root_item] = AncestorIndex.build(self, root_item)
+            return self._ancestor_indexes[root_item]
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        """ Convert the graph to an ontology dictionary.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            Dictionary of the classes ontology associating for each class its +1 parent classes.
+        """
+        return {k: v for k, v in self.items()}
+
+
+class AncestorIndex:
+    """
+    AncestorIndex class: transitive closure of the parents of each class of an OntologyGraph.
+
+    The ancestors of class i (all its parent classes until the root, the root not being expanded)
+    are ancestors[offsets[i]:offsets[i + 1]], sorted. Classes of a cycle share the same ancestors
+    (themselves included). Resolving all the classes of N concepts is
+    then N lookups instead of N upward walks of the ontology.
+
+    Attributes
+    ----------
+    self.graph: OntologyGraph
+        Graph of the ontology indexed
+    self.root_item: str
+        Name of the root item of the ontology
+    self.offsets: np.ndarray
+        CSR offsets of the ancestors of each interned class (size n_names + 1)
+    self.ancestors: np.ndarray
+        CSR ancestors indexes
+    """
+    def __init__(self, graph: OntologyGraph, root_item: str, offsets: np.ndarray,
+                 ancestors: np.ndarray):
+        self.graph = graph
+        self.root_item = root_item
+        self.offsets = offsets
+        self.ancestors = ancestors
+
+    @classmethod
+    def build(cls, graph: OntologyGraph, root_item: str) -> 'AncestorIndex':
+        """ Build the ancestor closure index of a graph.
+
+        Parameters
+        ----------
+        graph: OntologyGraph
+            Graph of the ontology
+        root_item: str
+            Name of the root item of the ontology
+
+        Returns
+        -------
+        AncestorIndex
+            Ancestor closure index of the graph
+        """
+        root_i = graph.index(root_item)
+        closure = [None] * graph.n_names
+        components = get_topological_components(
+            range(graph.n_names), lambda i: graph.parent_indexes(i) if i != root_i else [])
+        for component in components:
+            c_ancestors = set()
+            for c_i in component:
+                if c_i != root_i:
+                    for p in graph.parent_indexes(c_i):
+                        c_ancestors.add(p)
+                        if closure[p] is not None:
+                            c_ancestors.update(closure[p])
+            if len(component) > 1 or component[0] in c_ancestors:
+                report_cycle(graph, [graph.name(i) for i in component], 'ancestors merged')
+            for c_i in component:
+                closure[c_i] = c_ancestors
+        offsets = np.zeros(graph.n_names + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(c) for c in closure])
+        ancestors = np.empty(offsets[-1], dtype=np.int32)
+        for i, c in enumerate(closure):
+            ancestors[offsets[i]:offsets[i + 1]] = sorted(c)
+        return cls(graph, root_item, offsets, ancestors)
+
+    def save(self, path: str):
+        """ Save the index (npz file), to be loaded back with AncestorIndex.load.
+
+        Parameters
+        ----------
+        path: str
+            Path of the index file
+        """
+        np.savez(path, offsets=self.offsets, ancestors=self.ancestors,
+                 root_item=np.array(self.root_item),
+                 shape=np.array([self.graph.n_keys, self.graph.n_names, len(self.graph.indices)]))
+
+    @classmethod
+    def load(cls, path: str, graph: OntologyGraph) -> 'AncestorIndex':
+        """ Load an index saved with AncestorIndex.save.
+
+        Parameters
+        ----------
+        path: str
+            Path of the index file
+        graph: OntologyGraph
+            Graph of the ontology the index was built from
+
+        Returns
+        -------
+        AncestorIndex
+            Ancestor closure index of the graph
+        """
+        with np.load(path) as data:
+            shape = [int(x) for x in data['shape']]
+            if shape != [graph.n_keys, graph.n_names, len(graph.indices)]:
+                raise ValueError(f'Ancestor index {path} does not match the ontology graph.')
+            return cls(graph, str(data['root_item']), data['offsets'], data['ancestors'])
+
+    def ancestor_indexes(self, i: int) -> np.ndarray:
+        """ Get the ancestors indexes of a class (compact form).
+
+        Parameters
+        ----------
+        i: int
+            Index of the class
+
+        Returns
+        -------
+        np.ndarray
+            Sorted indexes of all the parent classes of the class (until the root)
+        """
+        return self.ancestors[self.offsets[i]:self.offsets[i + 1]]
+
+    def gather(self, indexes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Get the ancestors of several classes in CSR form (compact form).
+
+        Parameters
+        ----------
+        indexes: np.ndarray
+            Indexes of the classes
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            CSR offsets (size len(indexes) + 1) and ancestors indexes of the classes
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        starts = self.offsets[indexes]
+        lengths = self.offsets[indexes + 1] - starts
+        offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return offsets, self.ancestors[positions]
+
+    def ancestors_of(self, c: str) -> Set[str]:
+        """ Get all the parent classes of a class (until the root).
+
+        Parameters
+        ----------
+        c: str
+            Class
+
+        Returns
+        -------
+        Set[str]
+            Set of all the parent classes of the class
+        """
+        i = self.graph.index(c)
+        if i < 0:
+            raise KeyError(c)
+        return {self.graph.name(a) for a in self.ancestor_indexes(i).tolist()}
+
+    def get_all_classes(self, obj_classes: Dict[str, List[str]]) -> Dict[str, Set[str]]:
+        """ Extract all parent classes for each concept from the index.
+
+        Parameters
+        ----------
+        obj_classes: Dict[str, List[str]] (Dict[concept, List[class]])
+            Dictionary associating for each concept the list of +1 parent classes it belongs to.
+
+        Returns
+        -------
+        Dict[str, Set[str]] (Dict[concept, Set[class]])
+            Dictionary associating for each concept the set of all parent classes it belongs to.
+        """
+        graph = self.graph
+        all_classes_met = dict()
+        for met, classes in obj_classes.items():
+            met_i = graph.index(met)
+            if 0 <= met_i < graph.n_keys and graph.parent_indexes(met_i) == \
+                    [graph.index(c) for c in classes]:
+                all_classes_met[met] = {graph.name(a)
+                                        for a in self.ancestor_indexes(met_i).tolist()}
+            else:
+                all_classes = set(classes)
+                for c in classes:
+                    if c != self.root_item:
+                        all_classes |= self.ancestors_of(c)
+                all_classes_met[met] = all_classes
+        return all_classes_met
+
+
+class OntologyOverlay(MutableMapping):
+    """
+    OntologyOverlay class: copy-on-write view of a class ontology.
+
+    Classes added or modified through the overlay are recorded in the overlay only, the base
+    ontology (dictionary, OntologyGraph or CompiledOntology) is never modified : a single loaded
+    ontology can be shared between requests (and threads), each one classifying its concepts in
+    its own overlay.
+
+    Attributes
+    ----------
+    self.base: Dict[str, List[str]] or OntologyGraph
+        Base ontology (read only)
+    self.added: Dict[str, List[str]]
+        Classes added or modified in the overlay, associated to their +1 parent classes
+    self.version: int
+        Number of modifications of the overlay
+    self.ancestors_caches: Dict[str, AncestorsCache]
+        Memoized ancestors of the classes for each root (see ontology.get_ancestors_cache)
+    """
+    def __init__(self, base: Dict[str, List[str]] or OntologyGraph):
+        self.base = base
+        self.added = dict()
+        self.version = 0
+        self.ancestors_caches = dict()
+        self._deleted = set()
+        self._n_new = 0
+
+    def __getitem__(self, key: str) -> List[str]:
+        if key in self.added:
+            return self.added[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __setitem__(self, key: str, parents: List[str]):
+        if key in self._deleted:
+            self._deleted.discard(key)
+        elif key not in self:
+            self._n_new += 1
+        self.added[key] = parents
+        self.version += 1
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self.added.pop(key, None)
+        if key in self.base:
+            self._deleted.add(key)
+        else:
+            self._n_new -= 1
+        self.version += 1
+
+    def __contains__(self, key) -> bool:
+        return key in self.added or (key not in self._deleted and key in self.base)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.base:
+            if key not in self._deleted:
+                yield key
+        for key in self.added:
+            if key not in self.base:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self._deleted) + self._n_new
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+def as_ontology_graph(d_classes_ontology: Dict[str, List[str]] or OntologyGraph) \
+        -> OntologyGraph:
+    """ Get the OntologyGraph representation of an ontology, whichever representation is given.
+
+    Parameters
+    ----------
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        Dictionary of the classes ontology associating for each class its +1 parent classes, or
+        OntologyGraph.
+
+    Returns
+    -------
+    OntologyGraph
+        Graph of the ontology (the input itself if it already is an OntologyGraph)
+    """
+    if isinstance(d_classes_ontology, OntologyGraph):
+        return d_classes_ontology
+    return OntologyGraph.from_dict(d_classes_ontology)
+
+
+def get_topological_components(classes: Iterable[Hashable],
+                               get_class_parents: Callable[[Hashable], Iterable[Hashable]]) \
+        -> List[List[Hashable]]:
+    """ Get the strongly connected components of the classes reachable from a set of classes
+    (following the parents links), in topological order : each component comes after all the
+    components of its parents. Components with more than one class are cycles of the ontology.
+
+    Iterative (explicit stack) Tarjan algorithm : linear in the number of links, whatever the depth
+    of the ontology.
+
+    Parameters
+    ----------
+    classes: Iterable[Hashable]
+        Classes to start from
+    get_class_parents: Callable[[Hashable], Iterable[Hashable]]
+        Function returning the +1 parent classes of a class (return no parents to stop the
+        traversal at a class, e.g. the root)
+
+    Returns
+    -------
+    List[List[Hashable]]
+        Components (list of classes) in topological order (parents first)
+    """
+    index = dict()
+    low_link = dict()
+    on_stack = set()
+    stack = list()
+    components = list()
+    for start in classes:
+        if start in index:
+            continue
+        index[start] = low_link[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(get_class_parents(start)))]
+        while work:
+            c, parents = work[-1]
+            for p in parents:
+                if p not in index:
+                    index[p] = low_link[p] = len(index)
+                    stack.append(p)
+                    on_stack.add(p)
+                    work.append((p, iter(get_class_parents(p))))
+                    break
+                if p in on_stack:
+                    low_link[c] = min(low_link[c], index[p])
+            else:
+                work.pop()
+                if work:
+                    child = work[-1][0]
+                    low_link[child] = min(low_link[child], low_link[c])
+                if low_link[c] == index[c]:
+                    component = list()
+                    while True:
+                        x = stack.pop()
+                        on_stack.discard(x)
+                        component.append(x)
+                        if x == c:
+                            break
+                    components.append(component)
+    return components
+
+
+def get_ancestor_index_path(path: str) -> str:
+    """ Get the path of the ancestor index file saved next to an ontology file.
+
+    Parameters
+    ----------
+    path: str
+        Path of the ontology (json or compiled) file
+
+    Returns
+    -------
+    str
+        Path of the ancestor index file
+    """
+    return os.path.splitext(path)[0] + ANCESTORS_EXT
+
+
+# Reported cycles of each ontology : id -> (ontology reference, cycles). Dictionaries can not be
+# weakly referenced : they are kept (for the REPORTED_CYCLES_SIZE last ontologies) so their id is
+# not reused.
+_REPORTED_CYCLES = OrderedDict()
+_REPORTED_CYCLES_LOCK = threading.Lock()
+
+
+def report_cycle(d_classes_ontology: Dict[str, List[str]] or OntologyGraph,
+                 classes: Iterable[str], consequence: str) -> bool:
+    """ Print a cycle of an ontology, once for each ontology (the cycles of an OntologyOverlay
+    being reported once for its base ontology), whichever step found it.
+
+    Parameters
+    ----------
+    d_classes_ontology: Dict[str, List[str]] or OntologyGraph
+        Dictionary of the classes ontology associating for each class its +1 parent classes.
+    classes: Iterable[str]
+        Classes of the cycle
+    consequence: str
+        How the cycle is handled, printed after the classes
+
+    Returns
+    -------
+    bool
+        True if the cycle was printed, False if it was already reported
+    """
+    while isinstance(d_classes_ontology, OntologyOverlay):
+        d_classes_ontology = d_classes_ontology.base
+    cycle = frozenset(classes)
+    key = id(d_classes_ontology)
+    with _REPORTED_CYCLES_LOCK:
+        entry = _REPORTED_CYCLES.get(key)
+        if entry is None:
+            try:
+                ref = weakref.ref(d_classes_ontology,
+                                  lambda _, k=key: _REPORTED_CYCLES.pop(k, None))
+            except TypeError:
+                ref = d_classes_ontology
+            entry = (ref, set())
+            _REPORTED_CYCLES[key] = entry
+            while len(_REPORTED_CYCLES) > REPORTED_CYCLES_SIZE:
+                _REPORTED_CYCLES.popitem(last=False)
+        _REPORTED_CYCLES.move_to_end(key)
+        if cycle in entry[1]:
+            return False
+        entry[1].add(cycle)
+    print(f'Cycle between classes {", ".join(sorted(cycle))} : {consequence}.')
+    return True
+
+
+def clear_reported_cycles():
+    """ Forget the cycles reported for all the ontologies. """
+    with _REPORTED_CYCLES_LOCK:
+        _REPORTED_CYCLES.clear()
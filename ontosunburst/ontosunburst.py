@@ -1,13 +1,21 @@
 import os
 import json
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from time import time
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
 from ontosunburst.ontology import get_abundance_dict, get_classes_abundance, get_classes_scores, \
-    extract_classes, reduce_d_ontology, METACYC, CHEBI, EC, GO, KEGG, ROOTS
+    get_samples_classes_abundance, extract_classes, reduce_d_ontology, clear_ancestors_cache, \
+    get_labels_path, clear_chebi_role_hierarchies, METACYC, CHEBI, EC, GO, KEGG, ROOTS
 
-from ontosunburst.data_table_tree import DataTable, get_name, BINOMIAL_TEST, ROOT_CUT, PATH_UNCUT
+from ontosunburst.ontology_graph import clear_reported_cycles
+from ontosunburst.compiled_ontology import load_class_ontology
+from ontosunburst.sparql import get_sparql_cache
+from ontosunburst.cache import FILE_CACHE, load_json
+from ontosunburst.data_table_tree import DataTable, PathTable, get_name, BINOMIAL_TEST, ROOT_CUT, \
+    PATH_UNCUT
 from ontosunburst.sunburst_fig import generate_sunburst_fig, TOPOLOGY_A, ENRICHMENT_A
 
 # ==================================================================================================
@@ -53,6 +61,11 @@ def ontosunburst(interest_set: List[str],
                  path_cut: str = PATH_UNCUT,
                  ref_base: bool = False,
                  show_leaves: bool = False,
+                 columnar: bool = False,
+                 max_sectors: int = None,
+                 max_class_paths: int = None,
+                 primary_parent: bool = False,
+                 sparql_cache: str = None,
                  **kwargs) -> go.Figure:
     """ Main function to be called generating the sunburst figure
 
@@ -82,12 +95,18 @@ def ontosunburst(interest_set: List[str],
         True to write the html figure and tsv class files, False to only return plotly sunburst
         figure
     class_ontology: str or Dict[str, str] (optional, default=None)
-        Class ontology dictionary or json file.
+        Class ontology dictionary or json file. If a compiled sibling (.onto) of the json file
+        exists, it will be memory-mapped instead of parsing the json. Loaded files are kept in the
+        process-wide cache (see ontosunburst.ontosunburst.clear_cache). For GO and ChEBI, a local
+        ontology file (see ontosunburst.ontology.download_go_ontology and ontosunburst.obo) can be
+        used instead of SPARQL requests (endpoint_url must then be None).
     labels: str or Dict[str, str] (optional, default='default')
         Path to ID-LABELS association json file or ID-LABELS association dictionary or 'default'
-        to use default files. If None ontology IDs will be used as labels.
+        to use default files (labels file of the local GO or ChEBI ontology file). If None
+        ontology IDs will be used as labels.
     endpoint_url: str (optional, default=None)
-        URL of ChEBI or GO ontology for SPARQL requests
+        URL of ChEBI or GO ontology for SPARQL requests. If None and no class_ontology, the default
+        URL is used. Raises a ValueError if class_ontology is also given.
     test: str (optional, default='binomial', values in ['binomial', 'hypergeometric'])
         Type of test if analysis=enrichment, binomial or hypergeometric test.
     root_cut: str (optional, default='cut', values in ['uncut', 'cut', 'total'])
@@ -98,6 +117,19 @@ def ontosunburst(interest_set: List[str],
         True to have the base classes representation of the reference set in the figure.
     show_leaves: bool (optional, default=False)
         True to show input metabolic objets at sunburst leaves
+    columnar: bool (optional, default=False)
+        True to store the figure parameters in numpy arrays (DataTable columnar mode), faster for
+        figures with many sectors
+    max_sectors: int (optional, default=None)
+        Maximum number of sectors of the figure (the deepest ones are dropped), None for no maximum
+    max_class_paths: int (optional, default=None)
+        Maximum number of sectors (paths to the root) per class, None for no maximum
+    primary_parent: bool (optional, default=False)
+        True to keep one sector per class, through its first parent
+    sparql_cache: str (optional, default=None)
+        Directory of a persistent cache of the ChEBI and GO SPARQL results (see
+        ontosunburst.sparql.SparqlCache). If None, the process-wide cache set by
+        ontosunburst.sparql.set_sparql_cache is used (no cache if not set).
     **kwargs
 
     Returns
@@ -106,16 +138,221 @@ def ontosunburst(interest_set: List[str],
         Plotly graph_objects figure of the sunburst
     """
     start_time = time()
+    class_ontology, root, names, endpoint_url = _load_ontology(ontology, root, class_ontology,
+                                                               labels, endpoint_url)
+    if sparql_cache is not None:
+        sparql_cache = get_sparql_cache(sparql_cache)
+    # WORKFLOW -------------------------------------------------------------------------------------
+    fig = _global_analysis(ontology=ontology, analysis=analysis,
+                           metabolic_objects=interest_set, abundances=abundances,
+                           scores=scores,
+                           reference_set=reference_set, ref_abundances=ref_abundances,
+                           d_classes_ontology=class_ontology, endpoint_url=endpoint_url,
+                           output=output, write_output=write_output, names=names,
+                           test=test, root=root, root_cut=root_cut, path_cut=path_cut,
+                           ref_base=ref_base, show_leaves=show_leaves, columnar=columnar,
+                           max_sectors=max_sectors, max_class_paths=max_class_paths,
+                           primary_parent=primary_parent, sparql_cache=sparql_cache, **kwargs)
+    end_time = time()
+    print(f'Execution time : {end_time - start_time} seconds')
+    return fig
+
+
+def ontosunburst_batch(samples: Dict[str, Dict[str, float]] or pd.DataFrame,
+                       ontology: str = None,
+                       root: str = None,
+                       reference_set: List[str] = None,
+                       ref_abundances: List[float] = None,
+                       analysis: str = TOPOLOGY_A,
+                       output: str = 'sunburst',
+                       write_output: bool = True,
+                       class_ontology: str or Dict[str, str] = None,
+                       labels: str or Dict[str, str] = DEFAULT,
+                       endpoint_url: str = None,
+                       test: str = BINOMIAL_TEST,
+                       root_cut: str = ROOT_CUT,
+                       path_cut: str = PATH_UNCUT,
+                       ref_base: bool = False,
+                       show_leaves: bool = False,
+                       columnar: bool = False,
+                       max_sectors: int = None,
+                       max_class_paths: int = None,
+                       primary_parent: bool = False,
+                       sparql_cache: str = None,
+                       **kwargs) -> Dict[str, go.Figure]:
+    """ Generate the sunburst figure of several samples : the union of the samples concepts is
+    classified once and the classes abundances of all the samples are computed in one pass.
+
+    Parameters
+    ----------
+    samples: Dict[str, Dict[str, float]] or pd.DataFrame
+        Dictionary associating for each sample name the abundance of its concepts, or DataFrame of
+        the abundances (samples x concepts, numeric columns only). For each sample, the interest
+        set is the concepts having a non-zero (and non-NaN) abundance.
+    ontology: str (optional, default=None, values in ['metacyc', 'ec', 'chebi', 'kegg', 'go', None])
+        Ontology to use
+    root: str (optional, default=None)
+        Root item of the ontology.
+    reference_set: List[str] (optional, default=None)
+        Reference set of concepts (shared by all the samples)
+    ref_abundances: List[str] (optional, default=None)
+        Abundance values associated to reference_set list parameter
+    analysis: str (optional, default='topology', values in ['topology', 'enrichment'])
+        Analysis mode : topology or enrichment.
+    output: str (optional, default='sunburst')
+        Path prefix of the outputs, the outputs of each sample are {output}_{sample}.html and
+        {output}_{sample}.tsv files
+    write_output: bool (optional, default=True)
+        True to write the html figures and tsv class files, False to only return plotly sunburst
+        figures
+    class_ontology: str or Dict[str, str] (optional, default=None)
+        Class ontology dictionary or json file. For GO and ChEBI, a local ontology file can be used
+        instead of SPARQL requests (endpoint_url must then be None).
+    labels: str or Dict[str, str] (optional, default='default')
+        Path to ID-LABELS association json file or ID-LABELS association dictionary or 'default'
+        to use default files. If None ontology IDs will be used as labels.
+    endpoint_url: str (optional, default=None)
+        URL of ChEBI or GO ontology for SPARQL requests. If None and no class_ontology, the default
+        URL is used. Raises a ValueError if class_ontology is also given.
+    test: str (optional, default='binomial', values in ['binomial', 'hypergeometric'])
+        Type of test if analysis=enrichment, binomial or hypergeometric test.
+    root_cut: str (optional, default='cut', values in ['uncut', 'cut', 'total'])
+        mode for root cutting (uncut, cut or total)
+    path_cut: str (optional, default='uncut', values in ['uncut', 'deeper', 'higher', 'bound'])
+        mode for nested path cutting (uncut, deeper, higher or bound)
+    ref_base: bool (optional, default=False)
+        True to have the base classes representation of the reference set in the figure.
+    show_leaves: bool (optional, default=False)
+        True to show input metabolic objets at sunburst leaves
+    columnar: bool (optional, default=False)
+        True to store the figure parameters in numpy arrays (DataTable columnar mode), faster for
+        figures with many sectors
+    max_sectors: int (optional, default=None)
+        Maximum number of sectors of the figure (the deepest ones are dropped), None for no maximum
+    max_class_paths: int (optional, default=None)
+        Maximum number of sectors (paths to the root) per class, None for no maximum
+    primary_parent: bool (optional, default=False)
+        True to keep one sector per class, through its first parent
+    sparql_cache: str (optional, default=None)
+        Directory of a persistent cache of the ChEBI and GO SPARQL results (see
+        ontosunburst.sparql.SparqlCache). If None, the process-wide cache set by
+        ontosunburst.sparql.set_sparql_cache is used (no cache if not set).
+    **kwargs
+
+    Returns
+    -------
+    Dict[str, go.Figure]
+        Dictionary associating for each sample its plotly graph_objects figure of the sunburst
+    """
+    start_time = time()
+    class_ontology, root, names, endpoint_url = _load_ontology(ontology, root, class_ontology,
+                                                               labels, endpoint_url)
+    if sparql_cache is not None:
+        sparql_cache = get_sparql_cache(sparql_cache)
+    sample_names, concepts, samples_abundances = get_samples_matrix(samples)
+
+    # EXTRACT CLASSES (once for all the samples)
+    # ----------------------------------------------------------------------------------------------
+    obj_all_classes, d_classes_ontology, names = extract_classes(ontology, concepts, root,
+                                                                 class_ontology, endpoint_url,
+                                                                 names, sparql_cache)
+    if not obj_all_classes:
+        print('No object classified, passing.')
+    concepts_index = {c: i for i, c in enumerate(concepts)}
+    obj_all_classes = {c: classes for c, classes in obj_all_classes.items()
+                       if c in concepts_index}
+    samples_abundances = samples_abundances[:, [concepts_index[c] for c in obj_all_classes]]
+
+    # ABUNDANCES
+    # ----------------------------------------------------------------------------------------------
+    samples_classes_abundance = get_samples_classes_abundance(obj_all_classes, samples_abundances,
+                                                              show_leaves)
+    all_classes_abundance = dict()
+    for classes_abundance in samples_classes_abundance:
+        all_classes_abundance.update(classes_abundance)
+    ref_classes_abundance = None
+    if reference_set is not None:
+        ref_abundances_dict = get_abundance_dict(abundances=ref_abundances,
+                                                 metabolic_objects=reference_set,
+                                                 ref=True)
+        ref_all_classes, d_classes_ontology, names = extract_classes(ontology, reference_set, root,
+                                                                     d_classes_ontology,
+                                                                     endpoint_url, names,
+                                                                     sparql_cache)
+        ref_classes_abundance = get_classes_abundance(ref_all_classes, ref_abundances_dict,
+                                                      show_leaves)
+        all_classes_abundance.update(ref_classes_abundance)
+    d_classes_ontology = reduce_d_ontology(d_classes_ontology, all_classes_abundance)
+
+    # FIGURES
+    # ----------------------------------------------------------------------------------------------
+    paths = PathTable()
+    figures = dict()
+    for sample, sample_abundances, classes_abundance in zip(sample_names, samples_abundances,
+                                                           samples_classes_abundance):
+        sample_output = f'{output}_{sample}'
+        if write_output:
+            sample_concepts = [c for c, a in zip(obj_all_classes,
+                                                 np.nan_to_num(sample_abundances)) if a != 0]
+            write_met_classes(ontology, {c: obj_all_classes[c] for c in sample_concepts},
+                              sample_output, names)
+        figures[sample] = _data_table_analysis(
+            classes_abundance=classes_abundance, ref_classes_abundance=ref_classes_abundance,
+            classes_scores=None, d_classes_ontology=d_classes_ontology, analysis=analysis,
+            output=sample_output, write_output=write_output, names=names, test=test, root=root,
+            root_cut=root_cut, path_cut=path_cut, ref_base=ref_base, paths=paths,
+            columnar=columnar, max_sectors=max_sectors, max_class_paths=max_class_paths,
+            primary_parent=primary_parent, **kwargs)
+    end_time = time()
+    print(f'Execution time : {end_time - start_time} seconds')
+    return figures
+
+
+# ==================================================================================================
+#                                             FUNCTIONS
+# ==================================================================================================
+def _load_ontology(ontology: str, root: str, class_ontology: str or Dict[str, str],
+                   labels: str or Dict[str, str], endpoint_url: str) \
+        -> Tuple[Dict[str, List[str]] or None, str, Dict[str, str] or None, str or None]:
+    """ Load the class ontology and the labels of an analysis.
+
+    Parameters
+    ----------
+    ontology: str
+        Ontology to use
+    root: str
+        Root item of the ontology (if no default ontology)
+    class_ontology: str or Dict[str, str]
+        Class ontology dictionary or json file
+    labels: str or Dict[str, str]
+        Labels json file or dictionary or 'default'
+    endpoint_url: str
+        URL of ChEBI or GO ontology for SPARQL requests
+
+    Returns
+    -------
+    Dict[str, List[str]] or None
+        Class ontology
+    str
+        Root item of the ontology
+    Dict[str, str] or None
+        Dictionary of labels
+    str or None
+        URL of ChEBI or GO ontology for SPARQL requests
+    """
     # LOAD NAMES -----------------------------------------------------------------------------------
     if labels == DEFAULT:
-        if ontology is not None:
+        if (ontology == GO or ontology == CHEBI) and type(class_ontology) == str:
+            labels = get_labels_path(class_ontology)
+            if not os.path.isfile(labels):
+                labels = None
+        elif ontology is not None:
             labels = DEFAULT_NAMES[ontology]
         else:
             labels = None
     if labels is not None:
         if type(labels) == str:
-            with open(labels, 'r') as f:
-                names = json.load(f)
+            names = load_json(labels)
         else:
             names = labels
     else:
@@ -131,8 +368,14 @@ def ontosunburst(interest_set: List[str],
             if class_ontology is None:
                 class_ontology = DEFAULT_FILE[ontology]
         if type(class_ontology) == str:
-            with open(class_ontology, 'r') as f:
-                class_ontology = json.load(f)
+            class_ontology = load_class_ontology(class_ontology)
+    # LOCAL GO / CHEBI ONTOLOGY --------------------------------------------------------------------
+    elif (ontology == GO or ontology == CHEBI) and class_ontology is not None:
+        if endpoint_url is not None:
+            raise ValueError(f'For {ontology}, class_ontology (local ontology) and endpoint_url '
+                             f'(SPARQL requests) can not be both given.')
+        if type(class_ontology) == str:
+            class_ontology = load_class_ontology(class_ontology)
     # SPARQL URL INPUT -----------------------------------------------------------------------------
     elif ontology == CHEBI or ontology == GO:
         if endpoint_url is None:
@@ -143,26 +386,61 @@ def ontosunburst(interest_set: List[str],
     # GET ROOT -------------------------------------------------------------------------------------
     if ontology is not None:
         root = ROOTS[ontology]
-    # WORKFLOW -------------------------------------------------------------------------------------
-    fig = _global_analysis(ontology=ontology, analysis=analysis,
-                           metabolic_objects=interest_set, abundances=abundances,
-                           scores=scores,
-                           reference_set=reference_set, ref_abundances=ref_abundances,
-                           d_classes_ontology=class_ontology, endpoint_url=endpoint_url,
-                           output=output, write_output=write_output, names=names,
-                           test=test, root=root, root_cut=root_cut, path_cut=path_cut,
-                           ref_base=ref_base, show_leaves=show_leaves, **kwargs)
-    end_time = time()
-    print(f'Execution time : {end_time - start_time} seconds')
-    return fig
+    return class_ontology, root, names, endpoint_url
+
+
+def get_samples_matrix(samples: Dict[str, Dict[str, float]] or pd.DataFrame) \
+        -> Tuple[List[str], List[str], np.ndarray]:
+    """ Get the abundances matrix of several samples.
+
+    Parameters
+    ----------
+    samples: Dict[str, Dict[str, float]] or pd.DataFrame
+        Dictionary associating for each sample name the abundance of its concepts, or DataFrame of
+        the abundances (samples x concepts, numeric columns only, NaN for the concepts absent from
+        a sample).
+
+    Returns
+    -------
+    List[str]
+        Samples names (matrix rows)
+    List[str]
+        Concepts, union of the samples concepts in order of first appearance (matrix columns)
+    np.ndarray
+        Abundances matrix (samples x concepts), 0 for the concepts absent from a sample
+    """
+    if isinstance(samples, pd.DataFrame):
+        not_numeric = [str(c) for c, dtype in samples.dtypes.items()
+                       if not pd.api.types.is_numeric_dtype(dtype)]
+        if not_numeric:
+            more = ', ...' if len(not_numeric) > 10 else ''
+            raise ValueError(f'Samples abundances must be numeric, {len(not_numeric)} columns not '
+                             f'numeric : {", ".join(not_numeric[:10])}{more}')
+        missing = samples.isna().to_numpy()
+        if missing.any() or not all(pd.api.types.is_integer_dtype(dtype)
+                                    for dtype in samples.dtypes):
+            matrix = samples.to_numpy(dtype=np.float64, na_value=np.nan)
+            matrix[missing] = 0
+        else:
+            matrix = samples.to_numpy(dtype=np.int64)
+        return [str(s) for s in samples.index], [str(c) for c in samples.columns], matrix
+    concepts = dict()
+    for sample_abundances in samples.values():
+        for c in sample_abundances:
+            concepts.setdefault(c, len(concepts))
+    abundances = [a for sample_abundances in samples.values() for a in sample_abundances.values()]
+    dtype = np.int64 if all(isinstance(a, (int, np.integer)) for a in abundances) else np.float64
+    matrix = np.zeros((len(samples), len(concepts)), dtype=dtype)
+    for i, sample_abundances in enumerate(samples.values()):
+        for c, a in sample_abundances.items():
+            matrix[i, concepts[c]] = a
+    return [str(s) for s in samples], list(concepts), matrix
 
 
-# ==================================================================================================
-#                                             FUNCTIONS
-# ==================================================================================================
 def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores, reference_set,
                      ref_abundances, d_classes_ontology, endpoint_url, output, write_output, names,
-                     test, root, root_cut, path_cut, ref_base, show_leaves, **kwargs):
+                     test, root, root_cut, path_cut, ref_base, show_leaves, sparql_cache=None,
+                     **kwargs):
     """
 
     Parameters
@@ -184,6 +462,7 @@ def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores,
     path_cut
     ref_base
     show_leaves
+    sparql_cache
     kwargs
 
     Returns
@@ -194,7 +473,7 @@ def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores,
     # ----------------------------------------------------------------------------------------------
     obj_all_classes, d_classes_ontology, names = extract_classes(ontology, metabolic_objects, root,
                                                                  d_classes_ontology, endpoint_url,
-                                                                 names)
+                                                                 names, sparql_cache)
     if not obj_all_classes:
         print('No object classified, passing.')
     if write_output:
@@ -214,7 +493,8 @@ def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores,
                                                  ref=True)
         ref_all_classes, d_classes_ontology, names = extract_classes(ontology, reference_set, root,
                                                                      d_classes_ontology,
-                                                                     endpoint_url, names)
+                                                                     endpoint_url, names,
+                                                                     sparql_cache)
         ref_classes_abundance = get_classes_abundance(ref_all_classes, ref_abundances_dict,
                                                       show_leaves)
     else:
@@ -226,20 +506,65 @@ def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores,
 
     # DATA TABLE
     # ----------------------------------------------------------------------------------------------
-    data = DataTable()
     if ref_classes_abundance is not None:
         d_classes_ontology = reduce_d_ontology(d_classes_ontology,
                                                {**ref_classes_abundance, **classes_abundance})
+    else:
+        d_classes_ontology = reduce_d_ontology(d_classes_ontology, classes_abundance)
+    return _data_table_analysis(classes_abundance=classes_abundance,
+                                ref_classes_abundance=ref_classes_abundance,
+                                classes_scores=classes_scores,
+                                d_classes_ontology=d_classes_ontology, analysis=analysis,
+                                output=output, write_output=write_output, names=names, test=test,
+                                root=root, root_cut=root_cut, path_cut=path_cut, ref_base=ref_base,
+                                **kwargs)
+
+
+def _data_table_analysis(classes_abundance, ref_classes_abundance, classes_scores,
+                         d_classes_ontology, analysis, output, write_output, names, test, root,
+                         root_cut, path_cut, ref_base, paths=None, columnar=False,
+                         max_sectors=None, max_class_paths=None, primary_parent=False, **kwargs):
+    """ Fill the DataTable of the classes abundances, make the analysis and generate the figure.
+
+    Parameters
+    ----------
+    classes_abundance
+    ref_classes_abundance
+    classes_scores
+    d_classes_ontology
+    analysis
+    output
+    write_output
+    names
+    test
+    root
+    root_cut
+    path_cut
+    ref_base
+    paths
+    columnar
+    max_sectors
+    max_class_paths
+    primary_parent
+    kwargs
+
+    Returns
+    -------
+
+    """
+    data = DataTable(columnar, paths)
+    if ref_classes_abundance is not None:
         ref_set = True
         data.fill_parameters(set_abundance=classes_abundance, ref_abundance=ref_classes_abundance,
                              parent_dict=d_classes_ontology, root_item=root, names=names,
-                             ref_base=ref_base)
+                             ref_base=ref_base, max_sectors=max_sectors,
+                             max_class_paths=max_class_paths, primary_parent=primary_parent)
     else:
         ref_set = False
-        d_classes_ontology = reduce_d_ontology(d_classes_ontology, classes_abundance)
         data.fill_parameters(set_abundance=classes_abundance, ref_abundance=classes_abundance,
                              parent_dict=d_classes_ontology,  root_item=root, names=names,
-                             ref_base=ref_base)
+                             ref_base=ref_base, max_sectors=max_sectors,
+                             max_class_paths=max_class_paths, primary_parent=primary_parent)
     data.calculate_proportions(ref_base)
     significant = None
     if analysis == ENRICHMENT_A:
@@ -254,6 +579,17 @@ def _global_analysis(ontology, analysis, metabolic_objects, abundances, scores,
                                  write_fig=write_output, **kwargs)
 
 
+def clear_cache():
+    """ Drop the ontologies and labels kept in the process-wide cache (closing the memory-mapped
+    ontologies), the memoized ancestors of the ontologies, the fetched ChEBI roles hierarchies and
+    the cycles reported for each ontology.
+    """
+    FILE_CACHE.clear()
+    clear_ancestors_cache()
+    clear_chebi_role_hierarchies()
+    clear_reported_cycles()
+
+
 def write_met_classes(ontology: str, all_classes: Dict[str, List[str]], output: str,
                       names: Dict[str, str]):
     """ Writes, for each input class, all its ancestors in a .tsv file.
@@ -0,0 +1,599 @@
+import io
+import os
+import csv
+import json
+import time
+import sqlite3
+import heapq
+import threading
+import http.client
+from collections import deque
+from contextlib import closing
+from queue import LifoQueue, Empty
+from urllib.parse import urlsplit, urlencode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Tuple, Iterator, Callable, Any
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+# Number of IDs queried in each SPARQL request
+SPARQL_BATCH_SIZE = 100
+# Number of SPARQL requests in flight
+SPARQL_WORKERS = 4
+# Timeout of a SPARQL request (seconds)
+SPARQL_TIMEOUT = 300
+# Number of retries of a failed SPARQL request, delay before the first retry (seconds, doubled at
+# each retry)
+SPARQL_RETRIES = 3
+SPARQL_BACKOFF = 1
+# Latency of a request, relatively to the lowest latency observed, from which the endpoint is
+# considered overloaded
+SLOW_FACTOR = 4
+
+CSV_RESULTS = 'text/csv'
+
+# Time to live of the cached SPARQL results (seconds)
+SPARQL_CACHE_TTL = 30 * 24 * 3600
+SPARQL_CACHE_FILE = 'sparql_cache.sqlite'
+
+
+# ==================================================================================================
+# CLASS
+# ==================================================================================================
+class SparqlHTTPError(ConnectionError):
+    """
+    SparqlHTTPError class: error of a SPARQL request answered with an HTTP error status.
+
+    Attributes
+    ----------
+    self.status: int
+        HTTP status of the response
+    """
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class SparqlScheduler:
+    """
+    SparqlScheduler class: runs the requests to an endpoint with an adaptive number of requests in
+    flight, and retries the failed requests.
+
+    The number of requests in flight is adjusted as in TCP congestion control (AIMD) : it grows
+    with successful requests (+1 for each success until the first congestion, then +1 for each
+    limit successes) and is halved when a request fails or is SLOW_FACTOR times slower than the
+    fastest request of the run (once for all the requests sent before the decrease). The limit
+    learned is kept for the next runs.
+
+    The scheduler is shared by the runs of all the threads requesting the endpoint : the limit and
+    the congestion state are updated under a lock, the fastest latency is kept by each run.
+
+    Failed requests (connection errors, timeouts, 5xx and 429 HTTP statuses) are retried after an
+    exponential backoff delay.
+
+    Attributes
+    ----------
+    self.limit: int
+        Current maximum number of requests in flight
+    self.retries: int
+        Number of retries of a failed request
+    self.backoff: float
+        Delay before the first retry of a request (seconds), doubled at each retry
+    """
+    def __init__(self, retries: int = SPARQL_RETRIES, backoff: float = SPARQL_BACKOFF):
+        self.limit = 1
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._slow_start = True
+        self._successes = 0
+        self._last_decrease = 0
+
+    def run(self, task: Callable[[Any], Any], items: List[Any], max_workers: int) -> List[Any]:
+        """ Run a task on items.
+
+        Parameters
+        ----------
+        task: Callable[[Any], Any]
+            Function sending the request of an item
+        items: List[Any]
+            Items to run the task on
+        max_workers: int
+            Maximum number of requests in flight
+
+        Returns
+        -------
+        List[Any]
+            Result of the task for each item (in the items order), or exception raised by the last
+            attempt if the task failed
+        """
+        max_workers = max(1, max_workers)
+        with self._lock:
+            self.limit = min(self.limit, max_workers)
+        min_latency = None
+        results = [None] * len(items)
+        attempts = [0] * len(items)
+        ready = deque(range(len(items)))
+        delayed = list()
+        in_flight = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while ready or delayed or in_flight:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    ready.append(heapq.heappop(delayed)[1])
+                while ready and len(in_flight) < self.limit:
+                    i = ready.popleft()
+                    in_flight[executor.submit(task, items[i])] = (i, time.monotonic())
+                next_retry = max(0., delayed[0][0] - now) if delayed else None
+                if not in_flight:
+                    time.sleep(next_retry)
+                    continue
+                done, _ = wait(in_flight, timeout=next_retry, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, start = in_flight.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[i] = future.result()
+                        latency = time.monotonic() - start
+                        if min_latency is None or latency < min_latency:
+                            min_latency = latency
+                        self._update(start, latency > SLOW_FACTOR * min_latency, max_workers)
+                    elif is_retriable(error):
+                        self._decrease(start)
+                        if attempts[i] < self.retries:
+                            delay = self.backoff * 2 ** attempts[i]
+                            attempts[i] += 1
+                            heapq.heappush(delayed, (time.monotonic() + delay, i))
+                        else:
+                            results[i] = error
+                    else:
+                        results[i] = error
+        return results
+
+    def _update(self, start: float, slow: bool, max_workers: int):
+        with self._lock:
+            if slow:
+                self.__decrease(start)
+                return
+            self._successes += 1
+            if self._slow_start or self._successes >= self.limit:
+                self._successes = 0
+                self.limit = min(self.limit + 1, max_workers)
+
+    def _decrease(self, start: float):
+        with self._lock:
+            self.__decrease(start)
+
+    def __decrease(self, start: float):
+        # Requests sent before the last decrease do not decrease the limit again
+        if start < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        self._slow_start = False
+        self._successes = 0
+        self.limit = max(1, self.limit // 2)
+
+
+class SparqlClient:
+    """
+    SparqlClient class: thread-safe SPARQL client of an endpoint, reusing a pool of keep-alive HTTP
+    connections.
+
+    Each request takes an idle connection of the pool (or opens a new one) and gives it back once
+    the response is read, so concurrent requests use one connection each and sequential requests
+    reuse the same connection.
+
+    Attributes
+    ----------
+    self.endpoint_url: str
+        URL of the SPARQL endpoint
+    self.timeout: float
+        Timeout of a request (seconds)
+    self.n_connections: int
+        Number of HTTP connections opened
+    self.scheduler: SparqlScheduler
+        Scheduler of the batches of requests to the endpoint
+    """
+    def __init__(self, endpoint_url: str, timeout: float = SPARQL_TIMEOUT):
+        self.endpoint_url = endpoint_url
+        self.timeout = timeout
+        self.scheduler = SparqlScheduler()
+        url = urlsplit(endpoint_url)
+        self._https = url.scheme == 'https'
+        self._netloc = url.netloc
+        self._path = url.path or '/'
+        if url.query:
+            self._path += '?' + url.query
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self.n_connections = 0
+
+    def select(self, query: str) -> List[Dict[str, str]]:
+        """ Send a SPARQL SELECT query.
+
+        Parameters
+        ----------
+        query: str
+            SPARQL query
+
+        Returns
+        -------
+        List[Dict[str, str]]
+            Results : for each result, dictionary associating for each variable its value
+        """
+        return list(self.iter_select(query))
+
+    def iter_select(self, query: str) -> Iterator[Dict[str, str]]:
+        """ Send a SPARQL SELECT query and stream its results, parsed while the response (CSV
+        format) is read.
+
+        Parameters
+        ----------
+        query: str
+            SPARQL query
+
+        Returns
+        -------
+        Iterator[Dict[str, str]]
+            Results : for each result, dictionary associating for each variable its value (empty
+            string if not bound)
+        """
+        connection, response = self._send(query, CSV_RESULTS)
+        complete = False
+        try:
+            rows = csv.reader(io.TextIOWrapper(response, encoding='utf-8', newline=''))
+            header = next(rows, None)
+            if header is not None:
+                for row in rows:
+                    yield dict(zip(header, row))
+            complete = True
+        finally:
+            self._release(connection, response, complete)
+
+    def _send(self, query: str, accept: str) \
+            -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        body = urlencode({'query': query})
+        headers = {'Content-Type': 'application/x-www-form-urlencoded', 'Accept': accept}
+        for attempt in range(2):
+            connection, reused = self._get_connection()
+            try:
+                connection.request('POST', self._path, body=body, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                # Keep-alive connection closed by the server : retry once on a new connection
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.status != 200:
+                response.read()
+                self._release(connection, response, True)
+                raise SparqlHTTPError(f'SPARQL request to {self.endpoint_url} failed : '
+                                      f'{response.status} {response.reason}', response.status)
+            return connection, response
+
+    def _release(self, connection: http.client.HTTPConnection,
+                 response: http.client.HTTPResponse, complete: bool):
+        # A connection is reused only once its response is read entirely
+        if complete and not response.will_close:
+            self._idle.put(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        """ Close the idle connections. """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+    def _get_connection(self):
+        try:
+            return self._idle.get_nowait(), True
+        except Empty:
+            with self._lock:
+                self.n_connections += 1
+            if self._https:
+                return http.client.HTTPSConnection(self._netloc, timeout=self.timeout), False
+            return http.client.HTTPConnection(self._netloc, timeout=self.timeout), False
+
+
+class SparqlCache:
+    """
+    SparqlCache class: persistent SQLite cache of the SPARQL results of each queried ID,
+    keyed by endpoint URL, query kind and ID.
+
+    Entries older than ttl are queried again, but are still used if the endpoint is unreachable.
+
+    Attributes
+    ----------
+    self.path: str
+        Path of the SQLite database file
+    self.ttl: float
+        Time to live of the cached results (seconds)
+    """
+    def __init__(self, path: str, ttl: float = SPARQL_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        with closing(sqlite3.connect(self.path)) as db, db:
+            db.execute('CREATE TABLE IF NOT EXISTS sparql_results (endpoint TEXT, kind TEXT, '
+                       'id TEXT, results TEXT, time REAL, PRIMARY KEY (endpoint, kind, id))')
+
+    def get(self, endpoint_url: str, kind: str, ids: List[str], expired: bool = False) \
+            -> Dict[str, List[Dict[str, str]]]:
+        """ Get the cached results of IDs.
+
+        Parameters
+        ----------
+        endpoint_url: str
+            URL of the SPARQL endpoint
+        kind: str
+            Kind of query
+        ids: List[str]
+            IDs queried
+        expired: bool (optional, default=False)
+            True to also get the results older than the time to live
+
+        Returns
+        -------
+        Dict[str, List[Dict[str, str]]]
+            Dictionary associating for each cached ID its results
+        """
+        min_time = -1 if expired else time.time() - self.ttl
+        cached = dict()
+        with closing(sqlite3.connect(self.path)) as db:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = db.execute(f'SELECT id, results FROM sparql_results WHERE endpoint = ? AND '
+                                  f'kind = ? AND time >= ? AND id IN '
+                                  f'({", ".join("?" * len(batch))})',
+                                  [endpoint_url, kind, min_time] + batch)
+                for i, results in rows:
+                    cached[i] = json.loads(results)
+        return cached
+
+    def put(self, endpoint_url: str, kind: str,
+            results: Dict[str, List[Dict[str, str]]]):
+        """ Cache the results of IDs.
+
+        Parameters
+        ----------
+        endpoint_url: str
+            URL of the SPARQL endpoint
+        kind: str
+            Kind of query
+        results: Dict[str, List[Dict[str, str]]]
+            Dictionary associating for each ID its results
+        """
+        now = time.time()
+        with closing(sqlite3.connect(self.path)) as db, db:
+            db.executemany('INSERT OR REPLACE INTO sparql_results VALUES (?, ?, ?, ?, ?)',
+                           [(endpoint_url, kind, i, json.dumps(id_results), now)
+                            for i, id_results in results.items()])
+
+    def clear(self):
+        """ Delete all the cached results. """
+        with closing(sqlite3.connect(self.path)) as db, db:
+            db.execute('DELETE FROM sparql_results')
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+_CLIENTS = dict()
+_CLIENTS_LOCK = threading.Lock()
+_SPARQL_CACHE = None
+
+
+def get_sparql_client(endpoint_url: str) -> SparqlClient:
+    """ Get the client of an endpoint, shared by all the requests to this endpoint.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL of the SPARQL endpoint
+
+    Returns
+    -------
+    SparqlClient
+        Client of the endpoint
+    """
+    with _CLIENTS_LOCK:
+        if endpoint_url not in _CLIENTS:
+            _CLIENTS[endpoint_url] = SparqlClient(endpoint_url)
+        return _CLIENTS[endpoint_url]
+
+
+def sparql_select(endpoint_url: str, query: str) -> List[Dict[str, str]]:
+    """ Send a SPARQL SELECT query.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL endpoint string
+    query: str
+        SPARQL query
+
+    Returns
+    -------
+    List[Dict[str, str]]
+        Results : for each result, dictionary associating for each variable its value
+    """
+    return get_sparql_client(endpoint_url).select(query)
+
+
+def sparql_iter_select(endpoint_url: str, query: str) -> Iterator[Dict[str, str]]:
+    """ Send a SPARQL SELECT query and stream its results, parsed while the response is read.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL endpoint string
+    query: str
+        SPARQL query
+
+    Returns
+    -------
+    Iterator[Dict[str, str]]
+        Results : for each result, dictionary associating for each variable its value
+    """
+    return get_sparql_client(endpoint_url).iter_select(query)
+
+
+def get_sparql_cache(cache_dir: str, ttl: float = SPARQL_CACHE_TTL) -> SparqlCache:
+    """ Open the persistent SPARQL results cache of a directory.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory of the cache (created if needed)
+    ttl: float (optional, default=SPARQL_CACHE_TTL)
+        Time to live of the cached results (seconds)
+
+    Returns
+    -------
+    SparqlCache
+        Cache of the directory
+    """
+    cache_dir = os.path.expanduser(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    return SparqlCache(os.path.join(cache_dir, SPARQL_CACHE_FILE), ttl)
+
+
+def set_sparql_cache(cache_dir: str or None, ttl: float = SPARQL_CACHE_TTL) \
+        -> SparqlCache or None:
+    """ Set the directory of the persistent SPARQL results cache used by default (process-wide) by
+    the ChEBI and GO classes extraction.
+
+    Parameters
+    ----------
+    cache_dir: str or None
+        Directory of the cache (created if needed), None to disable the cache
+    ttl: float (optional, default=SPARQL_CACHE_TTL)
+        Time to live of the cached results (seconds)
+
+    Returns
+    -------
+    SparqlCache or None
+        Cache set
+    """
+    global _SPARQL_CACHE
+    if cache_dir is None:
+        _SPARQL_CACHE = None
+    else:
+        _SPARQL_CACHE = get_sparql_cache(cache_dir, ttl)
+    return _SPARQL_CACHE
+
+
+def sparql_select_batches(endpoint_url: str, ids: List[str],
+                          get_query: Callable[[List[str]], str],
+                          batch_size: int = SPARQL_BATCH_SIZE, n_workers: int = SPARQL_WORKERS,
+                          kind: str = None, cache: SparqlCache = None) \
+        -> Dict[str, List[Dict[str, str]]]:
+    """ Query IDs by batches (one SPARQL request for each batch of batch_size IDs, at most
+    n_workers requests in flight, see SparqlScheduler) and dispatch the results to the ID they were
+    found for (bound to the ?input variable). Results are merged in the batches order, whatever the
+    order the requests end.
+
+    If a SPARQL cache is given (or set, see set_sparql_cache) and kind is filled, only the IDs not
+    cached are queried, and the expired cached results are used for the IDs of the batches failing
+    (the error is raised if some of these IDs are not cached).
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL endpoint string
+    ids: List[str]
+        IDs to query
+    get_query: Callable[[List[str]], str]
+        Function returning the SPARQL query of a batch of IDs
+    batch_size: int (optional, default=SPARQL_BATCH_SIZE)
+        Number of IDs queried in each SPARQL request
+    n_workers: int (optional, default=SPARQL_WORKERS)
+        Maximum number of SPARQL requests in flight
+    kind: str (optional, default=None)
+        Kind of query, key of the results in the SPARQL cache. If None, the cache is not used.
+    cache: SparqlCache (optional, default=None)
+        SPARQL cache, None for the cache set by set_sparql_cache
+
+    Returns
+    -------
+    Dict[str, List[Dict[str, str]]]
+        Dictionary associating for each ID its results
+    """
+    results = {i: [] for i in ids}
+    unique_ids = list(results)
+    if cache is None:
+        cache = _SPARQL_CACHE
+    if kind is None:
+        cache = None
+    if cache is not None:
+        cached = cache.get(endpoint_url, kind, unique_ids)
+        results.update(cached)
+        unique_ids = [i for i in unique_ids if i not in cached]
+
+    def query_batch(batch):
+        return sparql_select(endpoint_url, get_query(batch))
+
+    batches = [unique_ids[start:start + batch_size]
+               for start in range(0, len(unique_ids), batch_size)]
+    scheduler = get_sparql_client(endpoint_url).scheduler
+    batches_results = scheduler.run(query_batch, batches, n_workers)
+    failed_ids = list()
+    error = None
+    for batch, batch_results in zip(batches, batches_results):
+        if isinstance(batch_results, Exception):
+            if cache is None or not is_retriable(batch_results):
+                raise batch_results
+            failed_ids += batch
+            error = batch_results
+            continue
+        _dispatch(results, batch_results)
+        if cache is not None:
+            cache.put(endpoint_url, kind, {i: results[i] for i in batch})
+
+    if failed_ids:
+        expired = cache.get(endpoint_url, kind, failed_ids, expired=True)
+        if not expired:
+            raise error
+        missing = [i for i in failed_ids if i not in expired]
+        if missing:
+            more = ', ...' if len(missing) > 10 else ''
+            raise ConnectionError(f'SPARQL endpoint {endpoint_url} unreachable ({error}) : '
+                                  f'{len(missing)}/{len(failed_ids)} IDs not found in cache : '
+                                  f'{", ".join(missing[:10])}{more}') from error
+        results.update(expired)
+        print(f'SPARQL endpoint {endpoint_url} unreachable ({error}) : '
+              f'{len(expired)}/{len(failed_ids)} IDs found in cache.')
+    return results
+
+
+def _dispatch(results: Dict[str, List[Dict[str, str]]],
+              batch_results: List[Dict[str, str]]):
+    for result in batch_results:
+        results[result['input']].append(result)
+
+
+def is_retriable(error: Exception) -> bool:
+    """ Check if a failed SPARQL request can be retried : connection errors, timeouts, server
+    errors (5xx HTTP statuses) and too many requests (429 HTTP status).
+
+    Parameters
+    ----------
+    error: Exception
+        Error raised by the request
+
+    Returns
+    -------
+    bool
+        True if the request can be retried, False otherwise
+    """
+    if isinstance(error, SparqlHTTPError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (OSError, http.client.HTTPException))
@@ -0,0 +1,425 @@
+import re
+import csv
+import io
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from typing import List, Dict, Tuple, Iterator
+
+from ontosunburst.obo import iter_obo_terms, HAS_ROLE
+from ontosunburst.sparql import CSV_RESULTS
+
+# ==================================================================================================
+# CONSTANTS
+# ==================================================================================================
+
+OBO_IRI = 'http://purl.obolibrary.org/obo/'
+
+PREFIX_RE = re.compile(r'PREFIX\s+(\w*):\s*<([^>]*)>', re.IGNORECASE)
+SELECT_RE = re.compile(r'SELECT\s+(?:DISTINCT\s+)?((?:\?\w+\s+)+)WHERE', re.IGNORECASE)
+VALUES_RE = re.compile(r'VALUES\s*\([^)]*\)\s*\{((?:\s*\([^)]*\))*)\s*\}', re.IGNORECASE)
+VALUE_RE = re.compile(r'\(\s*(\S+)\s+"([^"]*)"\s*\)')
+LIMIT_RE = re.compile(r'LIMIT\s+(\d+)', re.IGNORECASE)
+OFFSET_RE = re.compile(r'OFFSET\s+(\d+)', re.IGNORECASE)
+
+
+# ==================================================================================================
+# CLASSES
+# ==================================================================================================
+
+class OboFragment:
+    """
+    OboFragment class: classes of an OBO file (is_a relations, labels and has role relations)
+    queried by the local SPARQL server.
+
+    Attributes
+    ----------
+    self.labels: Dict[str, str]
+        Dictionary associating for each OBO ID (GO:XXXXXXX, CHEBI:XXXXX) its label
+    self.parents: Dict[str, List[str]]
+        Dictionary associating for each OBO ID its is_a parent IDs
+    self.children: Dict[str, List[str]]
+        Dictionary associating for each OBO ID its is_a children IDs
+    self.roles: Dict[str, List[str]]
+        Dictionary associating for each OBO ID its has role target IDs
+    """
+    def __init__(self, obo_file: str):
+        self.labels = dict()
+        self.parents = dict()
+        self.children = dict()
+        self.roles = dict()
+        for term in iter_obo_terms(obo_file):
+            if term['is_obsolete']:
+                continue
+            self.labels[term['id']] = term['name']
+            self.parents[term['id']] = term['is_a']
+            for p in term['is_a']:
+                self.children.setdefault(p, []).append(term['id'])
+            roles = [t for r, t in term['relationship'] if r in HAS_ROLE]
+            if roles:
+                self.roles[term['id']] = roles
+
+    def get_ancestors(self, obo_id: str) -> List[str]:
+        """ Get an OBO ID and all its is_a ancestors (rdfs:subClassOf*).
+
+        Parameters
+        ----------
+        obo_id: str
+            OBO ID
+
+        Returns
+        -------
+        List[str]
+            OBO ID and its ancestors
+        """
+        return self._get_closure(obo_id, self.parents)
+
+    def get_descendants(self, obo_id: str) -> List[str]:
+        """ Get an OBO ID and all its is_a descendants (inverse of rdfs:subClassOf*).
+
+        Parameters
+        ----------
+        obo_id: str
+            OBO ID
+
+        Returns
+        -------
+        List[str]
+            OBO ID and its descendants
+        """
+        return self._get_closure(obo_id, self.children)
+
+    def get_edges(self, obo_id: str) -> Iterator[Tuple[str, str]]:
+        """ Get the is_a relations of an OBO ID with a labelled parent.
+
+        Parameters
+        ----------
+        obo_id: str
+            OBO ID
+
+        Returns
+        -------
+        Iterator[Tuple[str, str]]
+            (OBO ID, parent ID) relations
+        """
+        for p in self.parents.get(obo_id, ()):
+            if p in self.labels:
+                yield obo_id, p
+
+    @staticmethod
+    def _get_closure(obo_id: str, relations: Dict[str, List[str]]) -> List[str]:
+        closure = [obo_id]
+        visited = {obo_id}
+        for c in closure:
+            for r in relations.get(c, ()):
+                if r not in visited:
+                    visited.add(r)
+                    closure.append(r)
+        return closure
+
+
+class LocalSparqlServer:
+    """
+    LocalSparqlServer class: lightweight local stand-in of the GO and ChEBI SPARQL endpoints,
+    serving ontology fragments read from OBO files over the SPARQL HTTP protocol (GET or POST
+    query, CSV results), with artificial latency and failure injection. Used to run the SPARQL
+    requests of ontosunburst without network and to measure the batching and concurrency of the
+    requests.
+
+    Only the queries built by ontosunburst.ontology are answered (recognized by their selected
+    variables), other queries are answered with a 400 error. Each dataset is served at
+    http://host:port/{dataset}/.
+
+    Attributes
+    ----------
+    self.fragments: Dict[str, OboFragment]
+        Dictionary associating for each dataset name its ontology fragment
+    self.latency: float
+        Delay added to each request (seconds)
+    self.id_latency: float
+        Delay added to each request for each ID of its VALUES block (seconds)
+    self.failure_rate: float
+        Probability of each request to be answered with a 503 error
+    self.fail_first: int
+        Number of first requests answered with a 503 error
+    self.n_requests: int
+        Number of requests received
+    self.n_failures: int
+        Number of requests answered with an error
+    self.max_in_flight: int
+        Maximal number of requests processed at the same time
+    """
+    def __init__(self, obo_files: Dict[str, str], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0, id_latency: float = 0, failure_rate: float = 0,
+                 fail_first: int = 0, seed: int = None):
+        self.fragments = {dataset: OboFragment(obo) for dataset, obo in obo_files.items()}
+        self.latency = latency
+        self.id_latency = id_latency
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.n_requests = 0
+        self.n_failures = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._http_server = ThreadingHTTPServer((host, port), SparqlRequestHandler)
+        self._http_server.daemon_threads = True
+        self._http_server.sparql_server = self
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._http_server.server_address[:2]
+
+    def get_url(self, dataset: str) -> str:
+        """ Get the endpoint URL of a dataset.
+
+        Parameters
+        ----------
+        dataset: str
+            Dataset name
+
+        Returns
+        -------
+        str
+            Endpoint URL
+        """
+        host, port = self.address
+        return f'http://{host}:{port}/{dataset}/'
+
+    def start(self) -> 'LocalSparqlServer':
+        """ Serve the requests in a background thread. """
+        self._thread = threading.Thread(target=self._http_server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """ Serve the requests in the current thread, until interrupted. """
+        self._http_server.serve_forever()
+
+    def stop(self):
+        """ Stop serving the requests and close the server socket. """
+        if self._thread is not None:
+            self._http_server.shutdown()
+            self._thread = None
+        self._http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def select(self, dataset: str, query: str) -> Tuple[List[str], List[List[str]]]:
+        """ Answer a SPARQL SELECT query built by ontosunburst.ontology.
+
+        Parameters
+        ----------
+        dataset: str
+            Dataset name
+        query: str
+            SPARQL query
+
+        Returns
+        -------
+        Tuple[List[str], List[List[str]]]
+            Selected variables, results rows
+
+        Raises
+        ------
+        KeyError
+            If the dataset is not served
+        ValueError
+            If the query is not recognized
+        """
+        fragment = self.fragments[dataset]
+        select = SELECT_RE.search(query)
+        variables = tuple(v.lstrip('?') for v in select.group(1).split()) if select else ()
+        if variables not in QUERIES:
+            raise ValueError(f'Query not supported : SELECT {" ".join(variables)}')
+        rows = list(QUERIES[variables](fragment, get_values(query)))
+        limit = LIMIT_RE.search(query)
+        offset = OFFSET_RE.search(query)
+        start = int(offset.group(1)) if offset else 0
+        end = start + int(limit.group(1)) if limit else None
+        return list(variables), rows[start:end]
+
+    def _begin(self, n_ids: int) -> bool:
+        # Count the request, and draw whether it fails
+        with self._lock:
+            self.n_requests += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            fail = self.n_requests <= self.fail_first or self._random.random() < self.failure_rate
+        time.sleep(self.latency + self.id_latency * n_ids)
+        return not fail
+
+    def _end(self, success: bool):
+        with self._lock:
+            self._in_flight -= 1
+            if not success:
+                self.n_failures += 1
+
+
+class SparqlRequestHandler(BaseHTTPRequestHandler):
+    """ HTTP handler of the LocalSparqlServer : keep-alive connections, SPARQL query given in the
+    URL (GET) or form encoded in the body (POST). """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self._answer(url.path, parse_qs(url.query).get('query', [None])[0])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        if self.headers.get('Content-Type', '').startswith('application/sparql-query'):
+            query = body
+        else:
+            query = parse_qs(body).get('query', [None])[0]
+        self._answer(urlsplit(self.path).path, query)
+
+    def _answer(self, path: str, query: str):
+        server = self.server.sparql_server
+        dataset = path.strip('/').split('/')[0]
+        error = None
+        if not server._begin(len(get_values(query)) if query else 0):
+            error = 503, 'Failure injected'
+        elif dataset not in server.fragments:
+            error = 404, f'Dataset not found : {dataset}'
+        elif query is None:
+            error = 400, 'Missing query'
+        else:
+            try:
+                variables, rows = server.select(dataset, query)
+            except ValueError as e:
+                error = 400, str(e)
+        # Counted before answering, so that the counters are up-to-date for the client
+        server._end(error is None)
+        if error is not None:
+            self.send_error(*error)
+        else:
+            self._send_csv(variables, rows)
+
+    def _send_csv(self, variables: List[str], rows: List[List[str]]):
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\r\n')
+        writer.writerow(variables)
+        writer.writerows(rows)
+        body = output.getvalue().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f'{CSV_RESULTS}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# ==================================================================================================
+# FUNCTIONS
+# ==================================================================================================
+
+# Query parsing
+# --------------------------------------------------------------------------------------------------
+def get_values(query: str) -> List[Tuple[str, str]]:
+    """ Get the (OBO ID, input) pairs of the VALUES block of a query, the prefixed names being
+    expanded with the PREFIX declarations of the query.
+
+    Parameters
+    ----------
+    query: str
+        SPARQL query
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        (OBO ID, input) pairs
+    """
+    values = VALUES_RE.search(query)
+    if values is None:
+        return []
+    prefixes = dict(PREFIX_RE.findall(query))
+    return [(get_obo_id(term, prefixes), input_id)
+            for term, input_id in VALUE_RE.findall(values.group(1))]
+
+
+def get_obo_id(term: str, prefixes: Dict[str, str]) -> str:
+    """ Get the OBO ID (GO:XXXXXXX, CHEBI:XXXXX) of a SPARQL term (<IRI> or prefixed name).
+
+    Parameters
+    ----------
+    term: str
+        SPARQL term
+    prefixes: Dict[str, str]
+        Dictionary associating for each prefix its IRI
+
+    Returns
+    -------
+    str
+        OBO ID
+    """
+    if term.startswith('<'):
+        iri = term.strip('<>')
+    else:
+        prefix, _, local = term.partition(':')
+        iri = prefixes.get(prefix, '') + local
+    if iri.startswith(OBO_IRI):
+        return iri[len(OBO_IRI):].replace('_', ':', 1)
+    return iri
+
+
+# Queries
+# --------------------------------------------------------------------------------------------------
+def select_chebi_roles(fragment: OboFragment, values: List[Tuple[str, str]]) \
+        -> Iterator[List[str]]:
+    # ?input ?moleculeLabel ?roleId : has role targets of the molecule and its ancestors
+    for molecule, input_id in values:
+        if molecule not in fragment.labels:
+            continue
+        roles = dict()
+        for c in fragment.get_ancestors(molecule):
+            roles.update(dict.fromkeys(fragment.roles.get(c, ())))
+        for role in roles:
+            yield [input_id, fragment.labels[molecule], role]
+
+
+def select_chebi_role_hierarchy(fragment: OboFragment, values: List[Tuple[str, str]]) \
+        -> Iterator[List[str]]:
+    # ?input ?roleId ?roleLabel ?parentRoleId ?parentRoleLabel : relations under the root
+    for root, input_id in values:
+        if root not in fragment.labels:
+            continue
+        for role in fragment.get_descendants(root):
+            for c, p in fragment.get_edges(role):
+                yield [input_id, c, fragment.labels[c], p, fragment.labels[p]]
+
+
+def select_go_classes(fragment: OboFragment, values: List[Tuple[str, str]]) \
+        -> Iterator[List[str]]:
+    # ?input ?goLabel ?parentGoLabel ?goId ?parentGoId : relations above the start class
+    for start, input_id in values:
+        if start not in fragment.labels:
+            continue
+        for go in fragment.get_ancestors(start):
+            for c, p in fragment.get_edges(go):
+                yield [input_id, fragment.labels[c], fragment.labels[p], c, p]
+
+
+def select_go_ontology(fragment: OboFragment, values: List[Tuple[str, str]]) \
+        -> Iterator[List[str]]:
+    # ?goId ?goLabel ?parentGoId ?parentGoLabel : all GO relations, ordered
+    edges = sorted((c, p) for go in fragment.labels for c, p in fragment.get_edges(go)
+                   if c.startswith('GO:') and p.startswith('GO:'))
+    for c, p in edges:
+        yield [c, fragment.labels[c], p, fragment.labels[p]]
+
+
+QUERIES = {('input', 'moleculeLabel', 'roleId'): select_chebi_roles,
+           ('input', 'roleId', 'roleLabel', 'parentRoleId', 'parentRoleLabel'):
+               select_chebi_role_hierarchy,
+           ('input', 'goLabel', 'parentGoLabel', 'goId', 'parentGoId'): select_go_classes,
+           ('goId', 'goLabel', 'parentGoId', 'parentGoLabel'): select_go_ontology}
@@ -123,14 +123,15 @@ def generate_sunburst_fig(data: DataTable, output: str, analysis: str = TOPOLOGY
     c_min, c_max, c_mid, max_depth, colorscale, title, colorbar_legend, background_color, \
         font_color, font_size, table_title, table_legend, table_color = \
         get_fig_kwargs(output, analysis, **kwargs)
+    values = data.get_data_dict()
 
     if analysis == TOPOLOGY_A:
-        fig = go.Figure(go.Sunburst(labels=data.labels, parents=data.parents,
-                                    values=data.relative_prop, ids=data.ids,
+        fig = go.Figure(go.Sunburst(labels=values[LABEL], parents=values[PARENT],
+                                    values=values[RELAT_PROP], ids=values[IDS],
                                     hoverinfo='label+text', maxdepth=max_depth,
                                     branchvalues='total',
                                     hovertext=get_hover_fig_text(data, TOPOLOGY_A, ref_set),
-                                    marker=dict(colors=data.count, colorscale=colorscale,
+                                    marker=dict(colors=values[COUNT], colorscale=colorscale,
                                                 cmin=c_min, cmax=c_max, cmid=c_mid, showscale=True,
                                                 colorbar=dict(title=dict(text=colorbar_legend)))))
         fig.update_layout(title=dict(text=title, x=0.5, xanchor='center'))
@@ -142,12 +143,12 @@ def generate_sunburst_fig(data: DataTable, output: str, analysis: str = TOPOLOGY
                             subplot_titles=(table_title, title),
                             specs=[[{'type': 'table'}, {'type': 'sunburst'}]])
 
-        fig.add_trace(go.Sunburst(labels=data.labels, parents=data.parents,
-                                  values=data.relative_prop, ids=data.ids,
+        fig.add_trace(go.Sunburst(labels=values[LABEL], parents=values[PARENT],
+                                  values=values[RELAT_PROP], ids=values[IDS],
                                   hovertext=get_hover_fig_text(data, ENRICHMENT_A, ref_set),
                                   hoverinfo='label+text', maxdepth=max_depth,
                                   branchvalues='total',
-                                  marker=dict(colors=data.p_val, colorscale=colorscale,
+                                  marker=dict(colors=values[PVAL], colorscale=colorscale,
                                               cmid=c_mid, cmax=c_max, cmin=c_min, showscale=True,
                                               colorbar=dict(title=dict(text=colorbar_legend)))),
                       row=1, col=2)
@@ -183,31 +184,34 @@ def get_hover_fig_text(data: DataTable, analysis: str, ref_set: bool) \
     -------
 
     """
+    values = data.get_data_dict()
+    count, ref_count, prop, ref_prop, p_val, onto_ids = values[COUNT], values[REF_COUNT], \
+        values[PROP], values[REF_PROP], values[PVAL], values[ONTO_ID]
     if analysis == ENRICHMENT_A:
-        return [f'P value: {10 ** (-data.p_val[i])}<br>'
-                f'{COUNT}: <b>{data.count[i]}</b><br>'
-                f'{REF_COUNT}: {data.ref_count[i]}<br>'
-                f'{PROP}: <b>{round(data.prop[i] * 100, 2)}%</b><br>'
-                f'{REF_PROP}: {round(data.ref_prop[i] * 100, 2)}%<br>'
-                f'{IDS}: {data.onto_ids[i]}'
-                if data.p_val[i] > 0 else
-                f'P value: {10 ** data.p_val[i]}<br>'
-                f'{COUNT}: <b>{data.count[i]}</b><br>'
-                f'{REF_COUNT}: {data.ref_count[i]}<br>'
-                f'{PROP}: <b>{round(data.prop[i] * 100, 2)}%</b><br>'
-                f'{REF_PROP}: {round(data.ref_prop[i] * 100, 2)}%<br>'
-                f'{IDS}: {data.onto_ids[i]}'
+        return [f'P value: {10 ** (-p_val[i])}<br>'
+                f'{COUNT}: <b>{count[i]}</b><br>'
+                f'{REF_COUNT}: {ref_count[i]}<br>'
+                f'{PROP}: <b>{round(prop[i] * 100, 2)}%</b><br>'
+                f'{REF_PROP}: {round(ref_prop[i] * 100, 2)}%<br>'
+                f'{IDS}: {onto_ids[i]}'
+                if p_val[i] > 0 else
+                f'P value: {10 ** p_val[i]}<br>'
+                f'{COUNT}: <b>{count[i]}</b><br>'
+                f'{REF_COUNT}: {ref_count[i]}<br>'
+                f'{PROP}: <b>{round(prop[i] * 100, 2)}%</b><br>'
+                f'{REF_PROP}: {round(ref_prop[i] * 100, 2)}%<br>'
+                f'{IDS}: {onto_ids[i]}'
                 for i in range(data.len)]
     elif analysis == TOPOLOGY_A:
         if ref_set:
-            return [f'{COUNT}: <b>{data.count[i]}</b><br>'
-                    f'{REF_COUNT}: {data.ref_count[i]}<br>'
-                    f'{PROP}: <b>{round(data.prop[i] * 100, 2)}%</b><br>'
-                    f'{REF_PROP}: {round(data.ref_prop[i] * 100, 2)}%<br>'
-                    f'{IDS}: {data.onto_ids[i]}'
+            return [f'{COUNT}: <b>{count[i]}</b><br>'
+                    f'{REF_COUNT}: {ref_count[i]}<br>'
+                    f'{PROP}: <b>{round(prop[i] * 100, 2)}%</b><br>'
+                    f'{REF_PROP}: {round(ref_prop[i] * 100, 2)}%<br>'
+                    f'{IDS}: {onto_ids[i]}'
                     for i in range(data.len)]
         else:
-            return [f'{COUNT}: <b>{data.count[i]}</b><br>'
-                    f'{PROP}: <b>{round(data.prop[i] * 100, 2)}%</b><br>'
-                    f'{IDS}: {data.onto_ids[i]}'
+            return [f'{COUNT}: <b>{count[i]}</b><br>'
+                    f'{PROP}: <b>{round(prop[i] * 100, 2)}%</b><br>'
+                    f'{IDS}: {onto_ids[i]}'
                     for i in range(data.len)]
@@ -0,0 +1,153 @@
+import unittest
+import os
+import json
+import time
+import tempfile
+import threading
+from functools import wraps
+from ontosunburst.cache import *
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+ONTO = {'a': ['ab'], 'b': ['ab'], 'ab': ['FRAMES']}
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+# TEST FILE CACHE
+# --------------------------------------------------------------------------------------------------
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files = list()
+        for i in range(3):
+            file = os.path.join(self.tmp_dir.name, f'onto{i}.json')
+            with open(file, 'w') as f:
+                json.dump(ONTO, f)
+            self.files.append(file)
+        self.file_size = os.path.getsize(self.files[0])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @test_for(FileCache.load)
+    def test_load_cached(self):
+        cache = FileCache()
+        onto = cache.load(self.files[0], get_json)
+        self.assertEqual(onto, ONTO)
+        self.assertIs(cache.load(self.files[0], get_json), onto)
+        self.assertIs(cache.load(os.path.relpath(self.files[0]), get_json), onto)
+        self.assertEqual(cache.size, self.file_size)
+
+    @test_for(FileCache.load)
+    def test_load_threads(self):
+        cache = FileCache()
+        loaded = list()
+
+        def loader(path):
+            loaded.append(path)
+            time.sleep(0.05)
+            return get_json(path)
+
+        results = dict()
+
+        def run(n):
+            results[n] = [cache.load(file, loader) for file in self.files]
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Objects loaded concurrently : the cached object is shared by all the threads
+        for i in range(3):
+            self.assertEqual(len({id(results[n][i]) for n in range(4)}), 1)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.size, 3 * self.file_size)
+
+    @test_for(FileCache.load)
+    def test_load_modified(self):
+        cache = FileCache()
+        onto = cache.load(self.files[0], get_json)
+        with open(self.files[0], 'w') as f:
+            json.dump({'a': ['FRAMES']}, f)
+        os.utime(self.files[0], ns=(0, 0))
+        new_onto = cache.load(self.files[0], get_json)
+        self.assertIsNot(new_onto, onto)
+        self.assertEqual(new_onto, {'a': ['FRAMES']})
+        self.assertEqual(len(cache), 1)
+
+    @test_for(FileCache.resize)
+    def test_lru_eviction(self):
+        cache = FileCache(max_size=2 * self.file_size)
+        onto0 = cache.load(self.files[0], get_json)
+        cache.load(self.files[1], get_json)
+        self.assertIs(cache.load(self.files[0], get_json), onto0)
+        cache.load(self.files[2], get_json)
+        # files[1] least recently used : dropped
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.load(self.files[0], get_json), onto0)
+        cache.resize(0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertIsNot(cache.load(self.files[0], get_json), onto0)
+        self.assertEqual(len(cache), 0)
+
+    @test_for(FileCache.clear)
+    def test_clear(self):
+        cache = FileCache()
+        onto = cache.load(self.files[0], get_json)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNot(cache.load(self.files[0], get_json), onto)
+
+    @test_for(FileCache.discard)
+    def test_discard_close(self):
+        closed = list()
+
+        class Closable(dict):
+            def close(self):
+                closed.append(self)
+
+        cache = FileCache(max_size=2 * self.file_size)
+        ontos = [cache.load(file, lambda path: Closable(get_json(path))) for file in self.files]
+        # files[0] dropped (LRU) : closed
+        self.assertEqual(closed, [ontos[0]])
+        self.assertIs(closed[0], ontos[0])
+        cache.discard(self.files[1])
+        self.assertIs(closed[1], ontos[1])
+        cache.clear()
+        self.assertIs(closed[2], ontos[2])
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    @test_for(load_json)
+    def test_load_json(self):
+        onto = load_json(self.files[0])
+        self.assertIs(load_json(self.files[0]), onto)
+        FILE_CACHE.clear()
+        self.assertIsNot(load_json(self.files[0]), onto)
+        FILE_CACHE.clear()
+
+
+def get_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -5,12 +5,16 @@ import sys
 from functools import wraps
 from ontosunburst.ontology import *
 from ontosunburst.ontosunburst import *
+from ontosunburst.sparql import get_sparql_client
+from ontosunburst.sparql_server import LocalSparqlServer
 
 # ==================================================================================================
 # GLOBAL
 # ==================================================================================================
 
-CH_URL = 'http://localhost:3030/chebi/'
+# Local stand-in of the SPARQL server, serving the ontology fragment of the tests
+SERVER = LocalSparqlServer({'chebi': os.path.join('test_files', 'chebi_fragment.obo')})
+CH_URL = SERVER.get_url('chebi')
 CH_LST = ['38028', '28604', '85146']
 REF_CH = ['38028', '28604', '85146',
           '23066', '27803', '37565',
@@ -97,6 +101,15 @@ class DualWriter(io.StringIO):
 # UNIT TESTS
 # ==================================================================================================
 
+def setUpModule():
+    SERVER.start()
+
+
+def tearDownModule():
+    get_sparql_client(CH_URL).close()
+    SERVER.stop()
+
+
 # TEST ONTOLOGY : CLASSES EXTRACTION
 # --------------------------------------------------------------------------------------------------
 class TestChEBIClassesExtraction(unittest.TestCase):
@@ -169,7 +182,7 @@ class TestChEBIClassesExtraction(unittest.TestCase):
         fig = ontosunburst(interest_set=CH_LST, ontology=CHEBI, root='00',
                            abundances=None, reference_set=REF_CH, ref_abundances=None,
                            analysis='topology', output='test_ch1', write_output=False,
-                           class_ontology=None, labels=None, endpoint_url=None,
+                           class_ontology=None, labels=None, endpoint_url=CH_URL,
                            ref_base=True, show_leaves=True)
         w_fig_file = os.path.join('test_files', 'test_ch1.json')
         self.assertTrue(are_fig_dict_equals(fig, w_fig_file))
@@ -0,0 +1,138 @@
+import unittest
+import os
+import json
+import time
+import tempfile
+from functools import wraps
+from ontosunburst.compiled_ontology import *
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+MC_ONTO = {'a': ['ab'], 'b': ['ab'], 'c': ['cde', 'cf'], 'd': ['cde'], 'e': ['cde', 'eg'],
+           'f': ['cf'], 'g': ['gh', 'eg'], 'h': ['gh'],
+           'ab': ['FRAMES'], 'cde': ['cdecf', 'cdeeg'], 'cf': ['cdecf'],
+           'eg': ['FRAMES', 'cdeeg'], 'gh': ['FRAMES'],
+           'cdecf': ['FRAMES'], 'cdeeg': ['cdeeg+'], 'cdeeg+': ['FRAMES']}
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+# TEST COMPILED ONTOLOGY
+# --------------------------------------------------------------------------------------------------
+class TestCompiledOntology(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.json_file = os.path.join(self.tmp_dir.name, 'onto.json')
+        with open(self.json_file, 'w') as f:
+            json.dump(MC_ONTO, f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @test_for(compile_ontology)
+    def test_compile_ontology_round_trip(self):
+        compiled_file = compile_ontology(self.json_file)
+        self.assertEqual(compiled_file, os.path.join(self.tmp_dir.name, 'onto.onto'))
+        compiled = CompiledOntology(compiled_file)
+        self.assertEqual(list(compiled), list(MC_ONTO))
+        self.assertEqual(dict(compiled.items()), MC_ONTO)
+        self.assertEqual(compiled['c'], ['cde', 'cf'])
+        self.assertEqual(len(compiled), 16)
+        self.assertEqual(compiled.n_names, 17)
+
+    @test_for(compile_ontology)
+    def test_compile_ontology_dict(self):
+        compiled_file = os.path.join(self.tmp_dir.name, 'dict.onto')
+        compile_ontology(MC_ONTO, compiled_file)
+        self.assertEqual(dict(CompiledOntology(compiled_file).items()), MC_ONTO)
+        with self.assertRaises(ValueError):
+            compile_ontology(MC_ONTO)
+
+    @test_for(CompiledOntology.close)
+    def test_close(self):
+        compiled_file = compile_ontology(self.json_file, root_item='FRAMES')
+        with CompiledOntology(compiled_file) as compiled:
+            mapped = compiled._mm
+            self.assertTrue(compiled.has_ancestor_index('FRAMES'))
+            self.assertEqual(compiled['c'], ['cde', 'cf'])
+        self.assertTrue(compiled.closed)
+        self.assertTrue(mapped.closed)
+        compiled.close()
+        # Ontologies dropped from the cache are closed, compiling over a loaded file drops it
+        compiled = load_class_ontology(compiled_file)
+        self.assertFalse(compiled.closed)
+        compile_ontology(self.json_file)
+        self.assertTrue(compiled.closed)
+        compiled = load_class_ontology(compiled_file)
+        self.assertEqual(dict(compiled.items()), MC_ONTO)
+        FILE_CACHE.clear()
+        self.assertTrue(compiled.closed)
+
+    @test_for(CompiledOntology.__getitem__)
+    def test_compiled_ontology_missing_keys(self):
+        compiled = CompiledOntology(compile_ontology(self.json_file))
+        # Parent only class : interned but not a key
+        self.assertNotIn('FRAMES', compiled)
+        self.assertNotIn('x', compiled)
+        self.assertIn('cdeeg+', compiled)
+        with self.assertRaises(KeyError):
+            _ = compiled['FRAMES']
+        self.assertEqual(compiled.name(compiled.index('FRAMES')), 'FRAMES')
+        self.assertEqual(compiled.index('x'), -1)
+
+    @test_for(load_class_ontology)
+    def test_load_class_ontology_json(self):
+        d_onto = load_class_ontology(self.json_file)
+        self.assertEqual(type(d_onto), dict)
+        self.assertEqual(d_onto, MC_ONTO)
+
+    @test_for(load_class_ontology)
+    def test_load_class_ontology_compiled_sibling(self):
+        compile_ontology(self.json_file)
+        d_onto = load_class_ontology(self.json_file)
+        self.assertEqual(type(d_onto), CompiledOntology)
+        self.assertEqual(dict(d_onto.items()), MC_ONTO)
+
+    @test_for(load_class_ontology)
+    def test_load_class_ontology_outdated_sibling(self):
+        compile_ontology(self.json_file)
+        mtime = time.time() + 10
+        os.utime(self.json_file, (mtime, mtime))
+        d_onto = load_class_ontology(self.json_file)
+        self.assertEqual(type(d_onto), dict)
+
+    @test_for(CompiledOntology.__init__)
+    def test_compiled_ontology_wrong_file(self):
+        with self.assertRaises(ValueError):
+            CompiledOntology(self.json_file)
+
+    @test_for(compile_ontology)
+    def test_compile_ontology_ancestor_index(self):
+        compiled = CompiledOntology(compile_ontology(self.json_file))
+        self.assertFalse(compiled.has_ancestor_index('FRAMES'))
+        compiled_file = compile_ontology(self.json_file, root_item='FRAMES')
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, 'onto.anc.npz')))
+        compiled = CompiledOntology(compiled_file)
+        self.assertTrue(compiled.has_ancestor_index('FRAMES'))
+        self.assertFalse(compiled.has_ancestor_index('ab'))
+        self.assertEqual(compiled.ancestor_index('FRAMES').ancestors_of('c'),
+                         {'cdeeg+', 'FRAMES', 'cf', 'cde', 'cdecf', 'cdeeg'})
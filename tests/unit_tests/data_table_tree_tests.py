@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 import io
 
 from functools import wraps
@@ -80,6 +81,10 @@ def test_for(func):
     return decorator
 
 
+def get_str_ids(paths, ids):
+    return {paths.to_str(path) for path in ids}
+
+
 class DualWriter(io.StringIO):
     def __init__(self, original_stdout):
         super().__init__()
@@ -151,6 +156,54 @@ class TestGenerateDataTable(unittest.TestCase):
         wanted_ids = {'eg__FRAMES', 'eg__cdeeg__cdeeg+__FRAMES'}
         self.assertEqual(all_ids, wanted_ids)
 
+    @test_for(get_all_ids)
+    def test_get_all_ids_cycle(self):
+        d_onto = {'a': ['b'], 'b': ['c', 'FRAMES'], 'c': ['a', 'FRAMES']}
+        cycles = set()
+        all_ids = get_all_ids('a', 'a', d_onto, ROOTS[METACYC], set(), cycles)
+        self.assertEqual(all_ids, {'a__b__FRAMES', 'a__b__c__FRAMES'})
+        self.assertEqual(cycles, {frozenset({'a', 'b', 'c'})})
+
+    @test_for(get_all_ids)
+    def test_get_all_ids_deep(self):
+        d_onto = {str(i): [str(i + 1)] for i in range(5000)}
+        all_ids = get_all_ids('0', '0', d_onto, '5000', set())
+        self.assertEqual(all_ids, {'__'.join(str(i) for i in range(5001))})
+
+    @test_for(get_class_ids)
+    def test_get_class_ids(self):
+        paths = PathTable()
+        for c in ['c', 'e', 'eg']:
+            self.assertEqual(get_str_ids(paths, get_class_ids(c, CT_ONTO, ROOTS[METACYC], paths)),
+                             get_all_ids(c, c, CT_ONTO, ROOTS[METACYC], set()))
+        # Ancestors IDs computed once
+        self.assertEqual(set(paths.class_paths),
+                         {'c', 'cf', 'cde', 'cdecf', 'cdeeg', 'cdeeg+', 'e', 'eg'})
+        self.assertEqual(get_str_ids(paths, paths.class_paths['cde']),
+                         {'cde__cdecf__FRAMES', 'cde__cdeeg__cdeeg+__FRAMES'})
+
+    @test_for(get_class_ids)
+    def test_get_class_ids_cycle(self):
+        d_onto = {'d': ['a'], 'a': ['b'], 'b': ['c', 'FRAMES'], 'c': ['a', 'FRAMES']}
+        paths = PathTable()
+        cycles = set()
+        self.assertEqual(get_str_ids(paths, get_class_ids('d', d_onto, ROOTS[METACYC], paths,
+                                                          cycles)),
+                         {'d__a__b__FRAMES', 'd__a__b__c__FRAMES'})
+        self.assertEqual(get_str_ids(paths, paths.class_paths['b']), {'b__FRAMES', 'b__c__FRAMES'})
+        self.assertEqual(get_str_ids(paths, paths.class_paths['c']),
+                         {'c__FRAMES', 'c__a__b__FRAMES'})
+        self.assertEqual(cycles, {frozenset({'a', 'b', 'c'})})
+
+    @test_for(get_class_ids)
+    def test_get_class_ids_deep(self):
+        d_onto = {str(i): [str(i + 1)] for i in range(5000)}
+        paths = PathTable()
+        self.assertEqual(get_str_ids(paths, get_class_ids('0', d_onto, '5000', paths)),
+                         {'__'.join(str(i) for i in range(5001))})
+        self.assertEqual(len(paths.class_paths), 5000)
+        self.assertEqual(len(paths), 5001)
+
     @test_for(DataTable.add_value)
     def test_add_value_data(self):
         data = DataTable()
@@ -332,6 +385,160 @@ class TestGenerateDataTable(unittest.TestCase):
                    ('a__ab__FRAMES', 'a', 'a', 'ab__FRAMES', 1, 1, nan, nan, nan, nan)}
         self.assertEqual(lines, w_lines)
 
+    @test_for(DataTable.fill_parameters)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_fill_parameters_primary_parent(self, mock_stdout):
+        data = DataTable()
+        data.fill_parameters(set_abundance=CT_AB, ref_abundance=CT_REF_AB, parent_dict=CT_ONTO,
+                             root_item=ROOTS[METACYC], primary_parent=True)
+        self.assertEqual(set(data.ids),
+                         {'FRAMES', 'ab__FRAMES', 'a__ab__FRAMES', 'b__ab__FRAMES', 'cdecf__FRAMES',
+                          'cde__cdecf__FRAMES', 'c__cde__cdecf__FRAMES', 'd__cde__cdecf__FRAMES',
+                          'e__cde__cdecf__FRAMES', 'cf__cdecf__FRAMES', 'f__cf__cdecf__FRAMES',
+                          'cdeeg+__FRAMES', 'cdeeg__cdeeg+__FRAMES', 'eg__cdeeg__cdeeg+__FRAMES',
+                          'gh__FRAMES', 'g__gh__FRAMES', 'h__gh__FRAMES'})
+        self.assertEqual(len(set(data.onto_ids)), data.len)
+        self.assertEqual(data.dropped, {PRIMARY_PARENT: 10})
+        self.assertEqual(mock_stdout.getvalue().strip(),
+                         'Path budget (primary parent) : 10 sectors dropped.')
+
+    @test_for(DataTable.fill_parameters)
+    def test_fill_parameters_max_class_paths(self):
+        data = DataTable()
+        data.fill_parameters(set_abundance=CT_AB, ref_abundance=CT_REF_AB, parent_dict=CT_ONTO,
+                             root_item=ROOTS[METACYC], max_class_paths=2)
+        self.assertEqual(data.len, 23)
+        self.assertEqual(data.dropped, {MAX_CLASS_PATHS: 4})
+        # Shortest paths kept
+        self.assertEqual({m_id for m_id, onto_id in zip(data.ids, data.onto_ids) if onto_id == 'e'},
+                         {'e__eg__FRAMES', 'e__cde__cdecf__FRAMES'})
+        self.assertTrue(all(p in data.ids for p in data.parents if p != ''))
+
+    @test_for(DataTable.fill_parameters)
+    def test_fill_parameters_max_sectors(self):
+        data = DataTable()
+        data.fill_parameters(set_abundance=CT_AB, ref_abundance=CT_REF_AB, parent_dict=CT_ONTO,
+                             root_item=ROOTS[METACYC], max_sectors=10, max_class_paths=2)
+        self.assertEqual(set(data.ids),
+                         {'FRAMES', 'ab__FRAMES', 'cdecf__FRAMES', 'cdeeg+__FRAMES', 'eg__FRAMES',
+                          'gh__FRAMES', 'cdeeg__cdeeg+__FRAMES', 'cde__cdecf__FRAMES',
+                          'cf__cdecf__FRAMES', 'h__gh__FRAMES'})
+        self.assertEqual(data.dropped, {MAX_CLASS_PATHS: 4, MAX_SECTORS: 13})
+        data = DataTable()
+        data.fill_parameters(set_abundance=CT_AB, ref_abundance=CT_REF_AB, parent_dict=CT_ONTO,
+                             root_item=ROOTS[METACYC], max_sectors=100)
+        self.assertEqual((data.len, data.dropped), (27, {MAX_SECTORS: 0}))
+
+    @test_for(get_class_ids)
+    def test_get_class_ids_cycle_budget(self):
+        d_onto = {'d': ['a'], 'a': ['b'], 'b': ['c', 'FRAMES'], 'c': ['a', 'FRAMES']}
+        paths = PathTable()
+        cycles = set()
+        # Cycle broken from b and c (parents outside the cycle), then a
+        get_class_ids('d', d_onto, ROOTS[METACYC], paths, cycles, max_paths=5)
+        self.assertEqual({c: get_str_ids(paths, c_ids) for c, c_ids in paths.class_paths.items()},
+                         {'a': {'a__b__FRAMES'}, 'b': {'b__FRAMES'}, 'c': {'c__FRAMES'},
+                          'd': {'d__a__b__FRAMES'}})
+        self.assertEqual(cycles, {frozenset({'a', 'b', 'c'})})
+        self.assertEqual(count_class_ids('d', d_onto, ROOTS[METACYC], dict()), 1)
+
+    @test_for(get_acyclic_parents)
+    def test_get_acyclic_parents(self):
+        d_onto = {'a': ['b'], 'b': ['c', 'a', 'FRAMES'], 'c': ['a', 'b'], 'd': ['d', 'FRAMES']}
+        self.assertEqual(get_acyclic_parents(['c', 'b', 'a'], d_onto),
+                         [('b', ['FRAMES']), ('a', ['b']), ('c', ['a', 'b'])])
+        self.assertEqual(get_acyclic_parents(['d'], d_onto), [('d', ['FRAMES'])])
+
+    @test_for(select_sectors)
+    def test_select_sectors(self):
+        paths = PathTable()
+        classes_ids = [[paths.from_str(c_id) for c_id in c_ids]
+                       for c_ids in [['FRAMES'], ['a__c__FRAMES', 'a__b__FRAMES', 'a__FRAMES'],
+                                     ['c__FRAMES', 'b__FRAMES']]]
+        self.assertEqual([get_str_ids(paths, c_ids)
+                          for c_ids in select_sectors(classes_ids, 3, paths)],
+                         [{'FRAMES'}, {'a__FRAMES'}, {'b__FRAMES'}])
+        self.assertEqual([get_str_ids(paths, c_ids)
+                          for c_ids in select_sectors(classes_ids, 5, paths)],
+                         [{'FRAMES'}, {'a__FRAMES', 'a__b__FRAMES'}, {'b__FRAMES', 'c__FRAMES'}])
+        self.assertEqual(select_sectors(classes_ids, 0, paths), [[], [], []])
+        self.assertEqual(select_sectors(classes_ids, 6, paths), classes_ids)
+
+
+class TestPathTable(unittest.TestCase):
+    @test_for(PathTable.from_str)
+    def test_from_str(self):
+        paths = PathTable()
+        path = paths.from_str('a__ab__FRAMES')
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(paths.path_names[path], 'a')
+        self.assertEqual(paths.path_parents[path], paths.from_str('ab__FRAMES'))
+        self.assertEqual(paths.path_depths[path], 3)
+        self.assertEqual(paths.get_path('a', paths.get_path('ab', paths.get_path('FRAMES'))), path)
+        self.assertEqual(paths.from_str(''), NO_PATH)
+        self.assertEqual(len(paths), 3)
+
+    @test_for(PathTable.to_strs)
+    def test_to_strs(self):
+        paths = PathTable()
+        ids = ['a__ab__FRAMES', 'b__ab__FRAMES', 'FRAMES', 'x____y', 'ab__FRAMES']
+        self.assertEqual(paths.to_strs([paths.from_str(m_id) for m_id in ids] + [NO_PATH]),
+                         ids + [''])
+        self.assertEqual(paths.to_str(paths.from_str('x__')), 'x__')
+
+    @test_for(PathTable.to_strs)
+    def test_to_strs_collision(self):
+        paths = PathTable()
+        a_b = paths.get_path('a__b')
+        a_b_path = paths.get_path('a', paths.get_path('b'))
+        self.assertEqual(paths.to_strs([a_b, a_b]), ['a__b', 'a__b'])
+        with self.assertRaisesRegex(ValueError, 'a__b already in data IDs'):
+            paths.to_strs([a_b, a_b_path])
+        # Class name containing the separator : sectors IDs collide
+        data = DataTable()
+        abundances = {'a__b': 1, 'a': 1, 'b': 1, 'FRAMES': 3}
+        data.fill_parameters(abundances, abundances,
+                             {'a__b': ['FRAMES'], 'a': ['b'], 'b': ['FRAMES']}, ROOTS[METACYC])
+        with self.assertRaisesRegex(ValueError, 'a__b__FRAMES already in data IDs'):
+            data.ids[0]
+
+
+class TestPathColumn(unittest.TestCase):
+    @test_for(PathColumn.get_strings)
+    def test_ids_loop(self):
+        data = DataTable()
+        for i in range(20000):
+            data.add_value(f'c{i}__r', f'c{i}', f'c{i}', 1, 1, 'r')
+        decoded = list()
+        with patch.object(data.paths, 'to_strs', wraps=data.paths.to_strs) as to_strs:
+            for i in range(data.len):
+                decoded.append(data.ids[i])
+            self.assertEqual(to_strs.call_count, 1)
+        self.assertEqual(decoded, [f'c{i}__r' for i in range(20000)])
+        self.assertIs(data.ids, data.ids)
+        data.add_value('c__r', 'c', 'c', 1, 1, 'r')
+        self.assertEqual(data.ids[-1], 'c__r')
+
+    @test_for(PathColumn.__setitem__)
+    def test_set_parents(self):
+        for columnar in [False, True]:
+            data = DataTable(columnar)
+            data.add_value('r', 'r', 'r', 2, 2, '')
+            data.add_value('a__r', 'a', 'a', 2, 2, 'r')
+            data.add_value('b__r', 'b', 'b', 1, 1, 'r')
+            data.parents[2] = 'a__r'
+            self.assertEqual(data.parents, ['', 'r', 'a__r'])
+            self.assertEqual(data.get_data_dict()[PARENT], ['', 'r', 'a__r'])
+            self.assertEqual(data.parent_paths[2], data.id_paths[1])
+            self.assertEqual(data.children[data.id_paths[1]], [data.id_paths[2]])
+            data.ids[2] = 'b__a__r'
+            self.assertEqual(data.ids, ['r', 'a__r', 'b__a__r'])
+            self.assertEqual(data.index[data.paths.from_str('b__a__r')], 2)
+            data.calculate_proportions(True)
+            self.assertEqual(list(data.relative_prop), [1000000, 1000000, 500000])
+            with self.assertRaises(TypeError):
+                data.ids.append('c__r')
+
 
 class TestAddProportionDataTable(unittest.TestCase):
 
@@ -365,6 +572,21 @@ class TestAddProportionDataTable(unittest.TestCase):
         for k, v in W_REL_PROP.items():
             self.assertEqual(data.relative_prop[data.ids.index(k)], v)
 
+    @test_for(DataTable.calculate_proportions)
+    def test_get_data_proportion_relative_deep(self):
+        # Deeper than the recursion limit
+        depth = 5000
+        onto = {f'c{i}': [f'c{i - 1}'] for i in range(1, depth)}
+        ab = {f'c{i}': 1 for i in range(depth)}
+        for columnar in [False, True]:
+            data = DataTable(columnar)
+            with patch('sys.stdout', new=DualWriter(sys.stdout)):
+                data.fill_parameters(ref_abundance=ab, parent_dict=onto, root_item='c0',
+                                     set_abundance=ab)
+            data.calculate_proportions(True)
+            self.assertEqual(data.len, depth)
+            self.assertEqual(list(data.relative_prop), [MAX_RELATIVE_NB] * depth)
+
 
 # ENRICHMENT TESTS
 # ==================================================================================================
@@ -454,6 +676,36 @@ class TestEnrichmentAnalysis(unittest.TestCase):
         self.assertEqual(len(lines), len(exp_lines))
         self.assertEqual(significant, exp_significant)
 
+    @test_for(get_binomial_p_values)
+    def test_get_binomial_p_values(self):
+        k = np.array([0, 5, 12, 20, 25, 40, 50])
+        p = np.array([0.4, 0.4, 0.1, 0.4, 0.5, 0.9, 0.7])
+        p_vals = get_binomial_p_values(k, 50, p)
+        exp_p_vals = [stats.binomtest(k_i, 50, p_i, alternative='two-sided').pvalue
+                      for k_i, p_i in zip(k, p)]
+        self.assertEqual(list(p_vals), exp_p_vals)
+        log_p_vals = get_binomial_p_values(k, 50, p, log=True)
+        self.assertTrue(np.allclose(log_p_vals, np.log(exp_p_vals)))
+
+    @test_for(DataTable.make_enrichment_analysis)
+    def test_get_data_enrichment_analysis_underflow(self):
+        ab = {'00': 5000, '01': 0, '02': 5000}
+        ref_ab = {'00': 10000, '01': 5000, '02': 5000}
+        onto = {'01': ['00'], '02': ['00']}
+        for test in [BINOMIAL_TEST, HYPERGEO_TEST]:
+            data = DataTable()
+            data.fill_parameters(ab, ref_ab, onto, '00')
+            data.calculate_proportions(True)
+            significant = data.make_enrichment_analysis(test)
+            p_val_1 = data.p_val[data.onto_ids.index('01')]
+            p_val_2 = data.p_val[data.onto_ids.index('02')]
+            self.assertTrue(np.isfinite(p_val_1) and p_val_1 < -1000)
+            self.assertTrue(np.isfinite(p_val_2) and p_val_2 > 1000)
+            self.assertEqual(set(significant), {'01', '02'})
+            if test == BINOMIAL_TEST:
+                # p-value = 2 * 0.5 ** 5000
+                self.assertAlmostEqual(p_val_1, np.log10(2) + 5000 * np.log10(0.5))
+
     @test_for(DataTable.make_enrichment_analysis)
     def test_get_data_enrichment_analysis_scores(self):
         scores = {'00': 0.05, '01': 0.2, '02': 0.0004, '03': 0.5, '04': 0.000008, '05': 0.9,
@@ -588,6 +840,29 @@ class TestTopologyManagement(unittest.TestCase):
             line = tuple([nan if type(x) != str and np.isnan(x) else x for x in line])
             self.assertIn(line, exp_lines)
 
+    @test_for(DataTable.set_parent)
+    def test_index_consistency(self):
+        def assert_index(data):
+            self.assertEqual(data.index, {path: i for i, path in enumerate(data.id_paths)})
+            children = dict()
+            for path, parent in zip(data.id_paths, data.parent_paths):
+                children.setdefault(parent, set()).add(path)
+            self.assertEqual({p: set(c) for p, c in data.children.items() if c}, children)
+            self.assertEqual(data.ids, [data.paths.to_str(path) for path in data.id_paths])
+
+        for mode in [PATH_DEEPER, PATH_HIGHER, PATH_BOUND]:
+            data = DataTable()
+            data.fill_parameters(PATH_AB, PATH_REF_AB, PATH_ONTO, ROOTS[METACYC], PATH_LAB)
+            assert_index(data)
+            data.calculate_proportions(True)
+            data.cut_root(ROOT_CUT)
+            assert_index(data)
+            data.cut_nested_path(mode, False)
+            assert_index(data)
+        with self.assertRaises(ValueError):
+            data.add_value(m_id=data.ids[0], onto_id='x', label='x', count=1, ref_count=1,
+                           parent='')
+
     @test_for(DataTable.cut_nested_path)
     def test_cut_path_uncut(self):
         data = DataTable()
@@ -646,3 +921,86 @@ class TestTopologyManagement(unittest.TestCase):
             self.assertIn(line, exp_lines)
 
 
+
+
+# TEST COLUMNAR DATATABLE
+# --------------------------------------------------------------------------------------------------
+class TestColumnarDataTable(unittest.TestCase):
+
+    @staticmethod
+    def normalize(values):
+        # NaN values compared as strings, int values distinguished from float values
+        return [x if type(x) == str else 'nan' if np.isnan(x) else (type(x) == int, x)
+                for x in values]
+
+    def assert_same_data(self, data, c_data):
+        wanted = data.get_data_dict()
+        for k, v in c_data.get_data_dict().items():
+            self.assertEqual(self.normalize(v), self.normalize(wanted[k]), k)
+        self.assertEqual([self.normalize(col) for col in c_data.get_col()],
+                         [self.normalize(col) for col in data.get_col()])
+        for v in c_data.get_data_dict().values():
+            self.assertTrue(all(x is nan for x in v if type(x) != str and np.isnan(x)))
+
+    @test_for(DataTable.add_value)
+    def test_add_value_columnar(self):
+        data = DataTable(columnar=True)
+        data.add_value(m_id='bjr', onto_id='Bjr_0', label='bonjour', count=2, ref_count=8,
+                       parent='salutations')
+        data.add_value(m_id='slt', onto_id='sl_1', label='salut', count=0.5, ref_count=nan,
+                       parent='salutations')
+        self.assertIsInstance(data.count, np.ndarray)
+        wanted_data = {IDS: ['bjr', 'slt'],
+                       ONTO_ID: ['Bjr_0', 'sl_1'],
+                       PARENT: ['salutations', 'salutations'],
+                       LABEL: ['bonjour', 'salut'],
+                       COUNT: [2, 0.5],
+                       REF_COUNT: [8, nan],
+                       PROP: [nan, nan], REF_PROP: [nan, nan], RELAT_PROP: [nan, nan],
+                       PVAL: [nan, nan]}
+        self.assertEqual(data.get_data_dict(), wanted_data)
+        self.assertEqual(data.get_col(1), [('slt', 'sl_1', 'salut', 'salutations', 0.5, nan, nan,
+                                            nan, nan, nan)])
+        data.freeze()
+        self.assertEqual(len(data.count), 2)
+        with self.assertRaises(ValueError):
+            data.add_value(m_id='hey', onto_id='hey', label='hey', count=1, ref_count=1,
+                           parent='salutations')
+
+    @test_for(DataTable.fill_parameters)
+    @patch('ontosunburst.data_table_tree.CHUNK_SIZE', 4)
+    def test_fill_parameters_columnar(self):
+        for ref_base in [True, False]:
+            data = DataTable()
+            data.fill_parameters(CT_AB, CT_REF_AB, CT_ONTO, ROOTS[METACYC], CT_LAB, ref_base)
+            c_data = DataTable(columnar=True)
+            c_data.fill_parameters(CT_AB, CT_REF_AB, CT_ONTO, ROOTS[METACYC], CT_LAB, ref_base)
+            self.assertTrue(c_data.frozen)
+            self.assertEqual(len(c_data.count), c_data.len)
+            self.assert_same_data(data, c_data)
+            data.calculate_proportions(ref_base)
+            c_data.calculate_proportions(ref_base)
+            self.assert_same_data(data, c_data)
+
+    @test_for(DataTable.make_enrichment_analysis)
+    def test_enrichment_analysis_columnar(self):
+        for test in [BINOMIAL_TEST, HYPERGEO_TEST]:
+            tables = [DataTable(), DataTable(columnar=True)]
+            significants = list()
+            for data in tables:
+                data.fill_parameters(ENRICH_AB, ENRICH_REF_AB, E_ONTO, '00', E_LABElS)
+                data.calculate_proportions(True)
+                significants.append(data.make_enrichment_analysis(test))
+            self.assertEqual(significants[0], significants[1])
+            self.assert_same_data(*tables)
+
+    @test_for(DataTable.cut_nested_path)
+    def test_cuts_columnar(self):
+        for mode in [PATH_DEEPER, PATH_HIGHER, PATH_BOUND]:
+            tables = [DataTable(), DataTable(columnar=True)]
+            for data in tables:
+                data.fill_parameters(PATH_AB, PATH_REF_AB, PATH_ONTO, ROOTS[METACYC], PATH_LAB)
+                data.calculate_proportions(True)
+                data.cut_root(ROOT_CUT)
+                data.cut_nested_path(mode, False)
+            self.assert_same_data(*tables)
@@ -2,16 +2,21 @@ import unittest
 from unittest.mock import patch
 import io
 import sys
+import tempfile
 from functools import wraps
 from ontosunburst.ontology import *
 from ontosunburst.ontosunburst import *
+from ontosunburst.sparql import get_sparql_client, get_sparql_cache
+from ontosunburst.sparql_server import LocalSparqlServer
 
 # ==================================================================================================
 # GLOBAL
 # ==================================================================================================
 
 GO_LST = ['go:0043227', 'go:0043229', 'go:0043231', 'go:0044422']
-GO_URL = 'http://localhost:3030/go/'
+# Local stand-in of the SPARQL server, serving the ontology fragment of the tests
+SERVER = LocalSparqlServer({'go': os.path.join('test_files', 'go_fragment.obo')})
+GO_URL = SERVER.get_url('go')
 
 
 # ==================================================================================================
@@ -93,6 +98,15 @@ class DualWriter(io.StringIO):
 # UNIT TESTS
 # ==================================================================================================
 
+def setUpModule():
+    SERVER.start()
+
+
+def tearDownModule():
+    get_sparql_client(GO_URL).close()
+    SERVER.stop()
+
+
 # TEST ONTOLOGY : CLASSES EXTRACTION
 # --------------------------------------------------------------------------------------------------
 class TestGOClassesExtraction(unittest.TestCase):
@@ -155,7 +169,23 @@ class TestGOClassesExtraction(unittest.TestCase):
         fig = ontosunburst(interest_set=GO_LST, ontology=GO, root='00',
                            abundances=None, reference_set=None, ref_abundances=None,
                            analysis='topology', output='test_go1', write_output=False,
-                           class_ontology=None, labels=None, endpoint_url=None, root_cut='uncut',
+                           class_ontology=None, labels=None, endpoint_url=GO_URL, root_cut='uncut',
                            ref_base=False, show_leaves=True)
         w_fig_file = os.path.join('test_files', 'test_go1.json')
         self.assertTrue(are_fig_dict_equals(fig, w_fig_file))
+
+    @test_for(ontosunburst)
+    def test_ontosunburst_go_local_and_endpoint(self):
+        # Local ontology and SPARQL endpoint both given : ambiguous
+        with self.assertRaises(ValueError):
+            ontosunburst(interest_set=GO_LST, ontology=GO, write_output=False,
+                         class_ontology={'GO:0043229': ['cellular_component']},
+                         endpoint_url=GO_URL)
+
+    @test_for(ontosunburst)
+    def test_ontosunburst_go_sparql_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ontosunburst(interest_set=GO_LST, ontology=GO, write_output=False,
+                         endpoint_url=GO_URL, sparql_cache=cache_dir)
+            cache = get_sparql_cache(cache_dir)
+            self.assertEqual(set(cache.get(GO_URL, 'go_classes', GO_LST)), set(GO_LST))
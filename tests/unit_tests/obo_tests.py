@@ -0,0 +1,201 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import sys
+import json
+import gzip
+import tempfile
+from functools import wraps
+from ontosunburst.obo import *
+from ontosunburst.ontology import extract_classes
+from ontosunburst.compiled_ontology import load_class_ontology
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+GO_OBO = """format-version: 1.2
+ontology: go
+
+[Term]
+id: GO:0000001
+name: one
+namespace: cellular_component
+def: "First term." [GOC:test]
+is_a: GO:0000002 ! two
+relationship: part_of GO:0000004 ! four
+
+[Term]
+id: GO:0000002
+name: two
+is_a: GO:0000003 ! cellular_component
+
+[Term]
+id: GO:0000003
+name: cellular_component
+
+[Term]
+id: GO:0000004
+name: four
+is_a: GO:0000003 ! cellular_component
+
+[Term]
+id: GO:0000005
+name: obsolete five
+is_obsolete: true
+
+[Typedef]
+id: part_of
+name: part of
+is_a: GO:0000001
+"""
+
+CHEBI_OBO = """format-version: 1.2
+ontology: chebi
+
+[Term]
+id: CHEBI:50906
+name: role
+
+[Term]
+id: CHEBI:1
+name: one
+is_a: CHEBI:50906
+
+[Term]
+id: CHEBI:2
+name: two
+is_a: CHEBI:1
+
+[Term]
+id: CHEBI:3
+name: three
+is_a: CHEBI:1
+is_a: CHEBI:50906
+
+[Term]
+id: CHEBI:4
+name: four
+is_a: CHEBI:3
+
+[Term]
+id: CHEBI:24431
+name: chemical entity
+
+[Term]
+id: CHEBI:20
+name: chemical class
+is_a: CHEBI:24431
+relationship: has_role CHEBI:2
+
+[Term]
+id: CHEBI:10
+name: ten
+is_a: CHEBI:20
+relationship: RO:0000087 CHEBI:4
+
+[Term]
+id: CHEBI:11
+name: eleven
+is_a: CHEBI:24431
+relationship: has_role CHEBI:1
+
+[Term]
+id: CHEBI:12
+name: twelve
+is_a: CHEBI:24431
+relationship: has_part CHEBI:10
+"""
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+class DualWriter(io.StringIO):
+    def __init__(self, original_stdout):
+        super().__init__()
+        self.original_stdout = original_stdout
+
+    def write(self, s):
+        super().write(s)
+        self.original_stdout.write(s)
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+# TEST OBO PARSING
+# --------------------------------------------------------------------------------------------------
+class TestObo(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_obo(self, name, content):
+        path = os.path.join(self.tmp_dir.name, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wt') as f:
+            f.write(content)
+        return path
+
+    @test_for(iter_obo_terms)
+    def test_iter_obo_terms(self):
+        for name in ['go.obo', 'go.obo.gz']:
+            terms = list(iter_obo_terms(self.write_obo(name, GO_OBO)))
+            self.assertEqual([t['id'] for t in terms], ['GO:0000001', 'GO:0000002', 'GO:0000003',
+                                                        'GO:0000004', 'GO:0000005'])
+            self.assertEqual(terms[0], {'id': 'GO:0000001', 'name': 'one',
+                                        'is_a': ['GO:0000002'],
+                                        'relationship': [('part_of', 'GO:0000004')],
+                                        'is_obsolete': False})
+            self.assertTrue(terms[4]['is_obsolete'])
+
+    @test_for(build_go_ontology)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_build_go_ontology(self, mock_stdout):
+        output = os.path.join(self.tmp_dir.name, 'go.json')
+        self.assertEqual(build_go_ontology(self.write_obo('go.obo', GO_OBO), output),
+                         (output, os.path.join(self.tmp_dir.name, 'go_labels.json')))
+        d_onto = load_class_ontology(output)
+        self.assertEqual(dict(d_onto.items()), {'go:0000001': ['go:0000002'],
+                                                'go:0000002': ['go:0000003'],
+                                                'go:0000003': ['GO'],
+                                                'go:0000004': ['go:0000003']})
+        with open(os.path.join(self.tmp_dir.name, 'go_labels.json')) as f:
+            self.assertEqual(json.load(f), {'go:0000001': 'one', 'go:0000002': 'two',
+                                            'go:0000003': 'cellular_component',
+                                            'go:0000004': 'four'})
+        all_classes = extract_classes('go', ['go:0000001', 'go:0000004'], 'GO', d_onto, None)[0]
+        self.assertEqual(all_classes, {'go:0000001': {'go:0000002', 'go:0000003', 'GO'},
+                                       'go:0000004': {'go:0000003', 'GO'}})
+
+    @test_for(build_chebi_ontology)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_build_chebi_ontology(self, mock_stdout):
+        output = os.path.join(self.tmp_dir.name, 'chebi.json')
+        build_chebi_ontology(self.write_obo('chebi.obo', CHEBI_OBO), output)
+        d_onto = load_class_ontology(output)
+        self.assertEqual(dict(d_onto.items()), {'1': ['role'], '2': ['1'], '3': ['1', 'role'],
+                                                '4': ['3'], '20': ['2'], '10': ['2', '4'],
+                                                '11': ['1']})
+        with open(os.path.join(self.tmp_dir.name, 'chebi_labels.json')) as f:
+            self.assertEqual(json.load(f), {'1': 'one', '2': 'two', '3': 'three', '4': 'four',
+                                            'role': 'role', '10': 'ten', '11': 'eleven',
+                                            '20': 'chemical class'})
+        all_classes = extract_classes('chebi', ['10', '11', '12'], 'role', d_onto, None)[0]
+        self.assertEqual(all_classes, {'10': {'1', '2', '3', '4', 'role'}, '11': {'1', 'role'}})
@@ -0,0 +1,259 @@
+import unittest
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+from functools import wraps
+import numpy as np
+from ontosunburst.ontology_graph import *
+from ontosunburst.ontology import *
+from ontosunburst.data_table_tree import DataTable
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+MC_ONTO = {'a': ['ab'], 'b': ['ab'], 'c': ['cde', 'cf'], 'd': ['cde'], 'e': ['cde', 'eg'],
+           'f': ['cf'], 'g': ['gh', 'eg'], 'h': ['gh'],
+           'ab': [ROOTS[METACYC]], 'cde': ['cdecf', 'cdeeg'], 'cf': ['cdecf'],
+           'eg': [ROOTS[METACYC], 'cdeeg'], 'gh': [ROOTS[METACYC]],
+           'cdecf': [ROOTS[METACYC]], 'cdeeg': ['cdeeg+'], 'cdeeg+': [ROOTS[METACYC]]}
+MET_LST = ['a', 'b', 'c']
+CT_AB = {'FRAMES': 6, 'cde': 3, 'cf': 3, 'cdecf': 3, 'cdeeg+': 3, 'cdeeg': 3, 'c': 3, 'ab': 3,
+         'b': 2, 'a': 1}
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+# TEST GRAPH
+# --------------------------------------------------------------------------------------------------
+class TestOntologyGraph(unittest.TestCase):
+    @test_for(OntologyGraph.from_dict)
+    def test_from_dict(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        self.assertEqual(graph.n_keys, 16)
+        self.assertEqual(graph.n_names, 17)
+        self.assertEqual(graph.name(16), 'FRAMES')
+        self.assertEqual(list(graph.offsets[:4]), [0, 1, 2, 4])
+        self.assertEqual(graph.parent_indexes(graph.index('c')),
+                         [graph.index('cde'), graph.index('cf')])
+        self.assertEqual(graph.parent_indexes(graph.index('FRAMES')), [])
+
+    @test_for(OntologyGraph.__getitem__)
+    def test_mapping(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        self.assertEqual(graph['e'], ['cde', 'eg'])
+        self.assertEqual(list(graph), list(MC_ONTO))
+        self.assertEqual(len(graph), len(MC_ONTO))
+        self.assertEqual(graph, MC_ONTO)
+        self.assertEqual(graph.to_dict(), MC_ONTO)
+        self.assertIn('cdeeg+', graph)
+        self.assertNotIn('FRAMES', graph)
+        with self.assertRaises(KeyError):
+            _ = graph['FRAMES']
+
+    @test_for(as_ontology_graph)
+    def test_as_ontology_graph(self):
+        graph = as_ontology_graph(MC_ONTO)
+        self.assertIsInstance(graph, OntologyGraph)
+        self.assertIs(as_ontology_graph(graph), graph)
+
+
+# TEST ANCESTOR INDEX
+# --------------------------------------------------------------------------------------------------
+class TestAncestorIndex(unittest.TestCase):
+    @test_for(AncestorIndex.build)
+    def test_build(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        index = graph.ancestor_index(ROOTS[METACYC])
+        self.assertTrue(graph.has_ancestor_index(ROOTS[METACYC]))
+        self.assertIs(graph.ancestor_index(ROOTS[METACYC]), index)
+        self.assertEqual(index.ancestors_of('c'),
+                         {'cdeeg+', 'FRAMES', 'cf', 'cde', 'cdecf', 'cdeeg'})
+        self.assertEqual(index.ancestors_of('ab'), {'FRAMES'})
+        self.assertEqual(index.ancestors_of('FRAMES'), set())
+        for k in MC_ONTO:
+            self.assertEqual(index.ancestors_of(k),
+                             get_parents(k, set(MC_ONTO[k]), MC_ONTO, ROOTS[METACYC]))
+
+    @test_for(OntologyGraph.ancestor_index)
+    def test_ancestor_index_threads(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        build = AncestorIndex.build
+        built = list()
+
+        def count_build(*args):
+            built.append(args)
+            return build(*args)
+
+        indexes = list()
+        with patch.object(AncestorIndex, 'build', side_effect=count_build):
+            threads = [threading.Thread(
+                target=lambda: indexes.append(graph.ancestor_index(ROOTS[METACYC])))
+                for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(index is indexes[0] for index in indexes))
+
+    @test_for(AncestorIndex.build)
+    def test_build_cycle(self):
+        graph = OntologyGraph.from_dict({'x': ['a'], 'a': ['b'], 'b': ['a', 'FRAMES']})
+        index = graph.ancestor_index(ROOTS[METACYC])
+        self.assertEqual(index.ancestors_of('x'), {'a', 'b', 'FRAMES'})
+        self.assertEqual(index.ancestors_of('a'), {'a', 'b', 'FRAMES'})
+        self.assertEqual(index.ancestors_of('b'), {'a', 'b', 'FRAMES'})
+
+    @test_for(AncestorIndex.gather)
+    def test_gather(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        index = graph.ancestor_index(ROOTS[METACYC])
+        c_i, a_i = graph.index('c'), graph.index('a')
+        offsets, ancestors = index.gather(np.array([c_i, a_i]))
+        self.assertEqual(list(offsets), [0, 6, 8])
+        self.assertEqual({graph.name(i) for i in ancestors[:6]},
+                         {'cdeeg+', 'FRAMES', 'cf', 'cde', 'cdecf', 'cdeeg'})
+        self.assertEqual(list(ancestors[6:]), list(index.ancestor_indexes(a_i)))
+
+    @test_for(AncestorIndex.get_all_classes)
+    def test_get_all_classes(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        index = graph.ancestor_index(ROOTS[METACYC])
+        obj_classes = {'a': ['ab'], 'c': ['cde', 'cf'], 'x': ['eg', 'ab'], 'y': ['FRAMES']}
+        self.assertEqual(index.get_all_classes(obj_classes),
+                         {'a': {'FRAMES', 'ab'},
+                          'c': {'cdeeg+', 'FRAMES', 'cf', 'cde', 'cdecf', 'cdeeg'},
+                          'x': {'eg', 'ab', 'cdeeg', 'cdeeg+', 'FRAMES'},
+                          'y': {'FRAMES'}})
+
+    @test_for(AncestorIndex.save)
+    def test_save_load(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        index = graph.ancestor_index(ROOTS[METACYC])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_file = get_ancestor_index_path(os.path.join(tmp_dir, 'onto.json'))
+            self.assertEqual(os.path.basename(index_file), 'onto.anc.npz')
+            index.save(index_file)
+            loaded = AncestorIndex.load(index_file, graph)
+            with self.assertRaises(ValueError):
+                AncestorIndex.load(index_file, OntologyGraph.from_dict({'a': ['b']}))
+        self.assertEqual(loaded.root_item, ROOTS[METACYC])
+        self.assertEqual(list(loaded.offsets), list(index.offsets))
+        self.assertEqual(list(loaded.ancestors), list(index.ancestors))
+
+
+# TEST OVERLAY
+# --------------------------------------------------------------------------------------------------
+class TestOntologyOverlay(unittest.TestCase):
+    @test_for(OntologyOverlay)
+    def test_overlay(self):
+        base = {'a': ['ab'], 'b': ['ab'], 'ab': ['FRAMES']}
+        overlay = OntologyOverlay(base)
+        overlay['c'] = ['ab']
+        overlay['a'] = ['FRAMES']
+        self.assertEqual(base, {'a': ['ab'], 'b': ['ab'], 'ab': ['FRAMES']})
+        self.assertEqual(list(overlay.items()),
+                         [('a', ['FRAMES']), ('b', ['ab']), ('ab', ['FRAMES']), ('c', ['ab'])])
+        self.assertEqual(len(overlay), 4)
+        del overlay['b']
+        del overlay['c']
+        self.assertNotIn('b', overlay)
+        self.assertEqual(list(overlay), ['a', 'ab'])
+        self.assertEqual(len(overlay), 2)
+        with self.assertRaises(KeyError):
+            _ = overlay['b']
+        overlay['b'] = ['a']
+        self.assertEqual(overlay['b'], ['a'])
+        self.assertEqual(len(overlay), 3)
+        self.assertEqual(base['b'], ['ab'])
+
+    @test_for(OntologyOverlay)
+    def test_overlay_graph(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        overlay = OntologyOverlay(graph)
+        overlay['x'] = ['cde']
+        self.assertNotIn('x', graph)
+        self.assertEqual(get_parents('x', set(), overlay, ROOTS[METACYC]),
+                         {'cde', 'cdecf', 'cdeeg', 'cdeeg+', 'FRAMES'})
+
+
+# TEST TOPOLOGICAL ORDER
+# --------------------------------------------------------------------------------------------------
+class TestTopologicalComponents(unittest.TestCase):
+    @test_for(get_topological_components)
+    def test_get_topological_components(self):
+        components = get_topological_components(['c', 'e'], lambda c: MC_ONTO.get(c, []))
+        order = [c for component in components for c in component]
+        self.assertTrue(all(len(component) == 1 for component in components))
+        self.assertEqual(set(order), {'c', 'e', 'cde', 'cf', 'eg', 'cdecf', 'cdeeg', 'cdeeg+',
+                                      'FRAMES'})
+        for c in order:
+            for p in MC_ONTO.get(c, []):
+                self.assertLess(order.index(p), order.index(c))
+
+    @test_for(get_topological_components)
+    def test_get_topological_components_cycle(self):
+        d_onto = {'x': ['a'], 'a': ['b'], 'b': ['c'], 'c': ['a', 'r']}
+        components = get_topological_components(['x'], lambda c: d_onto.get(c, []))
+        self.assertEqual([sorted(component) for component in components],
+                         [['r'], ['a', 'b', 'c'], ['x']])
+
+    @test_for(get_topological_components)
+    def test_get_topological_components_deep(self):
+        components = get_topological_components([0], lambda i: [i + 1] if i < 10000 else [])
+        self.assertEqual([c for component in components for c in component],
+                         list(reversed(range(10001))))
+
+
+# TEST ADAPTER
+# --------------------------------------------------------------------------------------------------
+class TestOntologyGraphAdapter(unittest.TestCase):
+    @test_for(get_parents)
+    def test_get_parents_graph(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        parents = get_parents('c', {'cde', 'cf'}, graph, ROOTS[METACYC])
+        self.assertEqual(parents, {'cdeeg+', 'FRAMES', 'cf', 'cde', 'cdecf', 'cdeeg'})
+        with self.assertRaises(KeyError):
+            get_parents('x', set(), graph, ROOTS[METACYC])
+
+    @test_for(get_all_classes)
+    def test_get_all_classes_graph(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        leaf_classes = extract_met_classes(MET_LST, graph)
+        self.assertEqual(leaf_classes, {'a': ['ab'], 'b': ['ab'], 'c': ['cde', 'cf']})
+        w_all_classes = get_all_classes(leaf_classes, MC_ONTO, ROOTS[METACYC])
+        self.assertEqual(get_all_classes(leaf_classes, graph, ROOTS[METACYC]), w_all_classes)
+        graph.ancestor_index(ROOTS[METACYC])
+        self.assertEqual(get_all_classes(leaf_classes, graph, ROOTS[METACYC]), w_all_classes)
+
+    @test_for(reduce_d_ontology)
+    def test_reduce_d_ontology_graph(self):
+        graph = OntologyGraph.from_dict(MC_ONTO)
+        self.assertEqual(reduce_d_ontology(graph, CT_AB), reduce_d_ontology(MC_ONTO, CT_AB))
+
+    @test_for(DataTable.fill_parameters)
+    def test_fill_parameters_graph(self):
+        data = DataTable()
+        data.fill_parameters(CT_AB, CT_AB, OntologyGraph.from_dict(MC_ONTO), ROOTS[METACYC])
+        w_data = DataTable()
+        w_data.fill_parameters(CT_AB, CT_AB, MC_ONTO, ROOTS[METACYC])
+        self.assertEqual(set(data.get_col()), set(w_data.get_col()))
@@ -1,9 +1,19 @@
 import unittest
 from unittest.mock import patch
+import gc
 import io
+import json
+import os
+import re
 import sys
+import tempfile
+import threading
+import weakref
 from functools import wraps
 from ontosunburst.ontology import *
+from ontosunburst.compiled_ontology import load_class_ontology
+from ontosunburst.ontosunburst import clear_cache
+from ontosunburst.data_table_tree import DataTable
 
 """
 Tests manually good file creation.
@@ -46,6 +56,26 @@ EC_ONTO_FULL = {'1.4.5.-': ['1.4.-.-'], '1.4.6.-': ['1.4.-.-'], '2.1.2.-': ['2.1
                 '1.4.6.7': ['1.4.6.-'], '2.1.2.3': ['2.1.2.-'], '1.5.3': ['1.5.-.-']}
 
 
+# SPARQL RESULTS (GO)
+# --------------------------------------------------------------------------------------------------
+GO_RESULTS = {'go:1': [('GO:1', 'one', 'GO:2', 'two'), ('GO:2', 'two', 'GO:3', 'cellular_component')],
+              'go:4': [('GO:4', 'four', 'GO:3', 'cellular_component')],
+              'go:5': []}
+
+CHEBI_HIERARCHY = [('CHEBI:1', 'one', 'CHEBI:50906', 'role'), ('CHEBI:2', 'two', 'CHEBI:1', 'one'),
+                   ('CHEBI:3', 'three', 'CHEBI:1', 'one'),
+                   ('CHEBI:3', 'three', 'CHEBI:50906', 'role'),
+                   ('CHEBI:4', 'four', 'CHEBI:3', 'three')]
+CHEBI_TARGETS = {'10': ('ten', ['CHEBI:2', 'CHEBI:4']), '11': ('eleven', ['CHEBI:1']),
+                 '12': ('twelve', []), '13': ('thirteen', ['CHEBI:2', 'CHEBI:20'])}
+# Ancestors of the roles out of the CHEBI:50906 hierarchy
+CHEBI_ANCESTORS = {'20': [('CHEBI:20', 'twenty', 'CHEBI:21', 'twenty-one'),
+                          ('CHEBI:21', 'twenty-one', 'CHEBI:3', 'three'),
+                          ('CHEBI:3', 'three', 'CHEBI:1', 'one'),
+                          ('CHEBI:3', 'three', 'CHEBI:50906', 'role'),
+                          ('CHEBI:1', 'one', 'CHEBI:50906', 'role')]}
+
+
 # ==================================================================================================
 # FUNCTIONS UTILS
 # ==================================================================================================
@@ -118,6 +148,9 @@ class TestClassesExtraction(unittest.TestCase):
                                  '7/7 EC numbers classified')
         self.assertEqual(d_obj, wanted_d_obj)
         self.assertEqual(d_onto, EC_ONTO_FULL)
+        # Base ontology not modified
+        self.assertEqual(len(EC_ONTO), 11)
+        self.assertNotIn('1.4.5.6', EC_ONTO)
 
     @test_for(extract_ec_classes)
     @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
@@ -158,6 +191,47 @@ class TestClassesExtraction(unittest.TestCase):
         parents = get_parents('1.-.-.-', {'Enzyme'}, EC_ONTO_FULL, ROOTS[EC])
         self.assertEqual(parents, {'Enzyme'})
 
+    @test_for(get_parents)
+    def test_get_parents_deep(self):
+        # Deeper than the recursion limit
+        d_onto = {str(i): [str(i + 1)] for i in range(1500)}
+        parents = get_parents('0', set(), d_onto, '1500')
+        self.assertEqual(parents, {str(i) for i in range(1, 1501)})
+
+    @test_for(get_parents)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_get_parents_cycle(self, mock_stdout):
+        # Ancestors cache kept with the ontology : cycle reported once
+        d_onto = OntologyGraph.from_dict({'a': ['b'], 'b': ['c'], 'c': ['a', 'FRAMES']})
+        parents = get_parents('a', set(), d_onto, ROOTS[METACYC])
+        all_classes = get_all_classes({'x': ['b'], 'y': ['c']}, d_onto, ROOTS[METACYC])
+        output = mock_stdout.getvalue().strip()
+        self.assertEqual(parents, {'a', 'b', 'c', 'FRAMES'})
+        self.assertEqual(all_classes, {'x': {'a', 'b', 'c', 'FRAMES'},
+                                       'y': {'a', 'b', 'c', 'FRAMES'}})
+        self.assertEqual(output, 'Cycle between classes a, b, c : ancestors merged.')
+
+    @test_for(get_parents)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_get_parents_cycle_dict(self, mock_stdout):
+        # New ancestors cache for each call on a dictionary : cycle still reported once
+        clear_cache()
+        d_onto = {'a': ['b'], 'b': ['c'], 'c': ['a', 'FRAMES']}
+        for c in ['a', 'b', 'c']:
+            self.assertEqual(get_parents(c, set(), d_onto, ROOTS[METACYC]),
+                             {'a', 'b', 'c', 'FRAMES'})
+        get_all_classes({'x': ['b'], 'y': ['c']}, d_onto, ROOTS[METACYC])
+        data = DataTable()
+        data.fill_parameters({'a': 1, 'b': 1, 'FRAMES': 2}, {'a': 1, 'b': 1, 'FRAMES': 2}, d_onto,
+                             ROOTS[METACYC])
+        self.assertEqual(mock_stdout.getvalue().count('Cycle between classes'), 1)
+        self.assertIn('Cycle between classes a, b, c : ancestors merged.', mock_stdout.getvalue())
+        # Reported again for another ontology or once the cache cleared
+        get_parents('a', set(), OntologyGraph.from_dict(d_onto), ROOTS[METACYC])
+        clear_cache()
+        get_parents('a', set(), d_onto, ROOTS[METACYC])
+        self.assertEqual(mock_stdout.getvalue().count('Cycle between classes'), 3)
+
     @test_for(get_all_classes)
     def test_get_all_classes(self):
         leaf_classes = {'a': ['ab'], 'b': ['ab'], 'c': ['cde', 'cf']}
@@ -180,6 +254,74 @@ class TestClassesExtraction(unittest.TestCase):
         all_classes_ec = get_all_classes(ec_leaf_classes, EC_ONTO, ROOTS[EC])
         self.assertEqual(all_classes_ec, wanted_all_classes)
 
+    @test_for(get_all_classes)
+    def test_get_all_classes_shared(self):
+        leaf_classes = {'a': ['ab'], 'b': ['ab'], 'c': ['cde', 'cf'], 'x': ['cde', 'cf']}
+        all_classes_met = get_all_classes(leaf_classes, MC_ONTO, ROOTS[METACYC])
+        self.assertIs(all_classes_met['a'], all_classes_met['b'])
+        self.assertIs(all_classes_met['c'], all_classes_met['x'])
+        self.assertEqual(type(all_classes_met['a']), frozenset)
+
+    @test_for(get_ancestors_cache)
+    def test_get_ancestors_cache(self):
+        root = ROOTS[METACYC]
+        graph = OntologyGraph.from_dict({'a': ['ab'], 'ab': ['FRAMES']})
+        cache = get_ancestors_cache(graph, root)
+        self.assertIs(get_ancestors_cache(graph, root), cache)
+        self.assertIs(graph.ancestors_caches[root], cache)
+        self.assertEqual(cache.ancestors('a'), {'ab', 'FRAMES'})
+        self.assertIs(cache.ancestors('a'), cache.ancestors('a'))
+        # Overlay modified (same number of keys) : cache dropped
+        overlay = OntologyOverlay(graph)
+        self.assertEqual(get_ancestors_cache(overlay, root).ancestors('a'), {'ab', 'FRAMES'})
+        overlay['a'] = ['FRAMES']
+        self.assertEqual(get_ancestors_cache(overlay, root).ancestors('a'), {'FRAMES'})
+        self.assertEqual(get_ancestors_cache(graph, root).ancestors('a'), {'ab', 'FRAMES'})
+        # Dictionary modified in place (same number of keys) : no stale ancestors
+        d_onto = {'a': ['ab'], 'ab': ['FRAMES']}
+        self.assertEqual(get_ancestors_cache(d_onto, root).ancestors('a'), {'ab', 'FRAMES'})
+        d_onto['a'] = ['FRAMES']
+        self.assertEqual(get_ancestors_cache(d_onto, root).ancestors('a'), {'FRAMES'})
+        # Caches freed with their ontology
+        cache_ref = weakref.ref(cache)
+        del graph, overlay, cache
+        gc.collect()
+        self.assertIsNone(cache_ref())
+
+    @test_for(clear_ancestors_cache)
+    def test_clear_ancestors_cache(self):
+        graph = OntologyGraph.from_dict({'a': ['ab'], 'ab': ['FRAMES']})
+        cache = get_ancestors_cache(graph, ROOTS[METACYC])
+        cache.ancestors('a')
+        clear_ancestors_cache()
+        self.assertEqual(len(cache._ancestors), 0)
+        self.assertIs(get_ancestors_cache(graph, ROOTS[METACYC]), cache)
+
+    @test_for(AncestorsCache.all_classes)
+    def test_ancestors_cache_threads(self):
+        root = ROOTS[METACYC]
+        d_onto = {'c0': [root]}
+        for i in range(1, 300):
+            d_onto[f'c{i}'] = [f'c{(i - 1) // 2}'] + ([f'c{i - 1}'] if i % 3 == 0 else [])
+        leaf_classes = {f'm{i}': [f'c{i}'] for i in range(300)}
+        wanted_all_classes = get_all_classes(leaf_classes, d_onto, root)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            compiled = load_class_ontology(compile_ontology(d_onto,
+                                                            os.path.join(tmp_dir, 'onto.onto')))
+            compiled.ancestors_caches[root] = AncestorsCache(compiled, root, maxsize=8)
+            results = dict()
+
+            def run(n):
+                results[n] = [get_all_classes(leaf_classes, compiled, root) for _ in range(3)]
+
+            threads = [threading.Thread(target=run, args=(n,)) for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, {n: [wanted_all_classes] * 3 for n in range(8)})
+            self.assertLessEqual(len(compiled.ancestors_caches[root]._ancestors), 8)
+
     @test_for(extract_classes)
     def test_extract_classes_metacyc(self):
         mc_classes, d_classes_ontology, names = extract_classes(METACYC, MET_LST, ROOTS[METACYC],
@@ -212,6 +354,170 @@ class TestClassesExtraction(unittest.TestCase):
         self.assertTrue(dicts_with_sorted_lists_equal(d_classes_ontology, EC_ONTO_FULL))
 
 
+# TEST SPARQL EXTRACTION
+# --------------------------------------------------------------------------------------------------
+def fake_go_select(queries):
+    def sparql_select(endpoint_url, query):
+        queries.append(query)
+        results = list()
+        for go, go_results in GO_RESULTS.items():
+            if f'"{go}"' in query:
+                for go_id, go_label, parent_id, parent_label in go_results:
+                    results.append({'input': go, 'goId': go_id, 'goLabel': go_label,
+                                    'parentGoId': parent_id, 'parentGoLabel': parent_label})
+        return results
+    return sparql_select
+
+
+def fake_go_ontology_select(queries):
+    def sparql_iter_select(endpoint_url, query):
+        queries.append(query)
+        edges = sorted({r for go_results in GO_RESULTS.values() for r in go_results})
+        limit = int(re.search(r'LIMIT (\d+)', query).group(1))
+        offset = int(re.search(r'OFFSET (\d+)', query).group(1))
+        for go_id, go_label, parent_id, parent_label in edges[offset:offset + limit]:
+            yield {'goId': go_id, 'goLabel': go_label, 'parentGoId': parent_id,
+                   'parentGoLabel': parent_label}
+    return sparql_iter_select
+
+
+def fake_chebi_select(queries):
+    def sparql_select(endpoint_url, query):
+        queries.append(query)
+        if '?root' in query:
+            return [{'input': '50906', 'roleId': role_id, 'roleLabel': role_label,
+                     'parentRoleId': parent_id, 'parentRoleLabel': parent_label}
+                    for role_id, role_label, parent_id, parent_label in CHEBI_HIERARCHY]
+        results = list()
+        if '?start' in query:
+            for start_id, links in CHEBI_ANCESTORS.items():
+                if f'"{start_id}"' in query:
+                    results += [{'input': start_id, 'roleId': role_id, 'roleLabel': role_label,
+                                 'parentRoleId': parent_id, 'parentRoleLabel': parent_label}
+                                for role_id, role_label, parent_id, parent_label in links]
+            return results
+        for chebi_id, (label, role_ids) in CHEBI_TARGETS.items():
+            if f'"{chebi_id}"' in query:
+                results += [{'input': chebi_id, 'moleculeLabel': label, 'roleId': role_id}
+                            for role_id in role_ids]
+        return results
+    return sparql_select
+
+
+class TestSparqlExtraction(unittest.TestCase):
+    @test_for(extract_go_classes)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_extract_go_classes_batches(self, mock_stdout):
+        for batch_size in [1, 2, 100]:
+            queries = list()
+            with patch('ontosunburst.sparql.sparql_select', fake_go_select(queries)):
+                all_classes, d_onto, labels = extract_go_classes(['go:1', 'go:4', 'go:5', 'go:1'],
+                                                                 'url', batch_size)
+            self.assertEqual(len(queries), (3 + batch_size - 1) // batch_size)
+            self.assertEqual(all_classes, {'go:1': {'go:2', 'go:3', 'GO'},
+                                           'go:4': {'go:3', 'GO'}})
+            self.assertEqual(d_onto, {'go:1': ['go:2'], 'go:2': ['go:3'], 'go:3': ['GO'],
+                                      'go:4': ['go:3']})
+            self.assertEqual(labels, {'go:1': 'one', 'go:2': 'two', 'go:3': 'cellular_component',
+                                      'go:4': 'four'})
+        self.assertIn('No GO class found for : go:5', mock_stdout.getvalue())
+
+    @test_for(extract_go_classes)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_extract_go_classes_workers(self, mock_stdout):
+        outputs = list()
+        for n_workers in [1, 3]:
+            with patch('ontosunburst.sparql.sparql_select', fake_go_select(list())):
+                outputs.append(extract_go_classes(['go:5', 'go:1', 'go:4', 'go:1'], 'url', 1,
+                                                  n_workers))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual([list(d.items()) for d in outputs[0]],
+                         [list(d.items()) for d in outputs[1]])
+
+    @test_for(extract_chebi_roles)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_extract_chebi_roles(self, mock_stdout):
+        clear_chebi_role_hierarchies()
+        queries = list()
+        with patch('ontosunburst.sparql.sparql_select', fake_chebi_select(queries)):
+            all_roles, d_onto, labels = extract_chebi_roles(['10', '11', '12'], 'url')
+            self.assertEqual(len(queries), 2)
+            self.assertEqual(extract_chebi_roles(['12', '11', '10'], 'url'),
+                             (all_roles, d_onto, labels))
+            self.assertEqual(len(queries), 3)
+        self.assertEqual(all_roles, {'10': {'1', '2', '3', '4', 'role'}, '11': {'1', 'role'}})
+        self.assertTrue(dicts_with_sorted_lists_equal(d_onto, {
+            '1': ['role'], '2': ['1'], '3': ['1', 'role'], '4': ['3'], '10': ['2', '4'],
+            '11': ['1']}))
+        self.assertEqual(labels, {'1': 'one', '2': 'two', '3': 'three', '4': 'four',
+                                  'role': 'role', '10': 'ten', '11': 'eleven'})
+        self.assertIn('No ChEBI role found for : 12', mock_stdout.getvalue())
+        self.assertIn('2/3 chebi id with roles associated.', mock_stdout.getvalue())
+
+    @test_for(extract_chebi_roles)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_extract_chebi_roles_outside_hierarchy(self, mock_stdout):
+        clear_chebi_role_hierarchies()
+        queries = list()
+        with patch('ontosunburst.sparql.sparql_select', fake_chebi_select(queries)):
+            all_roles, d_onto, labels = extract_chebi_roles(['13'], 'url')
+        self.assertEqual(len(queries), 3)
+        self.assertIn('(chebidb:20 "20")', queries[2])
+        self.assertEqual(all_roles, {'13': {'1', '2', '3', '20', '21', 'role'}})
+        self.assertTrue(dicts_with_sorted_lists_equal(d_onto, {
+            '1': ['role'], '2': ['1'], '3': ['1', 'role'], '20': ['21'], '21': ['3'],
+            '13': ['2', '20']}))
+        self.assertEqual(labels, {'1': 'one', '2': 'two', '3': 'three', '20': 'twenty',
+                                  '21': 'twenty-one', 'role': 'role', '13': 'thirteen'})
+        self.assertIn('1/1 chebi id with roles associated.', mock_stdout.getvalue())
+
+    @test_for(get_chebi_role_hierarchy)
+    def test_get_chebi_role_hierarchy_clear_cache(self):
+        clear_chebi_role_hierarchies()
+        queries = list()
+        with patch('ontosunburst.sparql.sparql_select', fake_chebi_select(queries)):
+            hierarchy = get_chebi_role_hierarchy('url')
+            self.assertIs(get_chebi_role_hierarchy('url')[0], hierarchy[0])
+            self.assertEqual(len(queries), 1)
+            clear_cache()
+            self.assertEqual(get_chebi_role_hierarchy('url'), hierarchy)
+            self.assertEqual(len(queries), 2)
+        self.assertEqual(hierarchy[0], {'1': {'role'}, '2': {'1'}, '3': {'1', 'role'},
+                                        '4': {'3'}})
+
+    @test_for(download_go_ontology)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_download_go_ontology(self, mock_stdout):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'go.json')
+            queries = list()
+            with patch('ontosunburst.ontology.sparql_iter_select', fake_go_ontology_select(queries)):
+                self.assertEqual(download_go_ontology('url', output, 2),
+                                 (output, os.path.join(tmp_dir, 'go_labels.json')))
+            self.assertEqual(len(queries), 2)
+            self.assertTrue(os.path.isfile(os.path.join(tmp_dir, 'go.onto')))
+            with open(os.path.join(tmp_dir, 'go_labels.json')) as f:
+                self.assertEqual(json.load(f), {'go:1': 'one', 'go:2': 'two',
+                                                'go:3': 'cellular_component', 'go:4': 'four'})
+            d_onto = load_class_ontology(output)
+            self.assertEqual(dict(d_onto.items()), {'go:1': ['go:2'], 'go:2': ['go:3'],
+                                                    'go:3': ['GO'], 'go:4': ['go:3']})
+            all_classes, d_onto, names = extract_classes(GO, ['go:1', 'go:4', 'go:5'], ROOTS[GO],
+                                                         d_onto, None)
+            self.assertEqual(all_classes, {'go:1': {'go:2', 'go:3', 'GO'},
+                                           'go:4': {'go:3', 'GO'}})
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches(self):
+        queries = list()
+        with patch('ontosunburst.sparql.sparql_select', fake_go_select(queries)):
+            results = sparql_select_batches('url', ['go:5', 'go:4', 'go:1'],
+                                            get_go_classes_query, 2)
+        self.assertEqual(list(results), ['go:5', 'go:4', 'go:1'])
+        self.assertEqual([len(r) for r in results.values()], [0, 1, 2])
+        self.assertIn('VALUES (?start ?input) { (go:5 "go:5") (go:4 "go:4") }', queries[0])
+
+
 # TEST ABUNDANCES
 # --------------------------------------------------------------------------------------------------
 class TestAbundances(unittest.TestCase):
@@ -317,6 +623,37 @@ class TestAbundances(unittest.TestCase):
         self.assertEqual(classes_abundances, wanted_abundances)
 
 
+    @test_for(get_membership_matrix)
+    def test_get_membership_matrix(self):
+        all_classes = {'a': {'FRAMES', 'ab'}, 'b': {'FRAMES', 'ab'}, 'ab': {'FRAMES'}}
+        matrix, concepts, classes = get_membership_matrix(all_classes, show_leaves=True)
+        self.assertEqual(concepts, ['a', 'b', 'ab'])
+        self.assertEqual(classes[0], 'a')
+        self.assertEqual(set(classes), {'a', 'b', 'ab', 'FRAMES'})
+        wanted_matrix = {'a': {'a': 1, 'ab': 1, 'FRAMES': 1}, 'b': {'b': 1, 'ab': 1, 'FRAMES': 1},
+                         'ab': {'ab': 1, 'FRAMES': 1}}
+        dense = matrix.toarray()
+        for i, met in enumerate(concepts):
+            for j, c in enumerate(classes):
+                self.assertEqual(dense[i, j], wanted_matrix[met].get(c, 0))
+
+    @test_for(get_classes_abundance_sparse)
+    def test_get_classes_abundance_sparse(self):
+        all_classes = {'c': {'cdecf', 'cdeeg+', 'FRAMES', 'cde', 'cdeeg', 'cf'},
+                       'd': {'cdecf', 'cdeeg+', 'FRAMES', 'cde', 'cdeeg'},
+                       'e': {'cdeeg+', 'FRAMES', 'cde', 'cdecf', 'eg', 'cdeeg'},
+                       'f': {'cdecf', 'FRAMES', 'cf'}, 'cf': {'cdecf', 'FRAMES'}}
+        for abundances_dict in [{'c': 3, 'd': 4, 'e': 5, 'f': 2, 'cf': 2},
+                                {'c': 0.3, 'd': 0.4, 'e': 0.5, 'f': 0.2, 'cf': 0.2}]:
+            for show_leaves in [True, False]:
+                w_abundances = get_classes_abundance(all_classes, abundances_dict, show_leaves)
+                classes_abundances = get_classes_abundance_sparse(all_classes, abundances_dict,
+                                                                  show_leaves)
+                self.assertEqual(list(classes_abundances.items()), list(w_abundances.items()))
+                self.assertEqual([type(v) for v in classes_abundances.values()],
+                                 [type(v) for v in w_abundances.values()])
+
+
 # TEST UTILS
 # --------------------------------------------------------------------------------------------------
 class TestUtils(unittest.TestCase):
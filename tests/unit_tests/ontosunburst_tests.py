@@ -187,6 +187,63 @@ class TestOntosunburstCustomOnto(unittest.TestCase):
         self.assertTrue(are_fig_dict_equals(fig, w_fig_file))
 
 
+# BATCH
+# --------------------------------------------------------------------------------------------------
+
+class TestOntosunburstBatch(unittest.TestCase):
+
+    @test_for(ontosunburst_batch)
+    def test_ontosunburst_batch(self):
+        samples = {'s1': dict(zip(C_LST, C_LAB)), 's2': dict(zip(C_REF[2:], C_RAB[2:]))}
+        for show_leaves in [True, False]:
+            figs = ontosunburst_batch(samples, ontology=None, root='FRAMES',
+                                      reference_set=C_REF, ref_abundances=C_RAB,
+                                      analysis='topology', output='test_batch',
+                                      write_output=False, class_ontology=C_ONTO, labels=C_LABELS,
+                                      root_cut=ROOT_UNCUT, show_leaves=show_leaves)
+            self.assertEqual(list(figs), ['s1', 's2'])
+            for sample, sample_abundances in samples.items():
+                w_fig = ontosunburst(interest_set=list(sample_abundances), ontology=None,
+                                     root='FRAMES', abundances=list(sample_abundances.values()),
+                                     reference_set=C_REF, ref_abundances=C_RAB,
+                                     analysis='topology', output=f'test_batch_{sample}',
+                                     write_output=False, class_ontology=C_ONTO, labels=C_LABELS,
+                                     root_cut=ROOT_UNCUT, show_leaves=show_leaves)
+                self.assertEqual(figs[sample].to_dict(), w_fig.to_dict())
+
+    @test_for(ontosunburst_batch)
+    def test_ontosunburst_batch_dataframe(self):
+        samples = pd.DataFrame([[1, 2, 3, 0, 0], [0, 2, 0, 4, 5]], index=['s1', 's2'],
+                               columns=C_REF[:5])
+        figs = ontosunburst_batch(samples, ontology=None, root='FRAMES', analysis='topology',
+                                  output='test_batch', write_output=False, class_ontology=C_ONTO,
+                                  labels=C_LABELS)
+        w_fig = ontosunburst(interest_set=['b', 'd', 'e'], ontology=None, root='FRAMES',
+                             abundances=[2, 4, 5], analysis='topology', output='test_batch_s2',
+                             write_output=False, class_ontology=C_ONTO, labels=C_LABELS)
+        self.assertEqual(figs['s2'].to_dict(), w_fig.to_dict())
+
+    @test_for(get_samples_matrix)
+    def test_get_samples_matrix(self):
+        sample_names, concepts, matrix = get_samples_matrix({'s1': {'a': 1, 'b': 2},
+                                                             's2': {'c': 3, 'a': 4}})
+        self.assertEqual(sample_names, ['s1', 's2'])
+        self.assertEqual(concepts, ['a', 'b', 'c'])
+        self.assertEqual(matrix.tolist(), [[1, 2, 0], [4, 0, 3]])
+
+    @test_for(get_samples_matrix)
+    def test_get_samples_matrix_data_frame(self):
+        samples = pd.DataFrame([{'a': 1, 'b': 2}, {'c': 3, 'a': 4}], index=['s1', 's2'])
+        sample_names, concepts, matrix = get_samples_matrix(samples)
+        self.assertEqual((sample_names, concepts), (['s1', 's2'], ['a', 'b', 'c']))
+        self.assertEqual(matrix.dtype, np.float64)
+        self.assertEqual(matrix.tolist(), [[1, 2, 0], [4, 0, 3]])
+        self.assertEqual(get_samples_matrix(samples.fillna(0).astype(int))[2].dtype, np.int64)
+        samples['id'] = ['x', 'y']
+        with self.assertRaisesRegex(ValueError, '1 columns not numeric : id'):
+            get_samples_matrix(samples)
+
+
 # METACYC
 # --------------------------------------------------------------------------------------------------
 
@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import sys
+import time
+import tempfile
+from functools import wraps
+from ontosunburst.sparql_server import *
+from ontosunburst.sparql import SparqlClient, SparqlHTTPError, get_sparql_client, \
+    sparql_select_batches
+from ontosunburst.ontology import extract_go_classes, extract_chebi_roles, \
+    download_go_ontology, get_go_classes_query, get_chebi_roles_query
+from ontosunburst.compiled_ontology import load_class_ontology
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+GO_OBO = os.path.join('test_files', 'go_fragment.obo')
+CHEBI_OBO = os.path.join('test_files', 'chebi_fragment.obo')
+GO_LST = ['go:0043227', 'go:0043229', 'go:0043231', 'go:0044422']
+CH_LST = ['38028', '28604', '85146']
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+class DualWriter(io.StringIO):
+    def __init__(self, original_stdout):
+        super().__init__()
+        self.original_stdout = original_stdout
+
+    def write(self, s):
+        super().write(s)
+        self.original_stdout.write(s)
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+# TEST QUERIES
+# --------------------------------------------------------------------------------------------------
+class TestQueries(unittest.TestCase):
+    @test_for(get_values)
+    def test_get_values(self):
+        self.assertEqual(get_values(get_go_classes_query(['go:0043227', 'go:0043229'])),
+                         [('GO:0043227', 'go:0043227'), ('GO:0043229', 'go:0043229')])
+        self.assertEqual(get_values(get_chebi_roles_query(['38028'])), [('CHEBI:38028', '38028')])
+        self.assertEqual(get_values('SELECT ?a WHERE { ?a ?b ?c }'), [])
+
+    @test_for(get_obo_id)
+    def test_get_obo_id(self):
+        prefixes = {'go': 'http://purl.obolibrary.org/obo/GO_'}
+        self.assertEqual(get_obo_id('go:0043227', prefixes), 'GO:0043227')
+        self.assertEqual(get_obo_id('<http://purl.obolibrary.org/obo/CHEBI_1>', prefixes),
+                         'CHEBI:1')
+        self.assertEqual(get_obo_id('<http://example.org/x>', prefixes), 'http://example.org/x')
+
+    @test_for(LocalSparqlServer.select)
+    def test_select(self):
+        server = LocalSparqlServer({'go': GO_OBO, 'chebi': CHEBI_OBO})
+        variables, rows = server.select('chebi', get_chebi_roles_query(['38028', '58215']))
+        self.assertEqual(variables, ['input', 'moleculeLabel', 'roleId'])
+        self.assertEqual(rows, [['38028', 'cyanuric acid', 'CHEBI:35703']])
+        variables, rows = server.select('go', get_go_classes_query(['go:0043229']))
+        self.assertEqual(rows, [['go:0043229', 'intracellular organelle', 'organelle',
+                                 'GO:0043229', 'GO:0043226'],
+                                ['go:0043229', 'organelle', 'cellular anatomical entity',
+                                 'GO:0043226', 'GO:0110165'],
+                                ['go:0043229', 'cellular anatomical entity', 'cellular_component',
+                                 'GO:0110165', 'GO:0005575']])
+        with self.assertRaises(ValueError):
+            server.select('go', 'SELECT ?a WHERE { ?a ?b ?c }')
+        server.stop()
+
+
+# TEST SERVER
+# --------------------------------------------------------------------------------------------------
+class TestLocalSparqlServer(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalSparqlServer({'go': GO_OBO, 'chebi': CHEBI_OBO}).start()
+        self.go_url = self.server.get_url('go')
+        self.chebi_url = self.server.get_url('chebi')
+
+    def tearDown(self):
+        for url in [self.go_url, self.chebi_url]:
+            get_sparql_client(url).close()
+        self.server.stop()
+
+    @test_for(LocalSparqlServer)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_extract(self, mock_stdout):
+        all_classes = extract_go_classes(GO_LST, self.go_url, batch_size=1)[0]
+        self.assertEqual(all_classes['go:0043227'],
+                         {'go:0043226', 'go:0110165', 'go:0005575', 'GO'})
+        self.assertEqual(self.server.n_requests, 4)
+        all_roles = extract_chebi_roles(CH_LST, self.chebi_url)[0]
+        self.assertEqual(all_roles['38028'], {'35703', '24432', 'role'})
+        self.assertEqual(mock_stdout.getvalue().strip(), 'No GO class found for : go:0044422\n'
+                                                         '3/3 chebi id with roles associated.')
+
+    @test_for(LocalSparqlServer)
+    @patch('sys.stdout', new_callable=lambda: DualWriter(sys.stdout))
+    def test_download_go_ontology(self, mock_stdout):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'go.json')
+            download_go_ontology(self.go_url, output, page_size=2)
+            self.assertEqual(dict(load_class_ontology(output).items()),
+                             {'go:0005575': ['GO'], 'go:0043226': ['go:0110165'],
+                              'go:0043227': ['go:0043226'], 'go:0043229': ['go:0043226'],
+                              'go:0043231': ['go:0043227', 'go:0043229'],
+                              'go:0110165': ['go:0005575']})
+        # 6 relations : 3 full pages + 1 empty page
+        self.assertEqual(self.server.n_requests, 4)
+
+    @test_for(LocalSparqlServer)
+    def test_errors(self):
+        client = SparqlClient(self.go_url)
+        with self.assertRaises(SparqlHTTPError) as error:
+            client.select('SELECT ?a WHERE { ?a ?b ?c }')
+        self.assertEqual(error.exception.status, 400)
+        with self.assertRaises(SparqlHTTPError) as error:
+            SparqlClient(self.server.get_url('kegg')).select(get_go_classes_query(['go:0043227']))
+        self.assertEqual(error.exception.status, 404)
+        self.assertEqual(self.server.n_failures, 2)
+        client.close()
+
+    @test_for(LocalSparqlServer)
+    def test_failure_injection(self):
+        get_sparql_client(self.go_url).scheduler.backoff = 0
+        self.server.fail_first = 2
+        results = sparql_select_batches(self.go_url, GO_LST, get_go_classes_query, 2, 1)
+        self.assertEqual([len(results[go]) for go in GO_LST], [3, 3, 6, 0])
+        self.assertEqual((self.server.n_requests, self.server.n_failures), (4, 2))
+        self.server.failure_rate = 1
+        with self.assertRaises(SparqlHTTPError):
+            sparql_select_batches(self.go_url, GO_LST, get_go_classes_query, 2, 1)
+
+    @test_for(LocalSparqlServer)
+    def test_latency(self):
+        self.server.latency = 0.05
+        self.server.id_latency = 0.05
+        start = time.time()
+        sparql_select_batches(self.go_url, GO_LST, get_go_classes_query, 1, 2)
+        # 4 requests of 0.1 second, 2 at a time at most
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertEqual(self.server.max_in_flight, 2)
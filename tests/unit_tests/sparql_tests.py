@@ -0,0 +1,275 @@
+import unittest
+import os
+import json
+import time
+import tempfile
+import threading
+from functools import wraps
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from ontosunburst.sparql import *
+
+# ==================================================================================================
+# GLOBAL
+# ==================================================================================================
+
+IDS = [f'id{i}' for i in range(10)]
+
+
+# ==================================================================================================
+# FUNCTIONS UTILS
+# ==================================================================================================
+def test_for(func):
+    def decorator(test_func):
+        @wraps(test_func)
+        def wrapper(*args, **kwargs):
+            return test_func(*args, **kwargs)
+
+        wrapper._test_for = func
+        return wrapper
+
+    return decorator
+
+
+def get_query(ids):
+    return ' '.join(ids)
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """ Answer each ID of the query (space separated) with 2 results binding ?input to the ID. The
+    first IDs of the queries are answered last. """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        query = parse_qs(self.rfile.read(length).decode())['query'][0]
+        ids = query.split()
+        self.server.ports.add(self.client_address[1])
+        self.server.n_requests += 1
+        if ids[0] in self.server.fail_once:
+            self.server.fail_once.remove(ids[0])
+            self.send_error(503)
+            return
+        time.sleep(0.05 if ids[0] in ('id0', 'id1') else 0)
+        rows = ['input,n'] + [f'{i},{n}' for i in ids for n in range(2)]
+        if ids[0] == 'quoted':
+            rows = ['input,label', 'q,"a, ""b""\nc"', 'r,']
+        body = ('\r\n'.join(rows) + '\r\n').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CSV_RESULTS)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# ==================================================================================================
+# UNIT TESTS
+# ==================================================================================================
+
+class EchoServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+        self.server.ports = set()
+        self.server.n_requests = 0
+        self.server.fail_once = set()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/sparql'
+        self.running = True
+
+    def tearDown(self):
+        self.stop_server()
+
+    def stop_server(self):
+        if self.running:
+            get_sparql_client(self.url).close()
+            self.server.shutdown()
+            self.server.server_close()
+            self.running = False
+
+
+# TEST SPARQL CLIENT
+# --------------------------------------------------------------------------------------------------
+class TestSparqlClient(EchoServerTestCase):
+
+    @test_for(SparqlClient.select)
+    def test_select_keep_alive(self):
+        client = SparqlClient(self.url)
+        for i in IDS:
+            self.assertEqual(client.select(i), [{'input': i, 'n': str(n)} for n in range(2)])
+        self.assertEqual(client.n_connections, 1)
+        self.assertEqual(len(self.server.ports), 1)
+        client.close()
+
+    @test_for(SparqlClient.iter_select)
+    def test_iter_select(self):
+        client = SparqlClient(self.url)
+        self.assertEqual(list(client.iter_select('quoted')),
+                         [{'input': 'q', 'label': 'a, "b"\nc'}, {'input': 'r', 'label': ''}])
+        # Response not read entirely : connection not reused
+        results = client.iter_select('id0 id1')
+        self.assertEqual(next(results), {'input': 'id0', 'n': '0'})
+        results.close()
+        self.assertEqual(len(client.select('id2')), 2)
+        self.assertEqual(client.n_connections, 2)
+        client.close()
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches_workers(self):
+        wanted = sparql_select_batches(self.url, IDS, get_query, 2, 1)
+        self.assertEqual(list(wanted), IDS)
+        self.assertTrue(all(len(r) == 2 for r in wanted.values()))
+        for n_workers in [2, 5, 8]:
+            results = sparql_select_batches(self.url, IDS, get_query, 2, n_workers)
+            self.assertEqual(results, wanted)
+            self.assertEqual(list(results), IDS)
+        self.assertLessEqual(get_sparql_client(self.url).n_connections, 8)
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches_retry(self):
+        get_sparql_client(self.url).scheduler.backoff = 0
+        self.server.fail_once = {'id0', 'id4'}
+        results = sparql_select_batches(self.url, IDS, get_query, 2, 3)
+        self.assertEqual(self.server.n_requests, 7)
+        self.assertTrue(all(len(r) == 2 for r in results.values()))
+
+
+# TEST SPARQL SCHEDULER
+# --------------------------------------------------------------------------------------------------
+class TestSparqlScheduler(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = list()
+
+    def task(self, item):
+        with self.lock:
+            self.calls.append(item)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if isinstance(item, Exception) and self.calls.count(item) <= 2:
+            raise item
+        return str(item)
+
+    @test_for(SparqlScheduler.run)
+    def test_run_order(self):
+        scheduler = SparqlScheduler()
+        items = list(range(20))
+        self.assertEqual(scheduler.run(self.task, items, 4), [str(i) for i in items])
+        self.assertEqual(scheduler.limit, 4)
+        self.assertLessEqual(self.max_in_flight, 4)
+        self.assertGreater(self.max_in_flight, 1)
+
+    @test_for(SparqlScheduler.run)
+    def test_run_retries(self):
+        scheduler = SparqlScheduler(backoff=0)
+        timeout = TimeoutError('timeout')
+        server_error = SparqlHTTPError('unavailable', 503)
+        bad_request = SparqlHTTPError('bad request', 400)
+        value_error = ValueError('json')
+        results = scheduler.run(self.task, [1, timeout, server_error, bad_request, value_error], 2)
+        self.assertEqual(results, ['1', 'timeout', 'unavailable', bad_request, value_error])
+        self.assertEqual([self.calls.count(i) for i in [1, timeout, bad_request, value_error]],
+                         [1, 3, 1, 1])
+        scheduler.retries = 1
+        self.assertEqual(scheduler.run(self.task, [ConnectionResetError('reset')], 2)[0].args,
+                         ('reset',))
+
+    @test_for(SparqlScheduler.run)
+    def test_run_decrease(self):
+        scheduler = SparqlScheduler(backoff=0.05)
+        scheduler.run(self.task, list(range(10)), 8)
+        self.assertEqual(scheduler.limit, 8)
+        # Halved once for the requests in flight, once for their retries, then +1 for 2 successes
+        errors = [ConnectionResetError(f'reset {i}') for i in range(4)]
+        self.assertEqual(scheduler.run(self.task, errors, 8), [str(e) for e in errors])
+        self.assertEqual(scheduler.limit, 3)
+
+    @test_for(SparqlScheduler.run)
+    def test_run_threads(self):
+        scheduler = SparqlScheduler(backoff=0)
+        items = list(range(20)) + [ConnectionResetError(f'reset {i}') for i in range(4)]
+        results = dict()
+
+        def run(n):
+            results[n] = scheduler.run(self.task, items, 4)
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {n: [str(i) for i in items] for n in range(4)})
+        self.assertLessEqual(self.max_in_flight, 16)
+        self.assertTrue(1 <= scheduler.limit <= 4)
+
+
+# TEST SPARQL CACHE
+# --------------------------------------------------------------------------------------------------
+class TestSparqlCache(EchoServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = set_sparql_cache(self.tmp_dir.name)
+        get_sparql_client(self.url).scheduler.backoff = 0
+
+    def tearDown(self):
+        set_sparql_cache(None)
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    @test_for(set_sparql_cache)
+    def test_set_sparql_cache(self):
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir.name, SPARQL_CACHE_FILE)))
+        self.assertIsNone(set_sparql_cache(None))
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches_cached(self):
+        wanted = sparql_select_batches(self.url, IDS[:6], get_query, 2, kind='echo')
+        self.assertEqual(self.server.n_requests, 3)
+        results = sparql_select_batches(self.url, IDS, get_query, 2, kind='echo')
+        self.assertEqual(self.server.n_requests, 5)
+        self.assertEqual(list(results), IDS)
+        self.assertEqual({i: results[i] for i in IDS[:6]}, wanted)
+        # Not cached without kind, other kind or other endpoint
+        sparql_select_batches(self.url, IDS, get_query, 5)
+        sparql_select_batches(self.url, IDS, get_query, 5, kind='other')
+        self.assertEqual(self.server.n_requests, 9)
+        self.assertEqual(self.cache.get(self.url + '/', 'echo', IDS), dict())
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches_cache(self):
+        # Cache given for the call instead of the cache set
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = get_sparql_cache(cache_dir)
+            wanted = sparql_select_batches(self.url, IDS[:4], get_query, 2, kind='echo',
+                                           cache=cache)
+            self.assertEqual(cache.get(self.url, 'echo', IDS), wanted)
+            self.assertEqual(self.cache.get(self.url, 'echo', IDS), dict())
+            sparql_select_batches(self.url, IDS[:4], get_query, 2, kind='echo', cache=cache)
+            self.assertEqual(self.server.n_requests, 2)
+
+    @test_for(sparql_select_batches)
+    def test_sparql_select_batches_expired(self):
+        wanted = sparql_select_batches(self.url, IDS[:4], get_query, 2, kind='echo')
+        self.cache.ttl = 0
+        sparql_select_batches(self.url, IDS[:4], get_query, 2, kind='echo')
+        self.assertEqual(self.server.n_requests, 4)
+        self.stop_server()
+        results = sparql_select_batches(self.url, IDS[:4], get_query, 2, kind='echo')
+        self.assertEqual(results, wanted)
+        # Some failed IDs not cached : results incomplete, error raised
+        with self.assertRaisesRegex(ConnectionError, '2/4 IDs not found in cache : id4, id5'):
+            sparql_select_batches(self.url, IDS[2:6], get_query, 2, kind='echo')
+        with self.assertRaises(ConnectionError):
+            sparql_select_batches(self.url, IDS[6:], get_query, 2, kind='echo')
+        with self.assertRaises(ConnectionError):
+            sparql_select_batches(self.url, IDS[:4], get_query, 2)
+